@@ -0,0 +1,217 @@
+import array
+import os
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.Storage.ColdStorage import ColdStorage
+from MaFin.Data.Storage.KlineStore import KlineStore
+from MaFin.Trades.Trade import Trade
+from MaFin.Utils.Utils import get_interval_ms
+
+"""Event-driven backtest of strategies over klines from cold storage"""
+"""
+Candles of all pairs are replayed in time order through Strategy.ping_data, a chunk of time at a time from
+memory-mapped storages, so only one chunk of dates is in memory no matter how long the history is.
+Orders from Strategy.signal are filled from the next candle of the pair: market orders at its open with slippage,
+limit orders when the price is touched. Positions are long only, BUY opens a Trade, SELL closes all open trades
+of the asset. Stop loss is checked before take profit when both are inside one candle.
+"""
+
+
+class Backtester:
+    def __init__(self, root_storage_path, pairs, tf, strategy_factory, initial_cash=10000.0, fee=0.001,
+                 slippage=0.0005, warmup=500, chunk_candles=100000, equity_interval=None):
+        """
+        :param root_storage_path Root the klines were stored under by BinanceDataProvider
+        :param strategy_factory Callable (pair, initial data frame of warmup candles) -> Strategy
+        :param fee Fee rate taken from notional of every fill
+        :param slippage Relative price worsening of market and stop fills
+        :param warmup Candles before start given to the strategy as initial data
+        :param chunk_candles Candles of one pair read at once
+        :param equity_interval Milliseconds between equity curve points, every candle time when None
+        """
+        self.pairs = list(pairs)
+        self.tf = tf
+        self.strategy_factory = strategy_factory
+        self.initial_cash = initial_cash
+        self.fee = fee
+        self.slippage = slippage
+        self.warmup = warmup
+        self.chunk_ms = chunk_candles * get_interval_ms(tf)
+        self.equity_interval = equity_interval
+        self.storages = dict()
+        for p in self.pairs:
+            dirname = os.path.join(root_storage_path, f'Spot/Pairs/{p}/{tf}/data.csv')
+            self.storages[p] = ColdStorage(dirname, backend=KlineStore(dirname))
+        self.__reset()
+
+    def run(self, start=None, end=None):
+        """
+        :param start, end Epoch ms, whole stored history when not specified
+        :return BacktestResult
+        """
+        self.__reset()
+        start, end = self.__get_bounds(start, end)
+        for p in self.pairs:
+            history = self.storages[p].get_range(None, start)[-self.warmup:] if self.warmup > 0 else []
+            strategy = self.strategy_factory(p, pd.DataFrame(history))
+            strategy.subscribe_for_signal(self.__on_signal)
+            self.strategies[p] = strategy
+        for chunk_start in range(start, end, self.chunk_ms):
+            chunk_end = min(chunk_start + self.chunk_ms, end)
+            candles = [self.storages[p].get_range(chunk_start, chunk_end) for p in self.pairs]
+            dates = np.concatenate([c['date'] for c in candles])
+            pair_index = np.repeat(np.arange(len(self.pairs)), [len(c) for c in candles])
+            offsets = np.concatenate([[0], np.cumsum([len(c) for c in candles])])
+            for i in np.argsort(dates, kind='stable'):
+                p = pair_index[i]
+                self.__on_candle(self.pairs[p], candles[p][i - offsets[p]])
+        if self.last_date is not None:
+            self.__record_equity(self.last_date, force=True)
+        return BacktestResult(self.trades, np.frombuffer(self.equity_dates, dtype=np.int64),
+                              np.frombuffer(self.equity_values, dtype=np.float64), self.initial_cash)
+
+    def __reset(self):
+        self.cash = self.initial_cash
+        self.strategies = dict()
+        self.pending = {p: [] for p in self.pairs}
+        self.open_trades = {p: [] for p in self.pairs}
+        self.trades = []
+        self.last_close = dict()
+        self.positions_value = 0.0
+        self.equity_dates = array.array('q')
+        self.equity_values = array.array('d')
+        self.last_date = None
+        self.next_record = None
+        self.signal_date = None
+
+    def __get_bounds(self, start, end):
+        bounds = [s.get_range() for s in self.storages.values()]
+        bounds = [b for b in bounds if len(b) > 0]
+        if start is None:
+            start = min(b['date'][0] for b in bounds) if bounds else 0
+        if end is None:
+            end = max(b['date'][-1] for b in bounds) + 1 if bounds else 0
+        return int(start), int(end)
+
+    def __on_candle(self, pair, candle):
+        date = int(candle['date'])
+        if self.last_date is not None and date != self.last_date:
+            self.__record_equity(self.last_date)
+        self.last_date = date
+        self.__fill_pending(pair, candle)
+        self.__check_exits(pair, candle)
+        close = float(candle['close'])
+        self.positions_value += self.__position(pair) * (close - self.last_close.get(pair, close))
+        self.last_close[pair] = close
+        self.signal_date = date
+        self.strategies[pair].ping_data(candle)
+
+    def __on_signal(self, signal):
+        if signal['side'] == 'CANCEL':
+            self.pending[signal['asset']] = []
+            return
+        self.pending[signal['asset']].append(dict(signal, date=self.signal_date))
+
+    def __fill_pending(self, pair, candle):
+        remaining = []
+        for order in self.pending[pair]:
+            if order['date'] >= candle['date']:
+                remaining.append(order)
+                continue
+            price = self.__get_fill_price(order, candle)
+            if price is None:
+                remaining.append(order)
+            elif order['side'] == 'BUY':
+                self.__buy(pair, order, price, int(candle['date']))
+            else:
+                self.__close_trades(pair, price, int(candle['date']))
+        self.pending[pair] = remaining
+
+    def __get_fill_price(self, order, candle):
+        buy = order['side'] == 'BUY'
+        if order['price'] is None:
+            return candle['open'] * (1 + self.slippage if buy else 1 - self.slippage)
+        if buy and candle['low'] <= order['price']:
+            return min(order['price'], candle['open'])
+        if not buy and candle['high'] >= order['price']:
+            return max(order['price'], candle['open'])
+        return None
+
+    def __check_exits(self, pair, candle):
+        date = int(candle['date'])
+        for trade in list(self.open_trades[pair]):
+            if trade.entry_date == date:
+                continue
+            if trade.stop_loss is not None and candle['low'] <= trade.stop_loss:
+                self.__close_trade(trade, min(trade.stop_loss, candle['open']) * (1 - self.slippage), date)
+            elif trade.take_profit is not None and candle['high'] >= trade.take_profit:
+                self.__close_trade(trade, max(trade.take_profit, candle['open']), date)
+
+    def __buy(self, pair, order, price, date):
+        affordable = self.cash / (price * (1 + self.fee))
+        quantity = affordable if order['quantity'] is None else min(order['quantity'], affordable)
+        if quantity <= 0:
+            return
+        fee = quantity * price * self.fee
+        self.cash -= quantity * price + fee
+        trade = Trade(pair, quantity, order['take_profit'], order['stop_loss'])
+        trade.open(price, date, fee)
+        self.open_trades[pair].append(trade)
+        self.positions_value += quantity * self.last_close.setdefault(pair, price)
+
+    def __close_trades(self, pair, price, date):
+        for trade in list(self.open_trades[pair]):
+            self.__close_trade(trade, price, date)
+
+    def __close_trade(self, trade, price, date):
+        fee = trade.quantity * price * self.fee
+        self.cash += trade.quantity * price - fee
+        self.positions_value -= trade.quantity * self.last_close[trade.asset]
+        trade.close(price, date, fee)
+        self.open_trades[trade.asset].remove(trade)
+        self.trades.append(trade)
+
+    def __position(self, pair):
+        return sum(t.quantity for t in self.open_trades[pair])
+
+    def __record_equity(self, date, force=False):
+        if self.equity_interval is not None and not force:
+            if self.next_record is not None and date < self.next_record:
+                return
+            self.next_record = date + self.equity_interval
+        self.equity_dates.append(date)
+        self.equity_values.append(self.cash + self.positions_value)
+
+
+class BacktestResult:
+    def __init__(self, trades, equity_dates, equity_values, initial_cash):
+        """
+        :param trades Closed Trades in the order of closing
+        """
+        self.trades = trades
+        self.equity_dates = equity_dates
+        self.equity_values = equity_values
+        self.initial_cash = initial_cash
+
+    def get_trades(self):
+        return pd.DataFrame([t.to_dict() for t in self.trades])
+
+    def get_equity(self):
+        """
+        :return Series of equity in quote asset indexed by candle date (epoch ms)
+        """
+        return pd.Series(self.equity_values, index=pd.Index(self.equity_dates, name='date'), name='equity')
+
+    def get_stats(self):
+        """
+        :return Dict with total return, max drawdown, number of trades, win rate and fees paid
+        """
+        equity = self.equity_values
+        final = equity[-1] if len(equity) > 0 else self.initial_cash
+        drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) > 0 else np.zeros(1)
+        profits = np.array([t.profit for t in self.trades], dtype=np.float64)
+        return {'total_return': final / self.initial_cash - 1, 'max_drawdown': drawdown.max(),
+                'trades': len(self.trades), 'win_rate': (profits > 0).mean() if len(profits) > 0 else np.nan,
+                'fees': sum(t.fees for t in self.trades)}
@@ -0,0 +1,108 @@
+import concurrent.futures
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.Storage.KlineStore import KlineStore
+from MaFin.Technicals.MovingAverage import get_sma
+from MaFin.Utils.Utils import get_interval_ms
+
+"""Parameter sweep of vectorized strategies over one pair, spread over a process pool"""
+"""
+Strategy is a picklable function (candles, params) -> positions of shape (n, len(params)), 1 long and 0 flat
+at the close of every candle, computed for a whole batch of parameter sets at once. Workers map the pair's
+.klines file themselves, so prices are shared through the page cache and only parameter sets and result rows
+travel between processes. Position taken at a close earns the next close-to-close return, every change of
+position costs fee + slippage. Memory of one batch is about 8 * n * batch_size bytes per temporary.
+"""
+
+YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+_candles = None
+
+
+def make_grid(**ranges):
+    """
+    :return List of parameter dicts for every combination, e.g. make_grid(fast=range(5, 50), slow=range(50, 200))
+    """
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*ranges.values())]
+
+
+def get_sma_cross_positions(candles, params):
+    """
+    Example strategy, long while simple moving average over fast candles is above the one over slow candles
+    """
+    close = np.asarray(candles['close'], dtype=np.float64)
+    averages = {w: get_sma(close, w) for w in {p[k] for p in params for k in ('fast', 'slow')}}
+    fast = np.column_stack([averages[p['fast']] for p in params])
+    slow = np.column_stack([averages[p['slow']] for p in params])
+    return (fast > slow).astype(np.int8)
+
+
+def get_metrics(close, positions, cost, periods_per_year):
+    """
+    :param positions Array of shape (n, batch)
+    :param cost Relative cost of one change of position
+    :return Dict of metric -> array of shape (batch,)
+    """
+    ret = np.diff(close) / close[:-1]
+    changes = np.abs(np.diff(positions, axis=0, prepend=0))
+    strategy_ret = positions[:-1] * ret[:, None] - cost * changes[:-1]
+    log_equity = np.cumsum(np.log1p(strategy_ret), axis=0)
+    drawdown = (np.maximum.accumulate(np.maximum(log_equity, 0), axis=0) - log_equity).max(axis=0)
+    std = strategy_ret.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, strategy_ret.mean(axis=0) / std * np.sqrt(periods_per_year), 0.0)
+    return {'total_return': np.expm1(log_equity[-1]), 'max_drawdown': -np.expm1(-drawdown), 'sharpe': sharpe,
+            'trades': (np.diff(positions, axis=0) > 0).sum(axis=0), 'exposure': positions.mean(axis=0)}
+
+
+class ParameterSweep:
+    def __init__(self, root_storage_path, pair, tf, strategy, fee=0.001, slippage=0.0005, workers=None,
+                 batch_size=16):
+        """
+        :param strategy Module level function (candles, list of params) -> positions, e.g. get_sma_cross_positions,
+        candles are read-only records of the memory-mapped storage
+        :param workers Processes, os.cpu_count() when None, 1 evaluates in this process
+        :param batch_size Parameter sets evaluated at once by one worker
+        """
+        self.path = os.path.join(root_storage_path, f'Spot/Pairs/{pair}/{tf}/data.csv')
+        self.strategy = strategy
+        self.cost = fee + slippage
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.batch_size = batch_size
+        self.periods_per_year = YEAR_MS / get_interval_ms(tf)
+
+    def run(self, grid, start=None, end=None, rank_by='sharpe', ascending=False):
+        """
+        :param grid List of parameter dicts, e.g. from make_grid
+        :param start, end Epoch ms, whole stored history when not specified
+        :param rank_by Metric the results are sorted by, the highest first unless ascending
+        :return Data frame of params and metrics, best first
+        """
+        batches = [grid[i:i + self.batch_size] for i in range(0, len(grid), self.batch_size)]
+        args = (self.path, start, end)
+        tasks = [(self.strategy, b, self.cost, self.periods_per_year) for b in batches]
+        if self.workers == 1:
+            _init_worker(*args)
+            rows = [r for t in tasks for r in _evaluate(t)]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                        initargs=args) as executor:
+                rows = [r for result in executor.map(_evaluate, tasks) for r in result]
+        return pd.DataFrame(rows).sort_values(rank_by, ascending=ascending, kind='stable').reset_index(drop=True)
+
+
+def _init_worker(path, start, end):
+    global _candles
+    _candles = KlineStore(path).read_range(start, end)
+
+
+def _evaluate(task):
+    strategy, params, cost, periods_per_year = task
+    positions = strategy(_candles, params)
+    metrics = get_metrics(np.asarray(_candles['close'], dtype=np.float64), positions, cost, periods_per_year)
+    return [dict(p, **{k: v[i] for k, v in metrics.items()}) for i, p in enumerate(params)]
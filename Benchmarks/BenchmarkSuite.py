@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Benchmarks.ParsersBenchmark import generate_klines, generate_trades, generate_orders
+from MaFin.Client.Parsers import parse_klines, parse_trades, parse_orders
+
+"""End-to-end benchmarks of the data and order pipeline with machine-readable results"""
+"""
+Every case yields results named like cold_storage.append[backend=csv,rows=10000] with seconds per operation,
+best of repeats. Datasets are generated from fixed seeds, so results of two runs on one machine are comparable.
+Results are written as json, --baseline compares them with a stored run and exits with 1 when any result is
+slower than baseline by more than tolerance. Cases whose dependencies can not be imported are reported as skipped.
+
+    python -m MaFin.Benchmarks.BenchmarkSuite --out results.json --baseline baseline.json
+"""
+
+FULL_ROWS = (10000, 1000000, 10000000)
+QUICK_ROWS = (10000, 100000)
+START = 1600000000000
+
+
+def generate_kline_frame(n, seed=0):
+    """
+    :return Data frame of n one minute klines with date column, the layout the storages keep
+    """
+    rng = np.random.default_rng(seed)
+    close = 1e4 + np.cumsum(rng.standard_normal(n))
+    return pd.DataFrame({'date': START + np.arange(n, dtype=np.int64) * 60000, 'open': close, 'high': close + 1,
+                         'low': close - 1, 'close': close, 'vol': rng.random(n),
+                         'close_date': START + np.arange(n, dtype=np.int64) * 60000 + 59999,
+                         'quote_vol': rng.random(n), 'n_trades': rng.integers(0, 100, n),
+                         'taker_buy_base_vol': rng.random(n), 'taker_buy_quote_vol': rng.random(n)})
+
+
+def best_of(func, repeat=3, number=1):
+    """
+    :return Best seconds of one call
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def result(name, seconds, **params):
+    label = ','.join(f'{k}={v}' for k, v in params.items())
+    return {'name': f'{name}[{label}]' if label else name, 'seconds': seconds}
+
+
+def _backends():
+    from MaFin.Data.Storage.CsvBackend import CsvBackend
+    from MaFin.Data.Storage.KlineStore import KlineStore
+    from MaFin.Data.Storage.ParquetBackend import ParquetBackend
+    return {'csv': CsvBackend, 'csv_wal': lambda path: CsvBackend(path, wal=True), 'parquet': ParquetBackend,
+            'klines': KlineStore}
+
+
+def bench_cold_storage(rows, appends=50, append_rows=100):
+    """
+    Save of rows candles, appends of append_rows candles on top of them, cold and cached get
+    """
+    from MaFin.Data.Storage.ColdStorage import ColdStorage
+    for backend_name, backend in _backends().items():
+        for n in rows:
+            directory = tempfile.mkdtemp()
+            try:
+                path = os.path.join(directory, 'data.csv')
+                frame = generate_kline_frame(n + appends * append_rows)
+                history = frame.iloc[:n]
+                storage = ColdStorage(path, backend=backend(path))
+                yield result('cold_storage.save', best_of(lambda: storage.save(history), repeat=1),
+                             backend=backend_name, rows=n)
+                chunks = [frame.iloc[n + i * append_rows:n + (i + 1) * append_rows] for i in range(appends)]
+                start = time.perf_counter()
+                for c in chunks:
+                    storage.append(c)
+                yield result('cold_storage.append', (time.perf_counter() - start) / appends,
+                             backend=backend_name, rows=n)
+
+                def cold_get():
+                    storage.cache.invalidate()
+                    storage.get()
+
+                yield result('cold_storage.get_cold', best_of(cold_get), backend=backend_name, rows=n)
+                yield result('cold_storage.get_cached', best_of(storage.get, number=100), backend=backend_name,
+                             rows=n)
+                storage.dispose()
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_provider_concat(pairs=(4, 32), rows=10000):
+    """
+    BinanceDataProvider._get over every pair, after a write to one storage and when nothing changed
+    """
+    from MaFin.Data.BinanceDataProvider import BinanceDataProvider
+    from MaFin.Data.Storage.ColdStorage import ColdStorage
+    from MaFin.Data.Storage.ReadCache import ReadCache
+    for n in pairs:
+        directory = tempfile.mkdtemp()
+        try:
+            cache = ReadCache()
+            provider = types.SimpleNamespace(read_cache=cache)
+            storages = dict()
+            for i in range(n):
+                path = os.path.join(directory, f'P{i}', 'data.csv')
+                storages[f'P{i}'] = ColdStorage(path, cache=cache)
+                storages[f'P{i}'].save(generate_kline_frame(rows, seed=i).assign(symbol=f'P{i}'))
+
+            def after_write():
+                storages['P0'].version += 1
+                BinanceDataProvider._get(provider, storages, None)
+
+            yield result('provider.get_all_pairs_after_write', best_of(after_write), pairs=n, rows=rows)
+            yield result('provider.get_all_pairs_cached',
+                         best_of(lambda: BinanceDataProvider._get(provider, storages, None), number=100),
+                         pairs=n, rows=rows)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_parsers(rows=(1000, 100000)):
+    cases = [('klines', generate_klines, parse_klines), ('trades', generate_trades, parse_trades),
+             ('orders', generate_orders, parse_orders)]
+    for name, generate, parse in cases:
+        for n in rows:
+            np.random.seed(0)
+            data = generate(n)
+            yield result(f'parse.{name}', best_of(lambda: parse(data), number=max(1, 20000 // n)), rows=n)
+
+
+def bench_hot_storage(ticks=100000):
+    """
+    CandlesHotStorage.save of kline websocket messages, one new candle every 60 ticks
+    """
+    from MaFin.Data.Storage.CandlesHotStorage import CandlesHotStorage
+    storage = CandlesHotStorage('BTCUSDT', time_frames=('1m',))
+    messages = [{'e': 'kline', 's': 'BTCUSDT',
+                 'k': {'t': START + i // 60 * 60000, 'T': START + i // 60 * 60000 + 59999, 'i': '1m',
+                       'o': '1.0', 'h': '2.0', 'l': '0.5', 'c': '%.2f' % (1 + i % 7), 'v': '10.0', 'n': i,
+                       'q': '10.0', 'V': '5.0', 'Q': '5.0', 'x': False}} for i in range(ticks)]
+
+    def save_all():
+        for m in messages:
+            storage.save(m)
+
+    yield result('hot_storage.save', best_of(save_all) / ticks, ticks=ticks)
+
+
+def bench_order_round_trip(orders=200):
+    """
+    Limit order creation and cancel through OrdersManager against local MockExchange
+    """
+    from MaFin.Client.BinanceClient import BinanceClient
+    from MaFin.Client.MockExchange import MockExchange, generate_klines as generate_records
+    from MaFin.Orders.OrdersManager import OrdersManager
+    exchange = MockExchange({('BTCUSDT', '1m'): generate_records(100)}, balances={'USDT': 1e9},
+                            weight_limit=10 ** 9)
+    exchange.start()
+    try:
+        exchange.step(1)
+        client = BinanceClient('mock', 'mock', client=exchange.create_client(), stream_url=exchange.stream_url)
+        manager = OrdersManager(client, None)
+        latencies = []
+        for _ in range(orders):
+            start = time.perf_counter()
+            order_id = manager.create_order_limit_buy('BTCUSDT', 1, '1.00')
+            manager.cancel_order('BTCUSDT', order_id)
+            latencies.append(time.perf_counter() - start)
+        yield result('orders.round_trip_p50', float(np.percentile(latencies, 50)), orders=orders)
+        yield result('orders.round_trip_p99', float(np.percentile(latencies, 99)), orders=orders)
+    finally:
+        exchange.stop()
+
+
+def get_cases(quick=False):
+    rows = QUICK_ROWS if quick else FULL_ROWS
+    return {'cold_storage': lambda: bench_cold_storage(rows),
+            'provider_concat': lambda: bench_provider_concat(),
+            'parsers': lambda: bench_parsers(),
+            'hot_storage': lambda: bench_hot_storage(10000 if quick else 100000),
+            'order_round_trip': lambda: bench_order_round_trip(50 if quick else 200)}
+
+
+def run(cases=None, quick=False):
+    """
+    :param cases Names of cases to run, all when None
+    :return Dict with environment and list of results
+    """
+    available = get_cases(quick)
+    results = []
+    for name in cases or available:
+        try:
+            for r in available[name]():
+                print(f"{r['name']}: {r['seconds'] * 1e3:.4f} ms")
+                results.append(r)
+        except ImportError as e:
+            print(f'{name}: skipped, {e}')
+            results.append({'name': name, 'skipped': str(e)})
+    return {'time': int(time.time()), 'python': sys.version.split()[0], 'platform': platform.platform(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'quick': quick, 'results': results}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    :param tolerance Allowed relative slowdown
+    :return Data frame of results present in both runs with ratio to baseline and regression flag
+    """
+    base = {r['name']: r['seconds'] for r in baseline['results'] if 'seconds' in r}
+    rows = [{'name': r['name'], 'seconds': r['seconds'], 'baseline': base[r['name']],
+             'ratio': r['seconds'] / base[r['name']]} for r in results['results'] if r['name'] in base and
+            'seconds' in r]
+    frame = pd.DataFrame(rows, columns=['name', 'seconds', 'baseline', 'ratio'])
+    frame['regression'] = frame.ratio > 1 + tolerance
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the data and order pipeline')
+    parser.add_argument('--cases', nargs='*', help='cases to run, all by default')
+    parser.add_argument('--quick', action='store_true', help='smaller datasets')
+    parser.add_argument('--out', default='benchmark_results.json', help='where results are written')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative slowdown')
+    args = parser.parse_args(argv)
+    results = run(args.cases, args.quick)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        comparison = compare(results, json.load(f), args.tolerance)
+    print(comparison.to_string(index=False))
+    return 1 if comparison.regression.any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
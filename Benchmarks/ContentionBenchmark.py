@@ -0,0 +1,113 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Benchmarks.BenchmarkSuite import generate_kline_frame
+from MaFin.Data.Storage.ColdStorage import ColdStorage
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+
+"""Read latency and staleness of a large storage while another thread writes to it"""
+"""
+Readers call get() in a loop, alone and while a writer appends rows and every few appends rewrites the whole file.
+'locked' reads the way ColdStorage did before snapshots, holding the storage lock, 'snapshot' is get() as it is.
+Read latency of snapshot reads under writes stays close to the idle one, locked reads wait for every rewrite.
+Only the first snapshot read after a rewrite takes long, it builds the rewritten snapshot the writer left to readers.
+Fast reads are worth nothing if they serve old data, so next to latency every read reports how many rows written
+before it started it did not see.
+
+    python -m MaFin.Benchmarks.ContentionBenchmark 1000000
+"""
+
+
+def measure_reads(read, seconds, written=None):
+    """
+    :param written Callable returning rows stored so far, staleness is not measured if None
+    :return Latencies of read() called back to back for seconds, rows behind the storage of every read
+    """
+    latencies = []
+    behind = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        expected = written() if written is not None else 0
+        start = time.perf_counter()
+        data = read()
+        latencies.append(time.perf_counter() - start)
+        behind.append(max(expected - len(data), 0) if written is not None else 0)
+        # readers in the app do something between reads
+        time.sleep(0.001)
+    return np.array(latencies), np.array(behind)
+
+
+def run(rows=1000000, seconds=5, append_rows=100, rewrite_every=20):
+    """
+    :return Data frame with read latency quantiles and rows behind per read mode, idle and under writes
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'data.csv')
+        frame = generate_kline_frame(rows)
+        storage = ColdStorage(path, backend=CsvBackend(path, wal=True))
+        storage.save(frame)
+        storage.get()
+
+        def locked():
+            with storage.lock:
+                return storage.get()
+
+        stop = threading.Event()
+        appends = []
+        # frames written so far, the rewrite stores them again indexed the way the first save did
+        parts = [frame]
+        stored = [len(frame)]
+
+        def write():
+            last = parts[-1].iloc[-1:]
+            i = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                if i % rewrite_every == rewrite_every - 1:
+                    whole = pd.concat(parts, ignore_index=True)
+                    storage.save(whole)
+                    parts[:] = [whole]
+                else:
+                    chunk = pd.concat([last] * append_rows, ignore_index=True)
+                    chunk['date'] = last['date'].iloc[0] + 60000 * np.arange(1, append_rows + 1)
+                    storage.append(chunk)
+                    parts.append(chunk)
+                    stored[0] += len(chunk)
+                    last = chunk.iloc[-1:]
+                appends.append(time.perf_counter() - start)
+                i += 1
+
+        rows_out = []
+        for mode, read in (('locked', locked), ('snapshot', storage.get)):
+            for load in ('idle', 'writes'):
+                writer = threading.Thread(target=write) if load == 'writes' else None
+                if writer is not None:
+                    stop.clear()
+                    writer.start()
+                latencies, behind = measure_reads(read, seconds, lambda: stored[0])
+                if writer is not None:
+                    stop.set()
+                    writer.join()
+                rows_out.append({'mode': mode, 'load': load, 'reads': len(latencies),
+                                 'p50_ms': np.percentile(latencies, 50) * 1e3,
+                                 'p99_ms': np.percentile(latencies, 99) * 1e3, 'max_ms': latencies.max() * 1e3,
+                                 'stale_reads': (behind > 0).mean(), 'mean_rows_behind': behind.mean(),
+                                 'max_rows_behind': behind.max()})
+        storage.dispose()
+        result = pd.DataFrame(rows_out)
+        result.attrs['writes'] = len(appends)
+        return result
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    print(run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000).to_string(index=False))
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+"""Cold import time of MaFin modules"""
+"""
+Every module is imported in a fresh interpreter with -X importtime, so nothing is cached in sys.modules.
+Reported are wall seconds of the whole interpreter run and seconds of the import itself, best of repeats,
+and which heavy third party packages the import pulled in.
+
+    python -m MaFin.Benchmarks.ImportBenchmark MaFin.Utils.Utils MaFin.Orders.OrdersManager
+"""
+
+MODULES = ('MaFin.Utils.Utils', 'MaFin.Utils.Metrics', 'MaFin.Technicals.LinearRegression',
+           'MaFin.Technicals.IncrementalIndicators', 'MaFin.Data.RefreshScheduler', 'MaFin.Orders.OrdersManager',
+           'MaFin.Data.BinanceDataProvider', 'MaFin.Client.BinanceClient')
+HEAVY = ('numpy', 'pandas', 'pyarrow', 'binance', 'aiohttp', 'websockets', 'sklearn', 'scipy')
+
+
+def measure(module, repeat=5):
+    """
+    :return Dict of best wall and import seconds and heavy packages imported, or of the error the import raised
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    code = f'import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)'
+    row = {'module': module, 'wall_s': float('inf'), 'import_s': float('inf')}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, capture_output=True,
+                                 text=True)
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            return {'module': module, 'error': process.stderr.strip().splitlines()[-1]}
+        row['wall_s'] = min(row['wall_s'], wall)
+        row['import_s'] = min(row['import_s'], float(process.stdout.split()[-1]))
+        imported = {line.rsplit('|', 1)[-1].strip().split('.')[0] for line in process.stderr.splitlines()
+                    if line.startswith('import time:')}
+        row['heavy'] = ','.join(p for p in HEAVY if p in imported)
+    return row
+
+
+def run(modules=MODULES, repeat=5):
+    """
+    :return Data frame with a row per module
+    """
+    return pd.DataFrame([measure(m, repeat) for m in modules])
+
+
+if __name__ == '__main__':
+    print(run(sys.argv[1:] or MODULES).to_string(index=False))
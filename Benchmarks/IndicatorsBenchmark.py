@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Technicals.Indicators import get_rsi, get_atr, get_bollinger, get_macd, get_vwap, compute_indicators
+from MaFin.Technicals.MovingAverage import get_sma, get_ema, get_wma
+
+"""Throughput of the vectorized indicators over many pairs at once"""
+
+SPECS = {
+    'sma_20': (get_sma, ['close'], {'window': 20}),
+    'sma_200': (get_sma, ['close'], {'window': 200}),
+    'ema_12': (get_ema, ['close'], {'span': 12}),
+    'ema_200': (get_ema, ['close'], {'span': 200}),
+    'wma_20': (get_wma, ['close'], {'window': 20}),
+    'rsi_14': (get_rsi, ['close'], {'window': 14}),
+    'atr_14': (get_atr, ['high', 'low', 'close'], {'window': 14}),
+    'bollinger_20': (get_bollinger, ['close'], {'window': 20}),
+    'macd': (get_macd, ['close'], {}),
+    'vwap_20': (get_vwap, ['high', 'low', 'close', 'vol'], {'window': 20}),
+}
+
+
+def generate_candles(n, pairs, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 1e4 + np.cumsum(rng.standard_normal((n, pairs)), axis=0)
+    spread = np.abs(rng.standard_normal((n, pairs)))
+    return {'close': close, 'high': close + spread, 'low': close - spread,
+            'vol': np.abs(rng.standard_normal((n, pairs)))}
+
+
+def run(n=1000000, pairs=16, chunk_size=8):
+    """
+    :return Data frame with seconds and million candles per second of every indicator
+    """
+    data = generate_candles(n, pairs)
+    rows = []
+    for name, spec in SPECS.items():
+        start = time.perf_counter()
+        compute_indicators(data, {name: spec}, chunk_size=chunk_size)
+        seconds = time.perf_counter() - start
+        rows.append({'indicator': name, 'candles': n * pairs, 'seconds': seconds,
+                     'mcandles_per_s': n * pairs / seconds / 1e6})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
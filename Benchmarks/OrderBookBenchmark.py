@@ -0,0 +1,68 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.Storage.OrderBook import OrderBook
+
+"""Cost of applying depth diff events and of the queries order logic prices with"""
+"""
+Book is synced from a generated snapshot of levels around 10000 with 0.01 tick, then diff events change, add and
+remove levels, mostly near the top of the book the way the real stream does.
+"""
+
+
+def generate_snapshot(levels, mid=10000.0, tick=0.01, last_update_id=1000):
+    return {'lastUpdateId': last_update_id,
+            'bids': [['%.2f' % (mid - tick * (i + 1)), '1.0'] for i in range(levels)],
+            'asks': [['%.2f' % (mid + tick * (i + 1)), '1.0'] for i in range(levels)]}
+
+
+def generate_events(n, first_update_id=1001, mid=10000.0, tick=0.01, changes=10, seed=0):
+    rng = np.random.default_rng(seed)
+    events = []
+    for i in range(n):
+        # distance from mid in ticks, most of the changes land near the top
+        distance = np.minimum(rng.geometric(0.05, (2, changes)), 5000)
+        quantity = np.where(rng.random((2, changes)) < 0.3, 0.0, rng.random((2, changes)) * 5)
+        events.append({'e': 'depthUpdate', 'E': i, 's': 'BTCUSDT', 'U': first_update_id + i,
+                       'u': first_update_id + i,
+                       'b': [['%.2f' % (mid - tick * d), '%.8f' % q] for d, q in zip(distance[0], quantity[0])],
+                       'a': [['%.2f' % (mid + tick * d), '%.8f' % q] for d, q in zip(distance[1], quantity[1])]})
+    return events
+
+
+def run(levels=5000, events=20000, queries=20000):
+    """
+    :return Data frame with microseconds per event and per query
+    """
+    snapshot = generate_snapshot(levels)
+    book = OrderBook('BTCUSDT', lambda **params: snapshot)
+    stream = generate_events(events)
+    book.on_depth(stream[0])
+    while not book.is_synced():
+        time.sleep(0.01)
+    rows = []
+
+    start = time.perf_counter()
+    for e in stream[1:]:
+        book.on_depth(e)
+    rows.append({'operation': 'apply depth event (20 levels)', 'us': (time.perf_counter() - start) / (events - 1) * 1e6})
+
+    best = book.get_best_bid()[0]
+    cases = [('best bid and ask', lambda: (book.get_best_bid(), book.get_best_ask())),
+             ('quantity at price', lambda: book.get_quantity('BUY', best)),
+             ('depth to 0.1% from best', lambda: book.get_depth('BUY', best * 0.999)),
+             ('vwap to fill 1 level', lambda: book.get_vwap('BUY', 0.5)),
+             ('vwap to fill 50 levels', lambda: book.get_vwap('BUY', 100.0)),
+             ('10 best levels', lambda: book.get_levels('SELL', 10))]
+    for name, query in cases:
+        start = time.perf_counter()
+        for _ in range(queries):
+            query()
+        rows.append({'operation': name, 'us': (time.perf_counter() - start) / queries * 1e6})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
@@ -0,0 +1,92 @@
+import random
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Client.Parsers import parse_klines, parse_trades, parse_orders
+
+"""Microbenchmark of the typed response parsers against the former object-dtype ones"""
+"""
+Former parsers built the frame straight from the response and left prices as strings,
+so they are measured together with the astype(float) every consumer had to do on top of them
+"""
+
+
+def generate_klines(n):
+    t = 1600000000000
+    return [[t + i * 60000, '%.8f' % random.uniform(1, 1e4), '%.8f' % random.uniform(1, 1e4),
+             '%.8f' % random.uniform(1, 1e4), '%.8f' % random.uniform(1, 1e4), '%.8f' % random.uniform(0, 1e3),
+             t + i * 60000 + 59999, '%.8f' % random.uniform(0, 1e6), random.randint(0, 1000),
+             '%.8f' % random.random(), '%.8f' % random.random(), '0'] for i in range(n)]
+
+
+def generate_trades(n):
+    t = 1600000000000
+    return [{'symbol': 'BTCUSDT', 'id': i, 'orderId': i, 'price': '%.8f' % random.uniform(1, 1e4),
+             'qty': '%.8f' % random.random(), 'commission': '%.8f' % random.random(), 'commissionAsset': 'BNB',
+             'time': t + i, 'isBuyer': True, 'isMaker': False, 'isBestMatch': True} for i in range(n)]
+
+
+def generate_orders(n):
+    t = 1600000000000
+    return [{'symbol': 'BTCUSDT', 'orderId': i, 'clientOrderId': 'x%d' % i, 'price': '%.8f' % random.uniform(1, 1e4),
+             'origQty': '1.00000000', 'executedQty': '0.00000000', 'status': 'NEW', 'timeInForce': 'GTC',
+             'type': 'LIMIT', 'side': 'BUY', 'stopPrice': '0.00000000', 'icebergQty': '0.00000000',
+             'time': t + i} for i in range(n)]
+
+
+def legacy_parse_klines(data):
+    df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'vol', 'close_date', 'quote_vol',
+                               'n_trades', 'taker_buy_base_vol', 'taker_buy_quote_vol', 'dummy'], data=data)
+    df.set_index('date', inplace=True)
+    df.drop('dummy', axis=1, inplace=True)
+    return df.astype(float)
+
+
+def legacy_parse_trades(data):
+    df = pd.DataFrame(columns=['id', 'symbol', 'price', 'qty', 'commission', 'commissionAsset', 'time', 'isBuyer',
+                               'isMaker', 'isBestMatch'], data=data)
+    df['date'] = df.time
+    df.set_index('date', inplace=True)
+    return df.astype({'price': float, 'qty': float, 'commission': float})
+
+
+def legacy_parse_orders(data):
+    df = pd.DataFrame(columns=['time', 'symbol', 'orderId', 'clientOrderId', 'price', 'origQty', 'executedQty',
+                               'status', 'timeInForce', 'type', 'side', 'stopPrice', 'icebergQty'], data=data)
+    df['date'] = df.time
+    df.set_index('orderId', inplace=True)
+    return df.astype({'price': float, 'origQty': float, 'executedQty': float, 'stopPrice': float,
+                      'icebergQty': float})
+
+
+def measure(func, data, repeat=5):
+    """
+    :return Best time of one call in seconds
+    """
+    number = max(1, 20000 // len(data))
+    return min(timeit.repeat(lambda: func(data), number=number, repeat=repeat)) / number
+
+
+def run(sizes=(1000, 100000)):
+    """
+    :return Data frame with timings of every parser for every payload size
+    """
+    cases = [('klines', generate_klines, legacy_parse_klines, parse_klines),
+             ('trades', generate_trades, legacy_parse_trades, parse_trades),
+             ('orders', generate_orders, legacy_parse_orders, parse_orders)]
+    rows = []
+    for name, generate, legacy, typed in cases:
+        for n in sizes:
+            data = generate(n)
+            legacy_s = measure(legacy, data)
+            typed_s = measure(typed, data)
+            typed32_s = measure(lambda d: typed(d, np.float32), data)
+            rows.append({'parser': name, 'rows': n, 'legacy_ms': legacy_s * 1e3, 'typed_ms': typed_s * 1e3,
+                         'typed_float32_ms': typed32_s * 1e3, 'speedup': legacy_s / typed_s})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
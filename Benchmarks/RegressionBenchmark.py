@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Technicals.LinearRegression import get_linear_regressions, get_rolling_regression
+from MaFin.Technicals.TrendLine import TrendLine
+
+"""Closed-form batched line fitting against one fit per line"""
+"""
+Per-line baseline is numpy lstsq, which is what TrendLine used before, sklearn is not imported at all
+"""
+
+
+def run(n=200, lines=5000, window=50):
+    """
+    :return Data frame with seconds of every way of fitting lines lines over n points
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(n, dtype=np.float64) + 450000
+    p = 1e4 + np.cumsum(rng.standard_normal((n, lines)), axis=0)
+    rows = []
+
+    start = time.perf_counter()
+    x = np.vstack([t, np.ones(n)]).T
+    for i in range(lines):
+        np.linalg.lstsq(x, p[:, i], rcond=None)
+    rows.append({'fit': 'lstsq per line', 'seconds': time.perf_counter() - start})
+
+    start = time.perf_counter()
+    line = get_linear_regressions(t, p)
+    line.get_price_for_time(t[:, None])
+    rows.append({'fit': 'batched closed form', 'seconds': time.perf_counter() - start})
+
+    start = time.perf_counter()
+    for i in range(lines):
+        TrendLine(t[0], t[-1], p[0, i], p[-1, i])
+    rows.append({'fit': 'TrendLine per line', 'seconds': time.perf_counter() - start})
+
+    start = time.perf_counter()
+    TrendLine(t[0], t[-1], p[0], p[-1])
+    rows.append({'fit': 'TrendLine batch', 'seconds': time.perf_counter() - start})
+
+    start = time.perf_counter()
+    get_rolling_regression(t, p, window)
+    rows.append({'fit': 'rolling window %d' % window, 'seconds': time.perf_counter() - start})
+
+    frame = pd.DataFrame(rows)
+    frame['lines_per_s'] = lines / frame.seconds
+    return frame
+
+
+if __name__ == '__main__':
+    print(run().to_string(index=False))
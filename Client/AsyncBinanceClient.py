@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import time
+from datetime import datetime
+
+import numpy as np
+from binance.enums import TIME_IN_FORCE_GTC
+from binance.exceptions import BinanceAPIException
+
+try:
+    from binance.async_client import AsyncClient
+except ImportError:
+    # older python-binance keeps AsyncClient in binance.client
+    from binance.client import AsyncClient
+
+from MaFin.Client.Parsers import parse_symbol_info, parse_klines, parse_trades, parse_trades_futures, \
+    parse_orders, parse_balance, parse_balances, parse_exchange_info, failed_frame
+from MaFin.Client.RequestScheduler import RequestScheduler
+from MaFin.Utils.Metrics import METRICS
+
+
+def async_safe_request(func):
+    """
+    Coroutine counterpart of safe_request, waits for the scheduler without blocking the event loop
+    """
+
+    @functools.wraps(func)
+    async def inner(self, *args, **kwargs):
+        for i in range(0, 6):
+            wait = self.scheduler.try_acquire(func.__name__, kwargs)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.scheduler.try_acquire(func.__name__, kwargs)
+            start = time.perf_counter() if METRICS.enabled else None
+            try:
+                r = await func(self, *args, **kwargs)
+                self.scheduler.update(_get_headers(getattr(self.client, 'response', None)))
+                if start is not None:
+                    METRICS.observe('rest_latency_seconds', time.perf_counter() - start, endpoint=func.__name__)
+                return r
+            except BinanceAPIException as e:
+                headers = _get_headers(e.response)
+                self.scheduler.update(headers)
+                METRICS.inc('rest_retries_total', endpoint=func.__name__, status=e.status_code)
+                delay = self.scheduler.backoff(i, e.status_code, headers.get('Retry-After') if headers else None)
+                if i == 5:
+                    METRICS.inc('rest_failures_total', endpoint=func.__name__)
+                    print(f'Request failed 5 times \n returning empty df')
+                    return failed_frame()
+                print(f'Request failed \n reason: {str(e)} \n retrying')
+                await asyncio.sleep(delay)
+
+    return inner
+
+
+def _get_headers(response):
+    return getattr(response, 'headers', None)
+
+
+"""Asyncio variant of BinanceClient with the same parsed data frames api"""
+"""
+All the requests go through one pooled keep-alive aiohttp session of python-binance AsyncClient,
+so any number of storages can be refreshed from a single thread.
+Pass the scheduler of the sync client to share one request weight budget with it.
+"""
+
+
+class AsyncBinanceClient:
+    def __init__(self, client: AsyncClient, scheduler=None, float_dtype=np.float64):
+        """
+        Use AsyncBinanceClient.create, the underlying session has to be created inside running event loop
+        """
+        self.client = client
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.float_dtype = float_dtype
+
+    @classmethod
+    async def create(cls, public_key, private_key, scheduler=None, float_dtype=np.float64):
+        client = await AsyncClient.create(public_key, private_key)
+        return cls(client, scheduler, float_dtype)
+
+    async def close(self):
+        """
+        Closes the pooled session
+        """
+        await self.client.close_connection()
+
+    def get_client(self):
+        return self.client
+
+    @async_safe_request
+    async def get_symbol_info(self, symbol):
+        i = await self.client.get_symbol_info(symbol=symbol)
+        return parse_symbol_info(i)
+
+    @async_safe_request
+    async def get_exchange_info(self, symbols=None):
+        """
+        :param symbols Symbols to return the rules of, every symbol on the exchange if None
+        :return trading rules of the symbols
+        """
+        i = await self.client.get_exchange_info()
+        return parse_exchange_info(i, symbols)
+
+    @async_safe_request
+    async def get_klines(self, **params):
+        """
+        :return klines for given symbol in given time frame
+        """
+        k = await self.client.get_klines(**params)
+        return parse_klines(k, self.float_dtype)
+
+    @async_safe_request
+    async def get_historical_klines(self, **params):
+        """
+        :return klines for given symbol in given time frame
+        """
+        k = await self.client.get_historical_klines(**params)
+        return parse_klines(k, self.float_dtype)
+
+    @async_safe_request
+    async def get_my_trades(self, **params):
+        """
+        :return trades for given symbol
+        """
+        t = await self.client.get_my_trades(**params)
+        return parse_trades(t, self.float_dtype)
+
+    @async_safe_request
+    async def futures_get_my_trades(self, **params):
+        """
+        :return trades for given symbol in futures market
+        """
+        t = await self.client.futures_account_trades(**params)
+        return parse_trades_futures(t, self.float_dtype)
+
+    @async_safe_request
+    async def get_all_orders(self, **params):
+        """
+        :return all orders
+        """
+        o = await self.client.get_all_orders(**params)
+        return parse_orders(o, self.float_dtype)
+
+    @async_safe_request
+    async def futures_get_all_orders(self, **params):
+        """
+        :return all orders for futures
+        """
+        o = await self.client.futures_get_all_orders(**params)
+        return parse_orders(o, self.float_dtype)
+
+    @async_safe_request
+    async def get_open_orders(self, **params):
+        """
+        :return open orders, for every symbol when symbol is not specified
+        """
+        o = await self.client.get_open_orders(**params)
+        return parse_orders(o, self.float_dtype)
+
+    @async_safe_request
+    async def futures_get_open_orders(self, **params):
+        """
+        :return open orders
+        """
+        o = await self.client.futures_get_open_orders(**params)
+        return parse_orders(o, self.float_dtype)
+
+    @async_safe_request
+    async def get_balance(self, **params):
+        """
+        :return account balance
+        """
+        o = await self.client.get_asset_balance(**params)
+        return parse_balance(o)
+
+    @async_safe_request
+    async def get_balances(self, **params):
+        """
+        :return balance of every asset on the account
+        """
+        o = await self.client.get_account(**params)
+        return parse_balances(o)
+
+    @async_safe_request
+    async def create_order(self, symbol, side, quantity, order_type, price=None):
+        if order_type == 'LIMIT' and price is None:
+            raise Exception('Limit order without price passed!')
+        p = await self.client.create_order(symbol=symbol, side=side, type=order_type, quantity=quantity,
+                                           price=price, timestamp=datetime.timestamp(datetime.now()),
+                                           timeInForce=TIME_IN_FORCE_GTC)
+        return p
+
+    @async_safe_request
+    async def cancel_order(self, symbol, order_id):
+        r = await self.client.cancel_order(symbol=symbol, orderId=order_id)
+        return r
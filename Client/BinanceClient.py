@@ -1,53 +1,87 @@
+import functools
 import threading
 import time
 from datetime import datetime
 
-import pandas as pd
+import numpy as np
 from binance.client import Client
 from binance.enums import TIME_IN_FORCE_GTC
 from binance.exceptions import BinanceAPIException
 from binance.streams import BinanceSocketManager
 from events import Events
 
+from MaFin.Client.Parsers import parse_symbol_info, parse_klines, parse_trades, parse_trades_futures, \
+    parse_orders, parse_balance, parse_balances, parse_exchange_info, failed_frame
+from MaFin.Client.RequestScheduler import RequestScheduler
+from MaFin.Utils.Metrics import METRICS
 from MaFin.Utils.Singleton import Singleton
 
 
 def safe_request(func):
     """
     Decorator for safe binance requests
+    Every attempt is admitted by the client's RequestScheduler, failed attempts are retried with jittered backoff
     """
 
-    def inner(*args, **kwargs):
+    @functools.wraps(func)
+    def inner(self, *args, **kwargs):
         for i in range(0, 6):
+            start = time.perf_counter() if METRICS.enabled else None
+            self.scheduler.acquire(func.__name__, kwargs)
+            if start is not None:
+                METRICS.observe('scheduler_wait_seconds', time.perf_counter() - start, endpoint=func.__name__)
+                start = time.perf_counter()
             try:
-                return func(*args, **kwargs)
+                r = func(self, *args, **kwargs)
+                self.scheduler.update(_get_headers(getattr(self.client, 'response', None)))
+                if start is not None:
+                    METRICS.observe('rest_latency_seconds', time.perf_counter() - start, endpoint=func.__name__)
+                return r
             except BinanceAPIException as e:
+                headers = _get_headers(e.response)
+                self.scheduler.update(headers)
+                METRICS.inc('rest_retries_total', endpoint=func.__name__, status=e.status_code)
+                delay = self.scheduler.backoff(i, e.status_code, headers.get('Retry-After') if headers else None)
                 if i == 5:
+                    METRICS.inc('rest_failures_total', endpoint=func.__name__)
                     print(f'Request failed 5 times \n returning empty df')
-                    return pd.DataFrame()
+                    return failed_frame()
                 print(f'Request failed \n reason: {str(e)} \n retrying')
-                time.sleep(0.5)
+                time.sleep(delay)
 
     return inner
 
 
+def _get_headers(response):
+    return getattr(response, 'headers', None)
+
+
 """Class for handling requests to Binance and parsing it to suitable format"""
 
 
 class BinanceClient(metaclass=Singleton):
-    def __init__(self, public_key, private_key):
+    def __init__(self, public_key, private_key, scheduler=None, float_dtype=np.float64, client=None, stream_url=None):
         """
         Safely initializes client from private_file
         If private file is not added to .gitignore, it should be protected with seed
         :param seed: 16 bytes key for AES to decrypt the private key
+        :param scheduler: RequestScheduler admitting the requests, new one with Binance default limits if None
+        :param float_dtype: Type of parsed prices and quantities, np.float32 for memory sensitive runs
+        :param client: python-binance Client to send requests with, e.g. MockExchange.create_client(), new if None
+        :param stream_url: Base url of websocket streams, Binance's when None
         """
 
-        self.client = Client(public_key, private_key)
-        self.bm = BinanceSocketManager(self.client, user_timeout=60 * 60)
-        self.bm_prices = BinanceSocketManager(self.client, user_timeout=60 * 60)
+        self.client = client if client is not None else Client(public_key, private_key)
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.float_dtype = float_dtype
+        self.stream_url = stream_url
+        self.bm = self.__socket_manager()
+        self.bm_prices = self.__socket_manager()
         self.order_filled_event = Events()
         self.balance_changed_event = Events()
         self.klines_prices_sockets = list()
+        self.klines_sockets = list()
+        self.depth_sockets = list()
 
     def get_client(self):
         return self.client
@@ -55,7 +89,16 @@ class BinanceClient(metaclass=Singleton):
     @safe_request
     def get_symbol_info(self, symbol):
         i = self.client.get_symbol_info(symbol=symbol)
-        return self.__parse_symbol_info(i)
+        return parse_symbol_info(i)
+
+    @safe_request
+    def get_exchange_info(self, symbols=None):
+        """
+        :param symbols Symbols to return the rules of, every symbol on the exchange if None
+        :return trading rules of the symbols
+        """
+        i = self.client.get_exchange_info()
+        return parse_exchange_info(i, symbols)
 
     @safe_request
     def get_klines(self, **params):
@@ -63,7 +106,14 @@ class BinanceClient(metaclass=Singleton):
         :return klines for given symbol in given time frame
         """
         k = self.client.get_klines(**params)
-        return self.__parse_klines(k)
+        return parse_klines(k, self.float_dtype)
+
+    @safe_request
+    def get_order_book(self, **params):
+        """
+        :return depth snapshot for given symbol, dict with lastUpdateId, bids and asks as sent by Binance
+        """
+        return self.client.get_order_book(**params)
 
     @safe_request
     def get_historical_klines(self, **params):
@@ -71,7 +121,7 @@ class BinanceClient(metaclass=Singleton):
         :return klines for given symbol in given time frame
         """
         k = self.client.get_historical_klines(**params)
-        return self.__parse_klines(k)
+        return parse_klines(k, self.float_dtype)
 
     @safe_request
     def get_my_trades(self, **params):
@@ -79,7 +129,7 @@ class BinanceClient(metaclass=Singleton):
         :return trades for given symbol
         """
         t = self.client.get_my_trades(**params)
-        return self.__parse_trades(t)
+        return parse_trades(t, self.float_dtype)
 
     @safe_request
     def futures_get_my_trades(self, **params):
@@ -87,7 +137,7 @@ class BinanceClient(metaclass=Singleton):
         :return trades for given symbol in futures market
         """
         t = self.client.futures_account_trades(**params)
-        return self.__parse_trades_futures(t)
+        return parse_trades_futures(t, self.float_dtype)
 
     @safe_request
     def get_all_orders(self, **params):
@@ -95,7 +145,7 @@ class BinanceClient(metaclass=Singleton):
         :return all orders
         """
         o = self.client.get_all_orders(**params)
-        return self.__parse_orders(o)
+        return parse_orders(o, self.float_dtype)
 
     @safe_request
     def futures_get_all_orders(self, **params):
@@ -103,15 +153,15 @@ class BinanceClient(metaclass=Singleton):
         :return all orders for futures
         """
         o = self.client.futures_get_all_orders(**params)
-        return self.__parse_orders(o)
+        return parse_orders(o, self.float_dtype)
 
     @safe_request
     def get_open_orders(self, **params):
         """
-        :return open orders
+        :return open orders, for every symbol when symbol is not specified
         """
         o = self.client.get_open_orders(**params)
-        return self.__parse_orders(o)
+        return parse_orders(o, self.float_dtype)
 
     @safe_request
     def futures_get_open_orders(self, **params):
@@ -119,7 +169,7 @@ class BinanceClient(metaclass=Singleton):
         :return open orders
         """
         o = self.client.futures_get_open_orders(**params)
-        return self.__parse_orders(o)
+        return parse_orders(o, self.float_dtype)
 
     @safe_request
     def savings_get_lending_product_list(self, **params):
@@ -131,57 +181,15 @@ class BinanceClient(metaclass=Singleton):
         :return account balance
         """
         o = self.client.get_asset_balance(**params)
-        return self.__parse_balance(o)
-
-    @staticmethod
-    def __parse_symbol_info(data):
-        df = pd.DataFrame(columns=['symbol', 'status', 'baseAsset', 'baseAssetPrecision', 'quoteAsset',
-                                   'quotePrecision', 'icebergAllowed'], data=data, index=[0])
-
-        df['orderTypes'] = [str(data['orderTypes'])]
-        df['minPrice'] = [str(data['filters'][0]['minPrice'])]
-        df['maxPrice'] = [str(data['filters'][0]['maxPrice'])]
-        df['minQty'] = [str(data['filters'][2]['minQty'])]
-        df['maxQty'] = [str(data['filters'][2]['maxQty'])]
-        df['minNotional'] = [str(data['filters'][3]['minNotional'])]
-        return df
-
-    @staticmethod
-    def __parse_klines(data):
-        df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close', 'vol', 'close_date', 'quote_vol',
-                                   'n_trades', 'taker_buy_base_vol', 'taker_buy_quote_vol', 'dummy'], data=data)
-        df.set_index('date', inplace=True)
-        df.drop('dummy', axis=1, inplace=True)
-        return df
-
-    @staticmethod
-    def __parse_trades(data):
-        df = pd.DataFrame(columns=['id', 'symbol', 'price', 'qty', 'commission', 'commissionAsset', 'time', 'isBuyer',
-                                   'isMaker', 'isBestMatch'], data=data)
-        df['date'] = df.time
-        df.set_index('date', inplace=True)
-        return df
-
-    @staticmethod
-    def __parse_trades_futures(data):
-        df = pd.DataFrame(columns=['id', 'symbol', 'price', 'qty', 'commission', 'commissionAsset', 'time', 'buyer',
-                                   'maker', 'isBestMatch'], data=data)
-        df['date'] = df.time
-        df.set_index('date', inplace=True)
-        return df
-
-    @staticmethod
-    def __parse_orders(data):
-        df = pd.DataFrame(columns=['time', 'symbol', 'orderId', 'clientOrderId', 'price', 'origQty', 'executedQty',
-                                   'status', 'timeInForce', 'type', 'side', 'stopPrice', 'icebergQty'], data=data)
-        df['date'] = df.time
-        df.set_index('orderId', inplace=True)
-        return df
-
-    @staticmethod
-    def __parse_balance(data):
-        df = pd.DataFrame.from_records(columns=['asset', 'free', 'locked'], data=[data])
-        return df
+        return parse_balance(o)
+
+    @safe_request
+    def get_balances(self, **params):
+        """
+        :return balance of every asset on the account
+        """
+        o = self.client.get_account(**params)
+        return parse_balances(o)
 
     @safe_request
     def create_order(self, symbol, side, quantity, order_type, price=None):
@@ -197,13 +205,23 @@ class BinanceClient(metaclass=Singleton):
         return r
 
     def init_stream(self):
-        self.bm = BinanceSocketManager(self.client, user_timeout=60 * 60)
+        self.bm = self.__socket_manager()
         conn_key = self.bm.start_user_socket(self.__handle_stream_message)
         for c, s in self.klines_prices_sockets:
             self.bm.start_symbol_ticker_socket(c, s)
+        for c, tf, s in self.klines_sockets:
+            self.bm.start_kline_socket(c, s, interval=tf)
+        for c, s in self.depth_sockets:
+            self.bm.start_depth_socket(c, s, interval=100)
         self.bm.start()
         self.__keep_stream_alive(conn_key)
 
+    def __socket_manager(self):
+        bm = BinanceSocketManager(self.client, user_timeout=60 * 60)
+        if self.stream_url is not None:
+            bm.STREAM_URL = self.stream_url
+        return bm
+
     def __kill_stream(self):
         self.bm.close()
         self.bm_prices.close()
@@ -228,6 +246,8 @@ class BinanceClient(metaclass=Singleton):
         self.on_order_filled(pair=msg['s'], order_id=msg['i'])
 
     def __handle_stream_message(self, msg):
+        if METRICS.enabled and 'E' in msg:
+            METRICS.observe('websocket_lag_seconds', max(time.time() - msg['E'] / 1000, 0), stream='user')
         if msg['e'] == 'outboundAccountPosition':
             self.__handle_account_change(msg)
         elif msg['e'] == 'executionReport':
@@ -241,6 +261,15 @@ class BinanceClient(metaclass=Singleton):
     def subscribe_kline_price(self, symbol, sub):
         self.klines_prices_sockets.append((symbol, sub))
 
+    def subscribe_kline(self, symbol, interval, sub):
+        self.klines_sockets.append((symbol, interval, sub))
+
+    def subscribe_depth(self, symbol, sub):
+        """
+        Subscribes to diff depth stream of the symbol, e.g. OrderBook.on_depth
+        """
+        self.depth_sockets.append((symbol, sub))
+
     def unsubscribe_order_filled(self, sub):
         self.order_filled_event.on_change -= sub
 
@@ -0,0 +1,205 @@
+import heapq
+import itertools
+import time
+
+"""Order matching and account state of the mock exchange"""
+"""
+Resting limit orders are kept in a heap per symbol and side, every replayed candle fills the bids at or above
+its low and the asks at or below its high at the order price. Market orders fill at the last close.
+Orders, trades and balances are kept in the shape Binance sends them, so responses are built without conversion.
+Commission is taken from the received asset. Every change is passed to listeners as executionReport and
+outboundAccountPosition events, the same as on the user data stream.
+"""
+
+
+class MockExchangeError(Exception):
+    def __init__(self, code, msg, status=400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+def _fmt(value):
+    return '%.8f' % value
+
+
+class MatchingEngine:
+    def __init__(self, symbols, balances, fee=0.001):
+        """
+        :param symbols Dict of symbol -> (base asset, quote asset)
+        :param balances Dict of asset -> free amount
+        :param fee Commission rate
+        """
+        self.symbols = symbols
+        self.fee = fee
+        self.balances = {a: [float(v), 0.0] for a, v in balances.items()}
+        self.orders = dict()
+        self.bids = {s: [] for s in symbols}
+        self.asks = {s: [] for s in symbols}
+        self.trades = {s: [] for s in symbols}
+        self.prices = dict()
+        self.listeners = []
+        self.order_ids = itertools.count(1)
+        self.trade_ids = itertools.count(1)
+
+    def subscribe(self, listener):
+        """
+        :param listener Callable taking user data stream event
+        """
+        self.listeners.append(listener)
+
+    def create_order(self, symbol, side, type, quantity, price=None, newClientOrderId=None, **params):
+        """
+        :return Order as sent by Binance on creation
+        :raise MockExchangeError when params are invalid or balance is insufficient
+        """
+        if symbol not in self.symbols:
+            raise MockExchangeError(-1121, 'Invalid symbol.')
+        if side not in ('BUY', 'SELL') or type not in ('LIMIT', 'MARKET'):
+            raise MockExchangeError(-1102, 'Invalid side or order type.')
+        quantity = float(quantity)
+        if type == 'LIMIT':
+            if price is None:
+                raise MockExchangeError(-1102, "Mandatory parameter 'price' was not sent.")
+            price = float(price)
+        elif symbol not in self.prices:
+            raise MockExchangeError(-2010, 'No price to fill market order at.')
+        base, quote = self.symbols[symbol]
+        lock_price = price if type == 'LIMIT' else self.prices[symbol]
+        asset, amount = (quote, quantity * lock_price) if side == 'BUY' else (base, quantity)
+        self.__lock(asset, amount)
+        order_id = next(self.order_ids)
+        now = int(time.time() * 1000)
+        order = {'symbol': symbol, 'orderId': order_id, 'clientOrderId': newClientOrderId or 'mock%d' % order_id,
+                 'price': _fmt(price or 0), 'origQty': _fmt(quantity), 'executedQty': _fmt(0),
+                 'cummulativeQuoteQty': _fmt(0), 'status': 'NEW', 'timeInForce': params.get('timeInForce', 'GTC'),
+                 'type': type, 'side': side, 'stopPrice': _fmt(0), 'icebergQty': _fmt(0), 'time': now,
+                 'updateTime': now, 'isWorking': True, 'transactTime': now}
+        self.orders[order_id] = order
+        self.__report(order, 'NEW')
+        if type == 'MARKET':
+            self.__fill(order, self.prices[symbol], maker=False)
+        elif not self.__match_now(order):
+            book = self.bids[symbol] if side == 'BUY' else self.asks[symbol]
+            heapq.heappush(book, (-price if side == 'BUY' else price, order_id))
+        return dict(order)
+
+    def cancel_order(self, symbol, orderId=None, **params):
+        """
+        :return Cancelled order
+        """
+        order = self.orders.get(int(orderId)) if orderId is not None else None
+        if order is None or order['symbol'] != symbol or order['status'] != 'NEW':
+            raise MockExchangeError(-2011, 'Unknown order sent.')
+        base, quote = self.symbols[symbol]
+        left = float(order['origQty']) - float(order['executedQty'])
+        self.__unlock(quote if order['side'] == 'BUY' else base,
+                      left * float(order['price']) if order['side'] == 'BUY' else left)
+        order['status'] = 'CANCELED'
+        order['isWorking'] = False
+        order['updateTime'] = int(time.time() * 1000)
+        # cancelled orders stay in the heap and are skipped when they get to the top
+        self.__report(order, 'CANCELED')
+        return dict(order)
+
+    def on_candle(self, symbol, low, high, close):
+        """
+        Fills resting orders the candle went through, the last price becomes close
+        """
+        bids = self.bids[symbol]
+        while bids and -bids[0][0] >= low:
+            order = self.orders[heapq.heappop(bids)[1]]
+            if order['status'] == 'NEW':
+                self.__fill(order, float(order['price']))
+        asks = self.asks[symbol]
+        while asks and asks[0][0] <= high:
+            order = self.orders[heapq.heappop(asks)[1]]
+            if order['status'] == 'NEW':
+                self.__fill(order, float(order['price']))
+        self.prices[symbol] = close
+
+    def get_open_orders(self, symbol=None, **params):
+        return [dict(o) for o in self.orders.values() if o['status'] == 'NEW' and symbol in (None, o['symbol'])]
+
+    def get_all_orders(self, symbol, orderId=None, limit=500, **params):
+        first = int(orderId) if orderId is not None else 0
+        orders = [dict(o) for o in self.orders.values() if o['symbol'] == symbol and o['orderId'] >= first]
+        return orders[:int(limit)]
+
+    def get_my_trades(self, symbol, fromId=None, limit=500, **params):
+        trades = self.trades.get(symbol, [])
+        first = int(fromId) if fromId is not None else 0
+        return [dict(t) for t in trades if t['id'] >= first][:int(limit)]
+
+    def get_account(self, **params):
+        return {'makerCommission': int(self.fee * 10000), 'takerCommission': int(self.fee * 10000),
+                'canTrade': True, 'canWithdraw': True, 'canDeposit': True, 'updateTime': int(time.time() * 1000),
+                'accountType': 'SPOT', 'balances': self.__get_balances(self.balances), 'permissions': ['SPOT']}
+
+    def __match_now(self, order):
+        price = self.prices.get(order['symbol'])
+        if price is None:
+            return False
+        if (order['side'] == 'BUY' and price <= float(order['price'])) or \
+                (order['side'] == 'SELL' and price >= float(order['price'])):
+            self.__fill(order, price, maker=False)
+            return True
+        return False
+
+    def __fill(self, order, price, maker=True):
+        base, quote = self.symbols[order['symbol']]
+        quantity = float(order['origQty'])
+        locked_price = float(order['price']) if order['type'] == 'LIMIT' else price
+        if order['side'] == 'BUY':
+            self.balances[quote][1] -= quantity * locked_price
+            self.balances[quote][0] += quantity * (locked_price - price)
+            commission, commission_asset = quantity * self.fee, base
+            self.__credit(base, quantity - commission)
+        else:
+            self.balances[base][1] -= quantity
+            commission, commission_asset = quantity * price * self.fee, quote
+            self.__credit(quote, quantity * price - commission)
+        now = int(time.time() * 1000)
+        order.update({'executedQty': _fmt(quantity), 'cummulativeQuoteQty': _fmt(quantity * price),
+                      'status': 'FILLED', 'isWorking': False, 'updateTime': now})
+        trade = {'symbol': order['symbol'], 'id': next(self.trade_ids), 'orderId': order['orderId'],
+                 'price': _fmt(price), 'qty': _fmt(quantity), 'quoteQty': _fmt(quantity * price),
+                 'commission': _fmt(commission), 'commissionAsset': commission_asset, 'time': now,
+                 'isBuyer': order['side'] == 'BUY', 'isMaker': maker, 'isBestMatch': True}
+        self.trades[order['symbol']].append(trade)
+        self.__report(order, 'TRADE', trade, maker)
+        self.__publish({'e': 'outboundAccountPosition', 'E': now, 'u': now,
+                        'B': [{'a': a, 'f': _fmt(self.balances[a][0]), 'l': _fmt(self.balances[a][1])}
+                              for a in (base, quote)]})
+
+    def __lock(self, asset, amount):
+        free, locked = self.balances.get(asset, [0.0, 0.0])
+        if free < amount:
+            raise MockExchangeError(-2010, 'Account has insufficient balance for requested action.')
+        self.balances[asset] = [free - amount, locked + amount]
+
+    def __unlock(self, asset, amount):
+        self.balances[asset][0] += amount
+        self.balances[asset][1] -= amount
+
+    def __credit(self, asset, amount):
+        self.balances.setdefault(asset, [0.0, 0.0])[0] += amount
+
+    @staticmethod
+    def __get_balances(balances):
+        return [{'asset': a, 'free': _fmt(free), 'locked': _fmt(locked)} for a, (free, locked) in balances.items()]
+
+    def __report(self, order, execution, trade=None, maker=False):
+        now = int(time.time() * 1000)
+        self.__publish({'e': 'executionReport', 'E': now, 's': order['symbol'], 'c': order['clientOrderId'],
+                        'S': order['side'], 'o': order['type'], 'f': order['timeInForce'], 'q': order['origQty'],
+                        'p': order['price'], 'x': execution, 'X': order['status'], 'i': order['orderId'],
+                        'l': trade['qty'] if trade else _fmt(0), 'z': order['executedQty'],
+                        'L': trade['price'] if trade else _fmt(0), 'n': trade['commission'] if trade else _fmt(0),
+                        'N': trade['commissionAsset'] if trade else None, 'T': now,
+                        't': trade['id'] if trade else -1, 'O': order['time'], 'm': maker})
+
+    def __publish(self, event):
+        for listener in self.listeners:
+            listener(event)
@@ -0,0 +1,383 @@
+import asyncio
+import json
+import os
+import secrets
+import threading
+import time
+
+import numpy as np
+from aiohttp import web, WSMsgType
+
+from MaFin.Client.MatchingEngine import MatchingEngine, MockExchangeError
+from MaFin.Client.RequestScheduler import ENDPOINT_WEIGHTS
+from MaFin.Data.Storage.KlineStore import KlineStore, KLINE_DTYPE
+from MaFin.Utils.Utils import get_interval_ms
+
+"""Local stand-in for Binance spot REST API and websocket streams"""
+"""
+Klines, recorded from cold storage or generated, are replayed candle by candle: every step passes the candle to
+MatchingEngine and pushes kline and ticker events, REST only sees candles already replayed. Orders, trades,
+balances and the user data stream are served by MatchingEngine. Requests are weighted the way Binance does and
+answered with 429 and Retry-After above the per minute limit, clients ignoring it get 418 and a ban.
+Signatures are not checked and futures endpoints are not served.
+Server runs on its own event loop thread, create_client() gives python-binance Client pointed at it.
+"""
+
+QUOTE_ASSETS = ('USDT', 'BUSD', 'USDC', 'BTC', 'ETH', 'BNB')
+
+MOCK_WEIGHTS = {
+    ('GET', '/api/v3/ping'): 1,
+    ('GET', '/api/v3/time'): 1,
+    ('GET', '/api/v3/exchangeInfo'): ENDPOINT_WEIGHTS['get_exchange_info'],
+    ('GET', '/api/v3/klines'): 2,
+    ('GET', '/api/v3/ticker/price'): 2,
+    ('GET', '/api/v3/account'): 20,
+    ('GET', '/api/v3/myTrades'): 20,
+    ('GET', '/api/v3/allOrders'): 20,
+    ('GET', '/api/v3/openOrders'): lambda params: 6 if params.get('symbol') else 80,
+    ('POST', '/api/v3/order'): 1,
+    ('DELETE', '/api/v3/order'): 1,
+    ('POST', '/api/v3/userDataStream'): 2,
+    ('PUT', '/api/v3/userDataStream'): 2,
+    ('DELETE', '/api/v3/userDataStream'): 2,
+}
+
+
+def generate_klines(n, start=1600000000000, tf='1m', price=100.0, volatility=1e-3, seed=0):
+    """
+    :return n candles of geometric random walk as KLINE_DTYPE records
+    """
+    rng = np.random.default_rng(seed)
+    interval = get_interval_ms(tf)
+    close = price * np.exp(np.cumsum(rng.standard_normal(n) * volatility))
+    records = np.zeros(n, dtype=KLINE_DTYPE)
+    records['date'] = start + np.arange(n, dtype=np.int64) * interval
+    records['close_date'] = records['date'] + interval - 1
+    records['open'] = np.r_[price, close[:-1]]
+    records['close'] = close
+    wick = np.abs(rng.standard_normal(n)) * volatility / 2
+    records['high'] = np.maximum(records['open'], close) * (1 + wick)
+    records['low'] = np.minimum(records['open'], close) * (1 - wick)
+    records['vol'] = np.abs(rng.standard_normal(n)) * 10
+    records['quote_vol'] = records['vol'] * close
+    records['n_trades'] = rng.integers(1, 100, n)
+    return records
+
+
+def load_klines(root_storage_path, pairs, time_frames, start=None, end=None):
+    """
+    :return Dict of (pair, time frame) -> candles recorded by BinanceDataProvider
+    """
+    klines = dict()
+    for p in pairs:
+        for tf in time_frames:
+            store = KlineStore(os.path.join(root_storage_path, f'Spot/Pairs/{p}/{tf}/data.csv'))
+            store.init_storage()
+            klines[(p, tf)] = store.read_range(start, end)
+    return klines
+
+
+class MockExchange:
+    def __init__(self, klines, balances=None, start=None, speed=None, fee=0.001, weight_limit=1200,
+                 ban_after=10, ban_seconds=120):
+        """
+        :param klines Dict of (symbol, time frame) -> KLINE_DTYPE records, e.g. from load_klines or generate_klines
+        :param balances Dict of asset -> free amount at start
+        :param start Epoch ms replay starts at, candles before it are history, replay from the first candle if None
+        :param speed Candles of the finest time frame replayed per second, replay only by step() if None
+        :param weight_limit Request weight allowed per minute
+        :param ban_after Requests answered with 429 within a minute before the client is banned with 418
+        """
+        self.klines = {k: np.asarray(v) for k, v in klines.items()}
+        self.symbols = {s: self.__split(s) for s, _ in self.klines}
+        self.engine = MatchingEngine(self.symbols, balances if balances is not None else {'USDT': 10000.0}, fee)
+        self.engine.subscribe(self.__on_user_event)
+        self.tf = min({tf for _, tf in self.klines}, key=get_interval_ms)
+        self.timeline = np.unique(np.concatenate([v['date'] for (_, tf), v in self.klines.items() if tf == self.tf]))
+        self.step_index = int(np.searchsorted(self.timeline, start)) if start is not None else 0
+        self.visible = {k: int(np.searchsorted(v['date'], self.timeline[self.step_index]))
+                        if self.step_index < len(self.timeline) else len(v) for k, v in self.klines.items()}
+        self.speed = speed
+        self.weight_limit = weight_limit
+        self.ban_after = ban_after
+        self.ban_seconds = ban_seconds
+        self.used_weight = 0
+        self.rejected = 0
+        self.window = 0
+        self.banned_until = 0
+        self.listen_keys = set()
+        self.subscriptions = dict()
+        self.loop = None
+        self.runner = None
+        self.thread = None
+        self.started = threading.Event()
+        self.api_url = None
+        self.stream_url = None
+
+    def start(self, host='127.0.0.1', port=0):
+        """
+        Starts server on its own thread
+        :param port Port to listen on, free one is taken when 0
+        :return (api_url, stream_url)
+        """
+        self.thread = threading.Thread(target=self.__serve, args=(host, port), daemon=True)
+        self.thread.start()
+        self.started.wait()
+        return self.api_url, self.stream_url
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop = None
+
+    def step(self, n=1):
+        """
+        Replays next n candles of the finest time frame
+        :return False when there is nothing left to replay
+        """
+        return asyncio.run_coroutine_threadsafe(self.__step(n), self.loop).result()
+
+    def create_client(self, api_key='mock', api_secret='mock'):
+        """
+        :return python-binance Client sending requests to this exchange
+        """
+        from binance.client import Client
+        return type('MockClient', (Client,), {'API_URL': self.api_url})(api_key, api_secret)
+
+    async def create_async_client(self, api_key='mock', api_secret='mock'):
+        """
+        :return python-binance AsyncClient sending requests to this exchange
+        """
+        try:
+            from binance.async_client import AsyncClient
+        except ImportError:
+            from binance.client import AsyncClient
+        return await type('MockAsyncClient', (AsyncClient,), {'API_URL': self.api_url}).create(api_key, api_secret)
+
+    @staticmethod
+    def __split(symbol):
+        for q in QUOTE_ASSETS:
+            if symbol.endswith(q) and len(symbol) > len(q):
+                return symbol[:-len(q)], q
+        return symbol[:-3], symbol[-3:]
+
+    def __serve(self, host, port):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        app = web.Application(middlewares=[self.__limit_weight])
+        app.router.add_route('GET', '/api/v3/ping', lambda r: self.__json({}))
+        app.router.add_route('GET', '/api/v3/time', lambda r: self.__json({'serverTime': int(time.time() * 1000)}))
+        app.router.add_route('GET', '/api/v3/exchangeInfo', self.__exchange_info)
+        app.router.add_route('GET', '/api/v3/klines', self.__klines)
+        app.router.add_route('GET', '/api/v3/ticker/price', self.__ticker_price)
+        app.router.add_route('GET', '/api/v3/account', self.__engine_call(self.engine.get_account))
+        app.router.add_route('GET', '/api/v3/myTrades', self.__engine_call(self.engine.get_my_trades))
+        app.router.add_route('GET', '/api/v3/allOrders', self.__engine_call(self.engine.get_all_orders))
+        app.router.add_route('GET', '/api/v3/openOrders', self.__engine_call(self.engine.get_open_orders))
+        app.router.add_route('POST', '/api/v3/order', self.__engine_call(self.engine.create_order))
+        app.router.add_route('DELETE', '/api/v3/order', self.__engine_call(self.engine.cancel_order))
+        app.router.add_route('*', '/api/v3/userDataStream', self.__user_data_stream)
+        app.router.add_route('GET', '/ws/{stream}', self.__websocket)
+        app.router.add_route('GET', '/stream', self.__websocket)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, host, port)
+        self.loop.run_until_complete(site.start())
+        port = self.runner.addresses[0][1]
+        self.api_url = f'http://{host}:{port}/api'
+        self.stream_url = f'ws://{host}:{port}/'
+        if self.speed is not None:
+            self.loop.create_task(self.__replay())
+        self.started.set()
+        self.loop.run_forever()
+
+    async def __replay(self):
+        while await self.__step(1):
+            await asyncio.sleep(1.0 / self.speed)
+
+    async def __step(self, n):
+        for _ in range(n):
+            if self.step_index >= len(self.timeline):
+                return False
+            date = self.timeline[self.step_index]
+            self.step_index += 1
+            for (symbol, tf), records in self.klines.items():
+                i = self.visible[(symbol, tf)]
+                if tf == self.tf:
+                    if i < len(records) and records['date'][i] == date:
+                        candle = records[i]
+                        self.visible[(symbol, tf)] = i + 1
+                        self.engine.on_candle(symbol, candle['low'], candle['high'], candle['close'])
+                        await self.__publish(f'{symbol.lower()}@kline_{tf}', self.__kline_event(symbol, tf, candle))
+                        await self.__publish(f'{symbol.lower()}@ticker', self.__ticker_event(symbol, candle))
+                else:
+                    # coarser candles are published once the replay got to their last finest candle
+                    end = date + get_interval_ms(self.tf) - 1
+                    while i < len(records) and records['close_date'][i] <= end:
+                        await self.__publish(f'{symbol.lower()}@kline_{tf}',
+                                             self.__kline_event(symbol, tf, records[i]))
+                        i += 1
+                    self.visible[(symbol, tf)] = i
+        return True
+
+    @web.middleware
+    async def __limit_weight(self, request, handler):
+        key = (request.method, request.path)
+        if key not in MOCK_WEIGHTS:
+            return await handler(request)
+        now = time.time()
+        if now < self.banned_until:
+            return self.__error(418, -1003, 'Way too many requests; IP banned.', self.banned_until - now)
+        window = int(now // 60)
+        if window != self.window:
+            self.window, self.used_weight, self.rejected = window, 0, 0
+        weight = MOCK_WEIGHTS[key]
+        weight = weight(await self.__params(request)) if callable(weight) else weight
+        if self.used_weight + weight > self.weight_limit:
+            self.rejected += 1
+            if self.rejected > self.ban_after:
+                self.banned_until = now + self.ban_seconds
+                return self.__error(418, -1003, 'Way too many requests; IP banned.', self.ban_seconds)
+            return self.__error(429, -1003, 'Too many requests.', (window + 1) * 60 - now)
+        self.used_weight += weight
+        response = await handler(request)
+        response.headers['x-mbx-used-weight'] = str(self.used_weight)
+        response.headers['x-mbx-used-weight-1m'] = str(self.used_weight)
+        return response
+
+    @staticmethod
+    async def __params(request):
+        params = dict(request.query)
+        if request.method in ('POST', 'PUT', 'DELETE') and request.can_read_body:
+            params.update(await request.post())
+        params.pop('timestamp', None)
+        params.pop('signature', None)
+        params.pop('recvWindow', None)
+        return params
+
+    @staticmethod
+    def __json(data, status=200):
+        return web.Response(text=json.dumps(data), status=status, content_type='application/json')
+
+    def __error(self, status, code, msg, retry_after=None):
+        response = self.__json({'code': code, 'msg': msg}, status)
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(int(np.ceil(retry_after)))
+        return response
+
+    def __engine_call(self, method):
+        async def handler(request):
+            try:
+                return self.__json(method(**await self.__params(request)))
+            except MockExchangeError as e:
+                return self.__error(e.status, e.code, e.msg)
+            except TypeError as e:
+                return self.__error(400, -1102, str(e))
+
+        return handler
+
+    async def __exchange_info(self, request):
+        params = await self.__params(request)
+        symbols = [params['symbol']] if 'symbol' in params else list(self.symbols)
+        return self.__json({'timezone': 'UTC', 'serverTime': int(time.time() * 1000),
+                            'symbols': [self.__symbol_info(s) for s in symbols if s in self.symbols]})
+
+    def __symbol_info(self, symbol):
+        base, quote = self.symbols[symbol]
+        return {'symbol': symbol, 'status': 'TRADING', 'baseAsset': base, 'baseAssetPrecision': 8,
+                'quoteAsset': quote, 'quotePrecision': 8, 'icebergAllowed': True, 'orderTypes': ['LIMIT', 'MARKET'],
+                'filters': [{'filterType': 'PRICE_FILTER', 'minPrice': '0.00000001', 'maxPrice': '1000000.00000000',
+                             'tickSize': '0.00000001'},
+                            {'filterType': 'PERCENT_PRICE', 'multiplierUp': '5', 'multiplierDown': '0.2'},
+                            {'filterType': 'LOT_SIZE', 'minQty': '0.00000001', 'maxQty': '9000000.00000000',
+                             'stepSize': '0.00000001'},
+                            {'filterType': 'MIN_NOTIONAL', 'minNotional': '10.00000000'}]}
+
+    async def __klines(self, request):
+        params = await self.__params(request)
+        key = (params.get('symbol'), params.get('interval'))
+        if key not in self.klines:
+            return self.__error(400, -1121, 'Invalid symbol.')
+        records = self.klines[key][:self.visible[key]]
+        i = np.searchsorted(records['date'], int(params['startTime'])) if 'startTime' in params else None
+        j = np.searchsorted(records['date'], int(params['endTime']), side='right') if 'endTime' in params else None
+        records = records[i:j]
+        limit = min(int(params.get('limit', 500)), 1000)
+        records = records[:limit] if i is not None else records[-limit:]
+        return self.__json([[int(r['date']), '%.8f' % r['open'], '%.8f' % r['high'], '%.8f' % r['low'],
+                             '%.8f' % r['close'], '%.8f' % r['vol'], int(r['close_date']), '%.8f' % r['quote_vol'],
+                             int(r['n_trades']), '%.8f' % r['taker_buy_base_vol'],
+                             '%.8f' % r['taker_buy_quote_vol'], '0'] for r in records])
+
+    async def __ticker_price(self, request):
+        params = await self.__params(request)
+        prices = [{'symbol': s, 'price': '%.8f' % p} for s, p in self.engine.prices.items()
+                  if params.get('symbol') in (None, s)]
+        return self.__json(prices[0] if 'symbol' in params and prices else prices)
+
+    async def __user_data_stream(self, request):
+        params = await self.__params(request)
+        if request.method == 'POST':
+            key = secrets.token_hex(32)
+            self.listen_keys.add(key)
+            return self.__json({'listenKey': key})
+        if params.get('listenKey') not in self.listen_keys:
+            return self.__error(400, -1125, 'This listenKey does not exist.')
+        if request.method == 'DELETE':
+            self.listen_keys.discard(params['listenKey'])
+        return self.__json({})
+
+    async def __websocket(self, request):
+        if 'stream' in request.match_info:
+            streams, combined = [request.match_info['stream']], False
+        else:
+            streams, combined = request.query.get('streams', '').split('/'), True
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        for s in streams:
+            self.subscriptions.setdefault(s, dict())[ws] = combined
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR:
+                    break
+        finally:
+            for s in streams:
+                self.subscriptions.get(s, dict()).pop(ws, None)
+        return ws
+
+    async def __publish(self, stream, event):
+        subscribers = self.subscriptions.get(stream)
+        if not subscribers:
+            return
+        raw = json.dumps(event)
+        wrapped = None
+        for ws, combined in list(subscribers.items()):
+            if combined and wrapped is None:
+                wrapped = json.dumps({'stream': stream, 'data': event})
+            try:
+                await ws.send_str(wrapped if combined else raw)
+            except ConnectionError:
+                subscribers.pop(ws, None)
+
+    def __on_user_event(self, event):
+        # engine calls come from the event loop thread, so events are sent from there without waiting
+        for key in self.listen_keys:
+            self.loop.create_task(self.__publish(key, event))
+
+    @staticmethod
+    def __kline_event(symbol, tf, candle):
+        return {'e': 'kline', 'E': int(time.time() * 1000), 's': symbol,
+                'k': {'t': int(candle['date']), 'T': int(candle['close_date']), 's': symbol, 'i': tf,
+                      'o': '%.8f' % candle['open'], 'c': '%.8f' % candle['close'], 'h': '%.8f' % candle['high'],
+                      'l': '%.8f' % candle['low'], 'v': '%.8f' % candle['vol'], 'n': int(candle['n_trades']),
+                      'x': True, 'q': '%.8f' % candle['quote_vol'], 'V': '%.8f' % candle['taker_buy_base_vol'],
+                      'Q': '%.8f' % candle['taker_buy_quote_vol']}}
+
+    @staticmethod
+    def __ticker_event(symbol, candle):
+        return {'e': '24hrTicker', 'E': int(time.time() * 1000), 's': symbol, 'o': '%.8f' % candle['open'],
+                'h': '%.8f' % candle['high'], 'l': '%.8f' % candle['low'], 'c': '%.8f' % candle['close'],
+                'v': '%.8f' % candle['vol'], 'q': '%.8f' % candle['quote_vol']}
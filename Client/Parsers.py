@@ -0,0 +1,145 @@
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+"""Parsing of Binance responses into data frames, shared by the sync and async clients"""
+"""
+Klines, trades and orders are decoded column by column straight into typed numpy arrays,
+prices and quantities are floats, times and ids are int64 epoch ms, so nobody downstream has to parse strings again
+"""
+
+KLINE_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'vol', 'close_date', 'quote_vol', 'n_trades',
+                 'taker_buy_base_vol', 'taker_buy_quote_vol']
+KLINE_INT_COLUMNS = {'date', 'close_date', 'n_trades'}
+RECORD_INT_COLUMNS = {'id', 'orderId', 'time'}
+RECORD_FLOAT_COLUMNS = {'price', 'qty', 'commission', 'origQty', 'executedQty', 'stopPrice', 'icebergQty'}
+RECORD_BOOL_COLUMNS = {'isBuyer', 'isMaker', 'isBestMatch', 'buyer', 'maker'}
+
+
+def failed_frame():
+    """
+    :return Empty frame returned by a request which failed every retry, tells it apart from an empty response
+    """
+    df = pd.DataFrame()
+    df.attrs['failed'] = True
+    return df
+
+
+def is_failed(frame):
+    """
+    :return True when frame stands for a failed request, see failed_frame
+    """
+    return isinstance(frame, pd.DataFrame) and frame.attrs.get('failed', False)
+
+
+def parse_symbol_info(data):
+    df = pd.DataFrame(columns=['symbol', 'status', 'baseAsset', 'baseAssetPrecision', 'quoteAsset',
+                               'quotePrecision', 'icebergAllowed'], data=data, index=[0])
+    # filters differ in number and order among symbols, missing ones leave their columns None
+    filters = {f.get('filterType'): f for f in data.get('filters', [])}
+    price = filters.get('PRICE_FILTER', {})
+    lot = filters.get('LOT_SIZE', {})
+    notional = filters.get('MIN_NOTIONAL', filters.get('NOTIONAL', {}))
+
+    df['orderTypes'] = [str(data.get('orderTypes'))]
+    df['minPrice'] = [_str_or_none(price.get('minPrice'))]
+    df['maxPrice'] = [_str_or_none(price.get('maxPrice'))]
+    df['minQty'] = [_str_or_none(lot.get('minQty'))]
+    df['maxQty'] = [_str_or_none(lot.get('maxQty'))]
+    df['minNotional'] = [_str_or_none(notional.get('minNotional'))]
+    return df
+
+
+def _str_or_none(value):
+    return str(value) if value is not None else None
+
+
+def parse_klines(data, float_dtype=np.float64, datetime_index=False):
+    """
+    :param data Klines as sent by Binance, list of lists with prices as strings
+    :param float_dtype Type of price and volume columns, np.float32 halves the memory
+    :param datetime_index Index by datetime64 instead of epoch ms
+    """
+    n = len(data)
+    columns = dict()
+    for i, name in enumerate(KLINE_COLUMNS):
+        dtype = np.int64 if name in KLINE_INT_COLUMNS else float_dtype
+        columns[name] = np.fromiter(map(itemgetter(i), data), dtype=dtype, count=n)
+    return _frame(columns, 'date', datetime_index)
+
+
+def parse_trades(data, float_dtype=np.float64, datetime_index=False):
+    columns = _decode_records(data, ['id', 'symbol', 'price', 'qty', 'commission', 'commissionAsset', 'time',
+                                     'isBuyer', 'isMaker', 'isBestMatch'], float_dtype)
+    columns['date'] = columns['time']
+    return _frame(columns, 'date', datetime_index)
+
+
+def parse_trades_futures(data, float_dtype=np.float64, datetime_index=False):
+    columns = _decode_records(data, ['id', 'symbol', 'price', 'qty', 'commission', 'commissionAsset', 'time',
+                                     'buyer', 'maker', 'isBestMatch'], float_dtype)
+    columns['date'] = columns['time']
+    return _frame(columns, 'date', datetime_index)
+
+
+def parse_orders(data, float_dtype=np.float64, datetime_index=False):
+    columns = _decode_records(data, ['time', 'symbol', 'orderId', 'clientOrderId', 'price', 'origQty', 'executedQty',
+                                     'status', 'timeInForce', 'type', 'side', 'stopPrice', 'icebergQty'], float_dtype)
+    columns['date'] = columns['time']
+    return _frame(columns, 'orderId', datetime_index)
+
+
+def _decode_records(data, names, float_dtype):
+    """
+    Decodes list of dicts column by column, numbers straight into numpy arrays of their type
+    Missing float fields are NaN, other missing fields are None
+    """
+    n = len(data)
+    columns = dict()
+    for name in names:
+        if name in RECORD_INT_COLUMNS:
+            columns[name] = np.fromiter(map(itemgetter(name), data), dtype=np.int64, count=n)
+        elif name in RECORD_FLOAT_COLUMNS:
+            columns[name] = _decode(data, name, float_dtype, 'nan')
+        elif name in RECORD_BOOL_COLUMNS:
+            columns[name] = _decode(data, name, bool, False)
+        else:
+            columns[name] = np.array([d.get(name) for d in data], dtype=object)
+    return columns
+
+
+def _decode(data, name, dtype, missing):
+    try:
+        return np.fromiter(map(itemgetter(name), data), dtype=dtype, count=len(data))
+    except KeyError:
+        return np.fromiter((d.get(name, missing) for d in data), dtype=dtype, count=len(data))
+
+
+def _frame(columns, index, datetime_index):
+    df = pd.DataFrame(columns, copy=False)
+    if datetime_index:
+        df['date'] = pd.to_datetime(df['date'], unit='ms')
+    df.set_index(index, inplace=True)
+    return df
+
+
+def parse_balance(data):
+    df = pd.DataFrame.from_records(columns=['asset', 'free', 'locked'], data=[data])
+    return df
+
+
+def parse_balances(data):
+    df = pd.DataFrame.from_records(columns=['asset', 'free', 'locked'], data=data['balances'])
+    return df
+
+
+def parse_exchange_info(data, symbols=None):
+    """
+    :param symbols Symbols to parse, the exchange lists thousands, all of them if None
+    """
+    wanted = set(symbols) if symbols is not None else None
+    infos = [parse_symbol_info(s) for s in data['symbols'] if wanted is None or s.get('symbol') in wanted]
+    if len(infos) == 0:
+        return pd.DataFrame(columns=['symbol'])
+    return pd.concat(infos, ignore_index=True)
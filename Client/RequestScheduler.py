@@ -0,0 +1,174 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from MaFin.Utils.Metrics import METRICS
+
+""" Central admission of REST requests to Binance """
+"""
+Every request asks the scheduler before it is sent. Requests wait in a priority queue, order placement goes first,
+bulk history fetches go last, and the head of the queue is let through only when its weight fits into what is left
+of the current minute. Used weight reported by Binance in response headers corrects the local estimate.
+"""
+
+ORDER_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+BULK_PRIORITY = 2
+
+# request weights of the endpoints, callables get the request params
+ENDPOINT_WEIGHTS = {
+    'get_symbol_info': 20,
+    'get_exchange_info': 20,
+    'get_klines': 2,
+    'get_historical_klines': 2,
+    'get_my_trades': 20,
+    'futures_get_my_trades': 5,
+    'get_all_orders': 20,
+    'futures_get_all_orders': 5,
+    'get_open_orders': lambda params: 6 if params.get('symbol') else 80,
+    'futures_get_open_orders': lambda params: 1 if params.get('symbol') else 40,
+    'get_balance': 20,
+    'get_balances': 20,
+    'get_order_book': lambda params: 5 if params.get('limit', 100) <= 100 else 25 if params['limit'] <= 500 else
+    50 if params['limit'] <= 1000 else 250,
+    'savings_get_lending_product_list': 1,
+    'create_order': 1,
+    'cancel_order': 1,
+}
+
+ENDPOINT_PRIORITIES = {
+    'create_order': ORDER_PRIORITY,
+    'cancel_order': ORDER_PRIORITY,
+    'get_klines': BULK_PRIORITY,
+    'get_historical_klines': BULK_PRIORITY,
+    'get_my_trades': BULK_PRIORITY,
+    'futures_get_my_trades': BULK_PRIORITY,
+    'get_all_orders': BULK_PRIORITY,
+    'futures_get_all_orders': BULK_PRIORITY,
+}
+
+
+class RequestScheduler:
+    def __init__(self, weight_limit=1200, safety_ratio=0.9, backoff_base=0.5, backoff_cap=30.0):
+        """
+        :param weight_limit Request weight Binance allows per minute
+        :param safety_ratio Part of the limit the scheduler lets through, rest is left for the surprises
+        :param backoff_base Seconds of the first retry backoff, doubled on every next attempt
+        :param backoff_cap Maximum seconds of a retry backoff
+        """
+        self.weight_limit = weight_limit
+        self.safety_ratio = safety_ratio
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.cond = threading.Condition()
+        self.queue = []
+        self.seq = itertools.count()
+        self.window_start = 0
+        self.used_weight = 0
+        self.banned_until = 0
+
+    @staticmethod
+    def get_weight(name, params):
+        """
+        :return Request weight of the endpoint
+        """
+        weight = ENDPOINT_WEIGHTS.get(name, 1)
+        return weight(params) if callable(weight) else weight
+
+    @staticmethod
+    def get_priority(name):
+        """
+        :return Priority of the endpoint, lower goes first
+        """
+        return ENDPOINT_PRIORITIES.get(name, DEFAULT_PRIORITY)
+
+    def acquire(self, name, params):
+        """
+        Blocks until the request may be sent
+        :param name Endpoint name, see ENDPOINT_WEIGHTS
+        :param params Request params
+        """
+        weight = self.get_weight(name, params)
+        with self.cond:
+            ticket = (self.get_priority(name), next(self.seq))
+            heapq.heappush(self.queue, ticket)
+            while True:
+                if self.queue[0] == ticket:
+                    wait = self.__wait_time(weight)
+                    if wait <= 0:
+                        heapq.heappop(self.queue)
+                        self.used_weight += weight
+                        self.cond.notify_all()
+                        return
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait()
+
+    def try_acquire(self, name, params):
+        """
+        Non-blocking variant of acquire for callers which can not block, e.g. coroutines
+        :return 0 if the request may be sent, otherwise seconds to wait before asking again
+        """
+        weight = self.get_weight(name, params)
+        with self.cond:
+            if len(self.queue) > 0 and self.queue[0][0] < self.get_priority(name):
+                return 0.05
+            wait = self.__wait_time(weight)
+            if wait <= 0:
+                self.used_weight += weight
+            return max(wait, 0)
+
+    def update(self, headers):
+        """
+        Takes used weight reported by Binance
+        :param headers Response headers
+        """
+        if headers is None:
+            return
+        used = headers.get('x-mbx-used-weight-1m') or headers.get('x-mbx-used-weight')
+        if used is None:
+            return
+        with self.cond:
+            self.__refresh_window()
+            self.used_weight = max(self.used_weight, int(used))
+        METRICS.set('used_weight', int(used))
+
+    def backoff(self, attempt, status_code=None, retry_after=None):
+        """
+        Registers failed request
+        :param attempt Number of the failed attempt, starting with 0
+        :param status_code HTTP status of the failure, 429 and 418 stop all the requests for retry_after seconds
+        :param retry_after Value of Retry-After header
+        :return Seconds to wait before the retry, exponential with full jitter
+        """
+        if status_code in (418, 429):
+            pause = float(retry_after) if retry_after is not None else 60.0
+            with self.cond:
+                self.banned_until = max(self.banned_until, time.time() + pause)
+                self.cond.notify_all()
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get_used_weight(self):
+        """
+        :return Weight used in the current minute
+        """
+        with self.cond:
+            self.__refresh_window()
+            return self.used_weight
+
+    def __refresh_window(self):
+        now = time.time()
+        if now >= self.window_start + 60:
+            self.window_start = now - now % 60
+            self.used_weight = 0
+
+    def __wait_time(self, weight):
+        now = time.time()
+        if self.banned_until > now:
+            return self.banned_until - now
+        self.__refresh_window()
+        if self.used_weight == 0 or self.used_weight + weight <= self.weight_limit * self.safety_ratio:
+            return 0
+        return self.window_start + 60 - now
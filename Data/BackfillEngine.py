@@ -0,0 +1,148 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from MaFin.Client.Parsers import failed_frame, is_failed
+from MaFin.Data.Storage.ColdStorage import ColdStorage
+from MaFin.Utils.Utils import get_interval_ms
+
+""" Parallel initial load of kline history """
+"""
+[start, end) of every (pair, time frame) is split into chunks of one request each, chunks are fetched concurrently
+on a bounded pool and written to the storage as soon as every chunk before them is written, so the storage
+only ever grows at its end. Storage which already holds candles, e.g. from the refresh loop, gets the history before
+the first of them, loaded into a staging storage next to it and merged in once complete.
+Progress is checkpointed next to the storage and a restarted backfill continues from there.
+A chunk which failed stops its (pair, time frame) until the next run, an empty one is a gap in the history,
+e.g. maintenance or trading halt, and is checkpointed past like any other.
+Only a bounded window of chunks is requested at once, so memory does not grow with the history loaded.
+"""
+
+
+class BackfillEngine:
+    def __init__(self, endpoint, workers=8, chunk_size=1000):
+        """
+        :param endpoint Klines endpoint, e.g. BinanceClient.get_klines
+        :param workers Number of concurrent requests
+        :param chunk_size Candles per request, 1000 is the maximum Binance allows
+        """
+        self.endpoint = endpoint
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def backfill(self, storages, start, end=None):
+        """
+        Loads klines history into the storages
+        :param storages dict of (pair, time frame) -> ColdStorage
+        :param start Epoch ms to load history from
+        :param end Epoch ms to load history until, now when not specified
+        :return dict of (pair, time frame) -> epoch ms the storage is complete until
+        """
+        end = end if end is not None else int(time.time() * 1000)
+        chunks = dict()
+        targets = dict()
+        for (pair, tf), storage in storages.items():
+            frm, until, targets[(pair, tf)] = self.__plan(storage, start, end)
+            chunks[(pair, tf)] = self.__split(frm, until, tf)
+
+        pending = {key: dict() for key in chunks}
+        flushed = {key: 0 for key in chunks}
+        failed = set()
+        jobs = ((key, idx, r) for key, ranges in chunks.items() for idx, r in enumerate(ranges))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = dict()
+
+            def submit():
+                for key, idx, (chunk_start, chunk_end) in jobs:
+                    # chunks of a failed (pair, time frame) are not requested any more
+                    if key not in failed:
+                        f = pool.submit(self.endpoint, symbol=key[0], interval=key[1], startTime=chunk_start,
+                                        endTime=chunk_end - 1, limit=self.chunk_size)
+                        futures[f] = (key, idx)
+                        return
+
+            # a bounded window of chunks is in flight, fetched frames are dropped as soon as they are written
+            for _ in range(self.workers * 2):
+                submit()
+            while len(futures) > 0:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    key, idx = futures.pop(f)
+                    submit()
+                    if key in failed:
+                        continue
+                    try:
+                        pending[key][idx] = f.result()
+                    except Exception as e:
+                        # chunks before it are still written once they come
+                        print(f'Backfill chunk of {key[0]} {key[1]} failed \n reason: {str(e)}')
+                        pending[key][idx] = failed_frame()
+                    if not self.__flush(key, storages[key], targets[key], chunks[key], pending[key], flushed):
+                        print(f'Backfill of {key[0]} {key[1]} stopped at a missing chunk, it is resumed on next run')
+                        failed.add(key)
+
+        for key, storage in storages.items():
+            if targets[key] is not storage and key not in failed:
+                storage.merge(targets[key])
+                targets[key].dispose()
+                shutil.rmtree(os.path.dirname(targets[key].storage), ignore_errors=True)
+        return {key: chunks[key][flushed[key] - 1][1] if flushed[key] > 0 else None for key in chunks}
+
+    def __flush(self, key, storage, target, ranges, pending, flushed):
+        """
+        Writes every chunk which has all the chunks before it written to target, checkpoints the storage
+        :return False when a chunk failed to be fetched
+        """
+        while flushed[key] in pending:
+            idx = flushed[key]
+            frame = pending.pop(idx)
+            if is_failed(frame):
+                # nothing after it may be written or checkpointed
+                return False
+            if not frame.empty:
+                target.append(frame)
+            self.__write_checkpoint(storage, ranges[idx][1])
+            flushed[key] += 1
+        return True
+
+    def __plan(self, storage, start, end):
+        """
+        Empty storage is loaded up to end, one which holds candles up to the first of them
+        :return (from, until, storage to write the chunks to)
+        """
+        checkpoint = self.__read_checkpoint(storage)
+        frm = max(start, checkpoint) if checkpoint is not None else start
+        stored = storage.get_range()
+        if len(stored) == 0:
+            return frm, end, storage
+        return frm, int(np.asarray(stored['date'])[0]), self.__staging(storage)
+
+    @staticmethod
+    def __staging(storage):
+        path = os.path.join(os.path.dirname(storage.storage), 'backfill', 'data.csv')
+        return ColdStorage(path, backend=type(storage.backend)(path))
+
+    def __split(self, start, end, tf):
+        step = self.chunk_size * get_interval_ms(tf)
+        return [(s, min(s + step, end)) for s in range(start, end, step)]
+
+    @staticmethod
+    def __checkpoint_path(storage):
+        return os.path.join(os.path.dirname(storage.storage), 'backfill.json')
+
+    def __read_checkpoint(self, storage):
+        path = self.__checkpoint_path(storage)
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return json.load(f)['until']
+
+    def __write_checkpoint(self, storage, until):
+        path = self.__checkpoint_path(storage)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'until': until}, f)
+        os.replace(path + '.tmp', path)
@@ -1,11 +1,23 @@
+import asyncio
 import json
 import os
-import threading
 
+import numpy as np
 import pandas as pd
 
+from MaFin.Data.BackfillEngine import BackfillEngine
+from MaFin.Data.BulkEndpoint import BulkEndpoint
+from MaFin.Data.RefreshScheduler import RefreshScheduler
+from MaFin.Data.SharedMarketData import SharedMarketData
 from MaFin.Data.Storage.CandlesHotStorage import CandlesHotStorage
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+from MaFin.Data.Storage.KlineStore import KlineStore
+from MaFin.Data.Storage.OrderBook import OrderBook
+from MaFin.Data.Storage.ReadCache import ReadCache
 from MaFin.Data.Storage.SelfUpdatedStorage import SelfUpdatedStorage
+from MaFin.Data.Storage.StorageCursor import StorageCursor
+from MaFin.Utils.HotEvent import HotEvent
+from MaFin.Utils.Metrics import METRICS
 from MaFin.Utils.Singleton import Singleton
 from MaFin.Utils.Utils import get_seconds_to_kline_close
 
@@ -15,12 +27,17 @@ Basically runs all the storages needed and provides the option to perform "hot u
 hot update is triggered by some event from outside in order to maintain maximum timeliness
 """
 
+# orders in these states do not change any more, the others are fetched again on every refresh
+FINAL_ORDER_STATUSES = ('FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH')
+
 
 class BinanceDataProvider(metaclass=Singleton):
-    def __init__(self, root_storage_path, client):
+    def __init__(self, root_storage_path, client, backend_factory=None):
         """
         Initializes new storage manager with help of configuration.
         Should only be one instance in running app
+        :param backend_factory Callable creating StorageBackend for given storage path, .csv files with write-ahead
+        log when not specified
         """
         with open('../config.json') as config_file:
             config = json.load(config_file)
@@ -29,6 +46,16 @@ class BinanceDataProvider(metaclass=Singleton):
         self.default_futures_pairs = config["binance"]["default_futures_pairs"]
         self.default_time_frames = config["binance"]["default_time_frames"]
         self.default_symbols = config['binance']['default_symbols']
+        self.initial_load_start = config['binance'].get('initial_load_start')
+        self.backfill_workers = config['binance'].get('backfill_workers', 8)
+        self.refresh_workers = config['binance'].get('refresh_workers', 4)
+        self.hot_candles_mode = config['binance'].get('hot_candles_mode', 'kline')
+        # write-ahead log of .csv storages, None disables it, otherwise sync mode 'always', 'batch' or 'never'
+        self.wal_sync = config['binance'].get('wal_sync', 'batch')
+        # name of shared memory segment strategy processes attach to, nothing is shared if None
+        self.shared_memory = config['binance'].get('shared_memory')
+        self.shared_kline_capacity = config['binance'].get('shared_kline_capacity', 1000)
+        self.order_book_pairs = config['binance'].get('order_book_pairs', [])
         self.client = client
         self.hot_events = dict()
 
@@ -40,38 +67,91 @@ class BinanceDataProvider(metaclass=Singleton):
         self.futures_orders_storage = dict()
         self.balance_storage = dict()
         self.candles_hot_storage = dict()
+        self.order_books = dict()
+        self.self_updated_storages = list()
+        self.bulk_endpoints = dict()
+        self.refresh_scheduler = None
+        self.shared = None
 
         self.client.subscribe_order_filled(self.on_order_change)
         self.root_storage_path = root_storage_path
+        self.backend_factory = backend_factory
+        self.read_cache = ReadCache()
 
     """ Public api """
 
     def run(self):
         """
         Isn't it obvious?
+        Storages are refreshed by one RefreshScheduler on refresh_workers threads
         """
-        self.__run_pairs_storage()
-        self.__run_spot_trades_storage()
-        self.__run_spot_orders_storage()
-        self.__run_spot_open_orders_storage()
-        self.__run_futures_trades_storage()
-        self.__run_futures_orders_storage()
-        self.__run_balance_storage()
-        self.__run_hot_candles_storage()
-        self.__run_trading_rules_storage()
+        self.__init_storages()
+        if self.shared_memory is not None:
+            self.__init_shared_market_data()
+        self.__backfill()
+        self.refresh_scheduler = RefreshScheduler(self.refresh_workers)
+        for s in self.self_updated_storages:
+            self.refresh_scheduler.register(s)
+        self.refresh_scheduler.start()
         # self.client.init_stream()
 
+    def stop(self):
+        """
+        Stops refreshing, waits for the refreshes in progress and compacts write-ahead logs
+        """
+        if self.refresh_scheduler is not None:
+            self.refresh_scheduler.stop()
+            self.refresh_scheduler = None
+        for s in self.self_updated_storages:
+            s.flush()
+        if self.shared is not None:
+            self.shared.unlink()
+            self.shared = None
+
+    async def run_async(self, async_client):
+        """
+        Runs all the storages as coroutines on the running event loop instead of a thread per storage
+        :param async_client AsyncBinanceClient with the same endpoints as the sync client
+        """
+        self.__init_storages()
+        if self.shared_memory is not None:
+            self.__init_shared_market_data()
+        await asyncio.get_running_loop().run_in_executor(None, self.__backfill)
+        await asyncio.gather(*[s.run_async(self.__async_endpoint(s.data_endpoint, async_client))
+                               for s in self.self_updated_storages])
+
     def invoke_hot_event(self, symbol, event_type):
         """
         Entry point for hot event execution
         """
+        self.__invalidate_bulk_endpoints()
         self.hot_events[(event_type, symbol)].set()
 
-    def get_klines(self, pair=None):
+    def get_klines(self, pair=None, tf=None, start=None, end=None, live=False):
         """
-        :return klines for given pair, or for every pair when pair is not specified
+        :return Read-only view of candles of the pair and time frame with start <= date < end (epoch ms),
+        with pair or time frame not specified dict of (pair, time frame) -> such view for every one matching
+        With live set, candles from kline websocket newer than the stored ones are added, including the one in progress
         """
-        return self._get(self.pairs_storage, pair)
+        if pair is None or tf is None:
+            return {(p, t): self.get_klines(p, t, start, end, live) for p, t in self.pairs_storage
+                    if pair in (None, p) and tf in (None, t)}
+        stored = self.pairs_storage[(pair, tf)].get_range(start, end)
+        if not live or tf not in self.candles_hot_storage[pair].klines:
+            return stored
+        recent = self.candles_hot_storage[pair].get_klines(tf)
+        mask = recent['date'] > (stored['date'][-1] if len(stored) > 0 else -1)
+        if start is not None:
+            mask &= recent['date'] >= start
+        if end is not None:
+            mask &= recent['date'] < end
+        return np.concatenate((stored, recent[mask])) if mask.any() else stored
+
+    def get_order_book(self, pair):
+        """
+        :return OrderBook of the pair, kept only for pairs listed in order_book_pairs config
+        """
+        return self.order_books[pair]
 
     def get_balance(self, symbol=None):
         """
@@ -115,94 +195,214 @@ class BinanceDataProvider(metaclass=Singleton):
         """
         return self._get(self.candles_hot_storage, pair)
 
+    def get_cache_stats(self):
+        """
+        :return hit/miss stats of the read cache shared by all the storages
+        """
+        return self.read_cache.stats()
+
+    def get_metrics(self):
+        """
+        :return Snapshot of the process metrics together with read cache stats, empty unless METRICS is enabled
+        """
+        return dict(METRICS.snapshot(), read_cache=self.get_cache_stats())
+
     """ Private methods """
 
-    @staticmethod
-    def _get(storage, pair):
+    def _get(self, storage, pair):
         if pair is None:
-            return pd.concat([x.get() for x in storage.values()])
+            storages = list(storage.values())
+            if not all(hasattr(x, 'snapshot') for x in storages):
+                return pd.concat([x.get() for x in storages])
+            # versions and data are taken together, a write landing in between can not mislabel the concat
+            snapshots = [x.snapshot() for x in storages]
+            return self.read_cache.get(('concat',) + tuple(id(x) for x in storages),
+                                       tuple(v for v, _ in snapshots), lambda: pd.concat([d for _, d in snapshots]))
         return storage[pair].get()
 
-    def __run_pairs_storage(self):
+    def __init_storages(self):
+        self.__init_bulk_endpoints()
+        self.__init_pairs_storage()
+        self.__init_spot_trades_storage()
+        self.__init_spot_orders_storage()
+        self.__init_spot_open_orders_storage()
+        self.__init_futures_trades_storage()
+        self.__init_futures_orders_storage()
+        self.__init_balance_storage()
+        self.__init_hot_candles_storage()
+        self.__init_order_books()
+        self.__init_trading_rules_storage()
+
+    def __backfill(self):
+        if self.initial_load_start is not None:
+            BackfillEngine(self.client.get_klines, self.backfill_workers).backfill(self.pairs_storage,
+                                                                                  int(self.initial_load_start))
+
+    def __init_bulk_endpoints(self):
+        self.bulk_endpoints['balances'] = BulkEndpoint(self.client.get_balances, 'asset')
+        self.bulk_endpoints['spot_open_orders'] = BulkEndpoint(self.client.get_open_orders, 'symbol')
+        self.bulk_endpoints['trading_rules'] = BulkEndpoint(self.client.get_exchange_info, 'symbol',
+                                                            symbols=self.default_pairs)
+
+    def __invalidate_bulk_endpoints(self):
+        for b in self.bulk_endpoints.values():
+            b.invalidate()
+
+    @staticmethod
+    def __async_endpoint(endpoint, async_client):
+        if isinstance(endpoint, BulkEndpoint):
+            return endpoint.bind_async(getattr(async_client, endpoint.endpoint.__name__))
+        return getattr(async_client, endpoint.__name__)
+
+    def __backend(self, dirname, key=None):
+        """
+        :param key Column upserts are made by, lets write-ahead log take them without rewriting the file
+        """
+        if self.backend_factory is not None:
+            return self.backend_factory(dirname)
+        if self.wal_sync is not None:
+            return CsvBackend(dirname, wal=True, sync=self.wal_sync, key=key)
+        return None
+
+    def __init_pairs_storage(self):
         for p in self.default_pairs:
             for tf in self.default_time_frames:
-                e = threading.Event()
+                e = HotEvent()
                 dirname = os.path.join(self.root_storage_path, f'Spot/Pairs/{p}/{tf}/data.csv')
                 s = SelfUpdatedStorage(dirname, self.client.get_klines, e,
-                                       lambda: get_seconds_to_kline_close(tf), symbol=p, interval=tf)
-                # todo: Handle initial load
-                # s.initial_load(self.client.get_historical_klines, symbol=p, interval=tf, start_str='1600000000000')
-                s.start()
+                                       lambda tf=tf: get_seconds_to_kline_close(tf), symbol=p, interval=tf,
+                                       backend=KlineStore(dirname), cache=self.read_cache,
+                                       cursor=StorageCursor('date', 'startTime', offset=0, upsert=True))
+                self.self_updated_storages.append(s)
+                self.pairs_storage[(p, tf)] = s
 
-    def __run_spot_trades_storage(self):
+    def __init_spot_trades_storage(self):
         for p in self.default_pairs:
-            e = threading.Event()
+            e = HotEvent()
             self.hot_events[("spot_trades", str(p))] = e
             dirname = os.path.join(self.root_storage_path, f'Spot/Trades/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.get_my_trades, e, symbol=p, startTime=1588080065000)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.client.get_my_trades, e, symbol=p, startTime=1588080065000,
+                                   backend=self.__backend(dirname), cache=self.read_cache,
+                                   cursor=StorageCursor('id', 'fromId'))
+            self.self_updated_storages.append(s)
             self.spot_trades_storage[p] = s
 
-    def __run_spot_orders_storage(self):
+    def __init_spot_orders_storage(self):
         for p in self.default_pairs:
-            e = threading.Event()
+            e = HotEvent()
             self.hot_events[("spot_orders", str(p))] = e
             dirname = os.path.join(self.root_storage_path, f'Spot/Orders/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.get_all_orders, e, symbol=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.client.get_all_orders, e, symbol=p,
+                                   backend=self.__backend(dirname, key='orderId'), cache=self.read_cache,
+                                   cursor=StorageCursor('orderId', 'orderId', open_col='status',
+                                                       final=FINAL_ORDER_STATUSES))
+            self.self_updated_storages.append(s)
             self.spot_orders_storage[p] = s
 
-    def __run_spot_open_orders_storage(self):
+    def __init_spot_open_orders_storage(self):
         for p in self.default_pairs:
-            e = threading.Event()
+            e = HotEvent()
             self.hot_events[("spot_open_orders", str(p))] = e
             dirname = os.path.join(self.root_storage_path, f'Spot/OpenOrders/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.get_open_orders, e, symbol=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.bulk_endpoints['spot_open_orders'], e, symbol=p,
+                                   backend=self.__backend(dirname), cache=self.read_cache, snapshot=True)
+            self.self_updated_storages.append(s)
             self.spot_open_orders_storage[p] = s
 
-    def __run_futures_trades_storage(self):
+    def __init_futures_trades_storage(self):
         for p in self.default_futures_pairs:
-            e = threading.Event()
+            e = HotEvent()
             self.hot_events[("futures_trades", str(p))] = e
             dirname = os.path.join(self.root_storage_path, f'Futures/Trades/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.futures_get_my_trades, e, symbol=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.client.futures_get_my_trades, e, symbol=p,
+                                   backend=self.__backend(dirname), cache=self.read_cache,
+                                   cursor=StorageCursor('id', 'fromId'))
+            self.self_updated_storages.append(s)
             self.futures_trades_storage[p] = s
 
-    def __run_futures_orders_storage(self):
+    def __init_futures_orders_storage(self):
         for p in self.default_futures_pairs:
-            e = threading.Event()
+            e = HotEvent()
             self.hot_events[("futures_orders", str(p))] = e
             dirname = os.path.join(self.root_storage_path, f'Futures/Orders/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.futures_get_all_orders, e, symbol=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.client.futures_get_all_orders, e, symbol=p,
+                                   backend=self.__backend(dirname, key='orderId'), cache=self.read_cache,
+                                   cursor=StorageCursor('orderId', 'orderId', open_col='status',
+                                                       final=FINAL_ORDER_STATUSES))
+            self.self_updated_storages.append(s)
             self.futures_orders_storage[p] = s
 
-    def __run_balance_storage(self):
-        e = threading.Event()
+    def __init_balance_storage(self):
+        e = HotEvent()
         self.hot_events["balance"] = e
         for p in self.default_symbols:
             dirname = os.path.join(self.root_storage_path, f'Balance/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.get_balance, e, asset=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.bulk_endpoints['balances'], e, asset=p,
+                                   backend=self.__backend(dirname), cache=self.read_cache, snapshot=True)
+            self.self_updated_storages.append(s)
             self.balance_storage[p] = s
 
-    def __run_hot_candles_storage(self):
+    def __init_hot_candles_storage(self):
         for p in self.default_pairs:
-            s = CandlesHotStorage(p)
+            if self.hot_candles_mode == 'kline':
+                s = CandlesHotStorage(p, self.default_time_frames)
+                for tf in self.default_time_frames:
+                    self.client.subscribe_kline(p, tf, s.save)
+            else:
+                s = CandlesHotStorage(p)
+                self.client.subscribe_kline_price(p, s.save)
             self.candles_hot_storage[p] = s
-            self.client.subscribe_kline_price(p, s.save)
 
-    def __run_trading_rules_storage(self):
-        e = threading.Event()
+    def __init_order_books(self):
+        for p in self.order_book_pairs:
+            book = OrderBook(p, self.client.get_order_book)
+            self.client.subscribe_depth(p, book.on_depth)
+            self.order_books[p] = book
+
+    def __init_trading_rules_storage(self):
+        e = HotEvent()
         for p in self.default_pairs:
             dirname = os.path.join(self.root_storage_path, f'Rules/{p}/data.csv')
-            s = SelfUpdatedStorage(dirname, self.client.get_symbol_info, e, symbol=p)
-            s.start()
+            s = SelfUpdatedStorage(dirname, self.bulk_endpoints['trading_rules'], e, symbol=p,
+                                   backend=self.__backend(dirname), cache=self.read_cache, snapshot=True)
+            self.self_updated_storages.append(s)
+
+    def __init_shared_market_data(self):
+        """
+        Publishes klines, prices, balances and open orders for strategy processes, see SharedMarketData.attach
+        Everything is published from the storages and streams the provider keeps anyway, so it has to run
+        before they start updating
+        """
+        self.shared = SharedMarketData.create(self.shared_memory, self.default_pairs, self.default_time_frames,
+                                              self.root_storage_path, self.shared_kline_capacity)
+        for (p, tf), s in self.pairs_storage.items():
+            self.__publish_klines(p, tf, s)
+            s.subscribe(lambda storage, p=p, tf=tf: self.__publish_klines(p, tf, storage))
+        for s in self.candles_hot_storage.values():
+            s.subscribe(self.shared.publish)
+        # one publish per bulk request, not one per storage it is fanned out to
+        self.bulk_endpoints['balances'].subscribe(self.__publish_balances)
+        self.bulk_endpoints['spot_open_orders'].subscribe(self.__publish_open_orders)
+        if len(self.balance_storage) > 0:
+            self.shared.publish_balances(self.get_balance())
+        if len(self.spot_open_orders_storage) > 0:
+            self.shared.publish_open_orders(self.get_spot_open_orders())
+
+    def __publish_klines(self, pair, tf, storage):
+        self.shared.publish_klines(pair, tf, storage.get_range()[-self.shared_kline_capacity:])
+
+    def __publish_balances(self, balances):
+        if not balances.empty:
+            self.shared.publish_balances(balances[balances['asset'].isin(self.default_symbols)])
+
+    def __publish_open_orders(self, orders):
+        self.shared.publish_open_orders(orders[orders['symbol'].isin(self.default_pairs)] if not orders.empty
+                                        else orders)
 
     def on_order_change(self, **params):
         print(f'Order status changed for {params["pair"]}')
+        METRICS.inc('order_events_total', pair=params['pair'])
+        self.__invalidate_bulk_endpoints()
         self.hot_events[('spot_orders', params['pair'])].set()
         self.hot_events[('spot_open_orders', params['pair'])].set()
         self.hot_events[('spot_trades', params['pair'])].set()
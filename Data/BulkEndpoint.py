@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+
+""" One bulk request fanned out to the per-pair storages """
+"""
+Storages call the bulk endpoint with their own params, e.g. symbol=BTCUSDT, and get only their rows back.
+The whole refresh cycle shares one request: result is reused for ttl seconds, callers arriving while the request
+is in flight wait for it. invalidate() forces the next caller to fetch, call it before setting a hot event.
+"""
+
+
+class BulkEndpoint:
+    def __init__(self, endpoint, key, ttl=5.0, **endpoint_params):
+        """
+        :param endpoint Endpoint returning rows for every key, e.g. BinanceClient.get_open_orders
+        :param key Column the rows are selected by, callers pass its value as the param of the same name
+        :param ttl Seconds the fetched result is shared for
+        :param endpoint_params Params of every bulk request, e.g. symbols the result is limited to
+        """
+        self.endpoint = endpoint
+        self.key = key
+        self.ttl = ttl
+        self.endpoint_params = endpoint_params
+        self.lock = threading.Lock()
+        self.result = None
+        self.fetched_at = 0
+        self.async_endpoint = None
+        self.async_lock = None
+        self.listeners = []
+
+    def __call__(self, **params):
+        """
+        :return Rows of the bulk result belonging to params[key]
+        """
+        with self.lock:
+            if not self.__is_fresh():
+                self.result = self.endpoint(**self.endpoint_params)
+                self.fetched_at = time.time()
+                self.__notify()
+            return self.__select(self.result, params[self.key])
+
+    def subscribe(self, listener):
+        """
+        :param listener Callable taking the whole bulk result, called after every fetch
+        """
+        self.listeners.append(listener)
+
+    def invalidate(self):
+        """
+        Makes the next call fetch again
+        """
+        self.fetched_at = 0
+
+    def bind_async(self, async_endpoint):
+        """
+        :param async_endpoint Coroutine counterpart of endpoint
+        :return Coroutine function to be used as the endpoint of storages running on event loop
+        """
+        self.async_endpoint = async_endpoint
+        return self.call_async
+
+    async def call_async(self, **params):
+        """
+        Coroutine counterpart of __call__
+        """
+        if self.async_lock is None:
+            self.async_lock = asyncio.Lock()
+        async with self.async_lock:
+            if not self.__is_fresh():
+                self.result = await self.async_endpoint(**self.endpoint_params)
+                self.fetched_at = time.time()
+                self.__notify()
+            return self.__select(self.result, params[self.key])
+
+    def __notify(self):
+        for listener in self.listeners:
+            try:
+                listener(self.result)
+            except Exception as e:
+                print(f'Listener of {self.endpoint.__name__} failed \n reason: {str(e)}')
+
+    def __is_fresh(self):
+        return self.result is not None and time.time() - self.fetched_at < self.ttl
+
+    def __select(self, frame, value):
+        if frame.empty or self.key not in frame.columns:
+            return frame
+        selected = frame[frame[self.key] == value]
+        return selected if selected.index.name is not None else selected.reset_index(drop=True)
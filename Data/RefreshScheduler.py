@@ -0,0 +1,146 @@
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+
+from MaFin.Utils.Metrics import METRICS
+
+"""Central scheduling of SelfUpdatedStorage refreshes"""
+"""
+Instead of a thread per storage, storages wait in one priority queue keyed by the time they are due,
+which is the storage's wait_functor, e.g. seconds to kline close, after its last refresh, or now when its hot event
+is set. One dispatcher thread hands due storages to a bounded worker pool. A storage is never refreshed twice at
+once: hot events arriving while it is queued or running are coalesced into a single refresh after the current one.
+stop() lets running refreshes finish and joins every thread.
+"""
+
+# seconds to the next refresh of a storage whose wait_functor failed
+DEFAULT_WAIT = 60
+
+
+class RefreshScheduler:
+    def __init__(self, workers=4):
+        """
+        :param workers Refreshes running at once
+        """
+        self.workers = workers
+        self.cond = threading.Condition()
+        self.queue = []
+        self.seq = itertools.count()
+        self.due = dict()
+        self.running = set()
+        self.pending = set()
+        self.loaded = set()
+        self.storages = dict()
+        self.executor = None
+        self.dispatcher = None
+        self.stopped = False
+
+    def register(self, storage):
+        """
+        Adds SelfUpdatedStorage, it is loaded as soon as the scheduler runs
+        """
+        key = id(storage)
+        with self.cond:
+            self.storages[key] = storage
+            self.__schedule(key, time.time())
+        storage.hot_event.subscribe(lambda: self.trigger(storage))
+
+    def trigger(self, storage):
+        """
+        Makes the storage due now, called by its hot event
+        """
+        key = id(storage)
+        with self.cond:
+            if key in self.running:
+                self.pending.add(key)
+                METRICS.inc('refresh_coalesced_total')
+                return
+            if self.due.get(key, float('inf')) <= time.time():
+                METRICS.inc('refresh_coalesced_total')
+                return
+            self.__schedule(key, time.time())
+
+    def start(self):
+        self.stopped = False
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix='refresh')
+        self.dispatcher = threading.Thread(target=self.__dispatch, name='refresh-dispatcher', daemon=True)
+        self.dispatcher.start()
+
+    def stop(self, wait=True):
+        """
+        Stops dispatching, running refreshes are finished when wait is set
+        """
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __schedule(self, key, when):
+        self.due[key] = when
+        heapq.heappush(self.queue, (when, next(self.seq), key))
+        self.cond.notify()
+
+    def __dispatch(self):
+        with self.cond:
+            while not self.stopped:
+                if not self.queue:
+                    self.cond.wait()
+                    continue
+                when, _, key = self.queue[0]
+                if self.due.get(key) != when:
+                    # superseded by an earlier trigger
+                    heapq.heappop(self.queue)
+                    continue
+                wait = when - time.time()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+                del self.due[key]
+                self.running.add(key)
+                METRICS.observe('refresh_delay_seconds', -wait)
+                self.executor.submit(self.__refresh, key)
+
+    def __refresh(self, key):
+        storage = self.storages[key]
+        # events set from now on ask for another refresh, the ones before are served by this one
+        storage.hot_event.clear()
+        try:
+            if key in self.loaded:
+                storage.refresh()
+            else:
+                storage.load()
+                self.loaded.add(key)
+        except Exception as e:
+            print(f'Refresh of {storage.storage} failed \n reason: {str(e)}')
+        finally:
+            self.__reschedule(key, storage)
+
+    def __reschedule(self, key, storage):
+        """
+        Queues the storage again, right away if it was triggered meanwhile, otherwise after its wait_functor
+        """
+        try:
+            wait = storage.wait_functor()
+        except Exception as e:
+            print(f'Wait of {storage.storage} failed, retrying in {DEFAULT_WAIT} s \n reason: {str(e)}')
+            wait = DEFAULT_WAIT
+        with self.cond:
+            self.running.discard(key)
+            if key in self.pending:
+                self.pending.discard(key)
+                self.__schedule(key, time.time())
+            else:
+                self.__schedule(key, time.time() + wait)
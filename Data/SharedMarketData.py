@@ -0,0 +1,317 @@
+import json
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.Storage.KlineStore import KlineStore, KLINE_DTYPE
+
+"""Market data published by one provider process to strategy processes on the same machine"""
+"""
+The provider creates one shared memory segment and keeps publishing the recent klines of every (pair, time frame),
+prices, balances and open orders into it. Strategy processes attach to the segment by name and read it without
+talking to Binance, so memory and request weight do not grow with the number of strategy processes.
+The segment starts with a json manifest of its layout, followed by fixed-capacity tables of records.
+Every table is guarded by a sequence number which is odd while the table is written, readers copy the records
+and retry when the sequence number changed meanwhile (seqlock), so a reader never sees a half written table and
+never blocks the provider. Kline history older than the ring is read from the provider's KlineStore files,
+memory mapped read-only, so it is shared through the page cache instead of being copied per process.
+"""
+
+MAGIC = b'MFSHM001'
+PREFIX = struct.Struct('<8sQ')
+ALIGNMENT = 64
+# header of every table: sequence number, records written, time of the last write in epoch ms
+SEQ, COUNT, UPDATED = 0, 1, 2
+HEADER_BYTES = ALIGNMENT
+
+PRICE_DTYPE = np.dtype([('symbol', 'S16'), ('price', np.float64), ('time', np.int64)])
+BALANCE_DTYPE = np.dtype([('asset', 'S16'), ('free', np.float64), ('locked', np.float64)])
+ORDER_DTYPE = np.dtype([('symbol', 'S16'), ('orderId', np.int64), ('clientOrderId', 'S36'), ('side', 'S4'),
+                        ('type', 'S24'), ('status', 'S16'), ('price', np.float64), ('origQty', np.float64),
+                        ('executedQty', np.float64), ('time', np.int64)])
+DTYPES = {'klines': KLINE_DTYPE, 'prices': PRICE_DTYPE, 'balances': BALANCE_DTYPE, 'orders': ORDER_DTYPE}
+
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _to_records(frame: pd.DataFrame, dtype):
+    """
+    :return Structured array of dtype from columns of the frame named like its fields, missing ones are zero
+    """
+    if frame is None or frame.empty:
+        return np.zeros(0, dtype=dtype)
+    frame = frame.reset_index() if frame.index.name in dtype.names else frame
+    records = np.zeros(len(frame), dtype=dtype)
+    for name in dtype.names:
+        if name in frame.columns:
+            kind = dtype[name]
+            values = frame[name].to_numpy()
+            records[name] = values.astype(str).astype(kind) if kind.kind == 'S' else values.astype(kind)
+    return records
+
+
+def _frame(records: np.ndarray):
+    frame = pd.DataFrame(records)
+    for name in records.dtype.names:
+        if records.dtype[name].kind == 'S':
+            frame[name] = frame[name].str.decode('ascii')
+    return frame
+
+
+class SharedTable:
+    def __init__(self, buffer, offset, dtype, capacity, writable):
+        """
+        Records of dtype at offset of buffer, a ring of the last capacity records written
+        """
+        self.capacity = capacity
+        self.header = np.ndarray(3, dtype=np.int64, buffer=buffer, offset=offset)
+        self.records = np.ndarray(capacity, dtype=dtype, buffer=buffer, offset=offset + HEADER_BYTES)
+        if not writable:
+            self.header.flags.writeable = False
+            self.records.flags.writeable = False
+
+    @staticmethod
+    def nbytes(dtype, capacity):
+        return HEADER_BYTES + _aligned(np.dtype(dtype).itemsize * capacity)
+
+    def replace(self, records: np.ndarray):
+        """
+        Replaces the content with the last capacity records
+        """
+        records = records[max(len(records) - self.capacity, 0):]
+        self.header[SEQ] += 1
+        self.records[:len(records)] = records
+        self.header[COUNT] = len(records)
+        self.__commit()
+
+    def push(self, record, key='date'):
+        """
+        Updates the last record in place when its key is the same, otherwise takes the next slot
+        """
+        self.header[SEQ] += 1
+        count = int(self.header[COUNT])
+        if count == 0 or self.records[key][(count - 1) % self.capacity] != record[0]:
+            count += 1
+            self.header[COUNT] = count
+        self.records[(count - 1) % self.capacity] = record
+        self.__commit()
+
+    def set(self, i, record):
+        """
+        Overwrites record at position i, table grows to i + 1 records if needed
+        """
+        self.header[SEQ] += 1
+        self.records[i] = record
+        self.header[COUNT] = max(int(self.header[COUNT]), i + 1)
+        self.__commit()
+
+    def read(self, n=None):
+        """
+        :return Copy of last n records (all kept if None) in the order they were written
+        """
+        while True:
+            seq = int(self.header[SEQ])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            count = int(self.header[COUNT])
+            size = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+            end = count % self.capacity
+            if size <= end:
+                out = self.records[end - size:end].copy()
+            else:
+                out = np.concatenate((self.records[self.capacity - (size - end):], self.records[:end]))
+            if int(self.header[SEQ]) == seq:
+                return out
+
+    def updated(self):
+        """
+        :return Epoch ms of the last write, 0 if nothing was written
+        """
+        return int(self.header[UPDATED])
+
+    def __commit(self):
+        self.header[UPDATED] = int(time.time() * 1000)
+        self.header[SEQ] += 1
+
+
+class SharedMarketData:
+    def __init__(self, segment: shared_memory.SharedMemory, manifest, writable):
+        """
+        Use create() in the provider process and attach() in strategy processes
+        """
+        self.segment = segment
+        self.manifest = manifest
+        self.writable = writable
+        self.lock = threading.Lock()
+        self.tables = {key: SharedTable(segment.buf, t['offset'], DTYPES[t['kind']], t['capacity'], writable)
+                       for key, t in manifest['tables'].items()}
+        self.symbols = {s: i for i, s in enumerate(manifest['symbols'])}
+        self.stores = dict()
+
+    @classmethod
+    def create(cls, name, pairs, time_frames, root_storage_path=None, kline_capacity=1000, max_assets=256,
+               max_orders=1024):
+        """
+        Creates the segment, stale one left by a crashed provider is replaced
+        :param root_storage_path Root of the provider storages, kline history is read from there
+        :param kline_capacity Most recent candles kept in shared memory per pair and time frame
+        """
+        tables = {f'klines/{p}/{tf}': ('klines', kline_capacity) for p in pairs for tf in time_frames}
+        tables.update({'prices': ('prices', max(len(pairs), 1)), 'balances': ('balances', max_assets),
+                       'orders': ('orders', max_orders)})
+        manifest = {'pairs': list(pairs), 'time_frames': list(time_frames), 'symbols': list(pairs),
+                    'root_storage_path': root_storage_path, 'tables': dict()}
+        # offsets depend on the manifest length, it is measured with offsets of more digits than any real one
+        manifest['tables'] = {key: {'kind': kind, 'capacity': capacity, 'offset': 10 ** 15}
+                              for key, (kind, capacity) in tables.items()}
+        offset = _aligned(PREFIX.size + len(json.dumps(manifest).encode()))
+        for key, (kind, capacity) in tables.items():
+            manifest['tables'][key]['offset'] = offset
+            offset += SharedTable.nbytes(DTYPES[kind], capacity)
+        encoded = json.dumps(manifest).encode()
+        try:
+            segment = shared_memory.SharedMemory(name, create=True, size=offset)
+        except FileExistsError:
+            print(f'Replacing stale shared segment {name}')
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            segment = shared_memory.SharedMemory(name, create=True, size=offset)
+        segment.buf[:PREFIX.size + len(encoded)] = PREFIX.pack(MAGIC, len(encoded)) + encoded
+        return cls(segment, manifest, True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attaches to segment created by the provider process, read-only
+        """
+        try:
+            segment = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # before python 3.13 every attached process registers the segment and removes it on exit
+            from multiprocessing import resource_tracker
+            segment = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        magic, length = PREFIX.unpack_from(segment.buf)
+        if magic != MAGIC:
+            segment.close()
+            raise ValueError(f'{name} is not a MaFin shared market data segment')
+        manifest = json.loads(bytes(segment.buf[PREFIX.size:PREFIX.size + length]))
+        return cls(segment, manifest, False)
+
+    """ Publishing, provider process only """
+
+    def publish(self, msg):
+        """
+        Takes kline or ticker websocket message, the same as CandlesHotStorage.save
+        """
+        if msg.get('e') == 'kline':
+            k = msg['k']
+            table = self.tables.get(f"klines/{msg['s']}/{k['i']}")
+            if table is not None:
+                with self.lock:
+                    table.push((k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']),
+                                k['T'], float(k['q']), k['n'], float(k['V']), float(k['Q'])))
+            self.publish_price(msg['s'], float(k['c']), msg.get('E', k['T']))
+        elif 's' in msg and 'c' in msg:
+            self.publish_price(msg['s'], float(msg['c']), msg.get('E', int(time.time() * 1000)))
+
+    def publish_klines(self, pair, tf, records: np.ndarray):
+        """
+        Replaces recent candles of the pair and time frame, e.g. with the tail of its KlineStore
+        """
+        with self.lock:
+            self.tables[f'klines/{pair}/{tf}'].replace(np.asarray(records, dtype=KLINE_DTYPE))
+
+    def publish_price(self, symbol, price, date):
+        i = self.symbols.get(symbol)
+        if i is None:
+            return
+        with self.lock:
+            self.tables['prices'].set(i, (symbol, price, date))
+
+    def publish_balances(self, balances: pd.DataFrame):
+        """
+        :param balances Frame with asset, free and locked columns, e.g. BinanceDataProvider.get_balance()
+        """
+        with self.lock:
+            self.tables['balances'].replace(_to_records(balances, BALANCE_DTYPE))
+
+    def publish_open_orders(self, orders: pd.DataFrame):
+        """
+        :param orders Frame of open orders as parsed by Client.Parsers.parse_orders
+        """
+        with self.lock:
+            self.tables['orders'].replace(_to_records(orders, ORDER_DTYPE))
+
+    """ Reading """
+
+    def get_klines(self, pair, tf, n=None):
+        """
+        :return Copy of last n candles of the pair and time frame kept in shared memory, last may be in progress
+        """
+        return self.tables[f'klines/{pair}/{tf}'].read(n)
+
+    def get_history(self, pair, tf, start=None, end=None):
+        """
+        :return Candles with start <= date < end, stored ones as read-only view of the provider's KlineStore,
+        followed by newer ones from shared memory
+        """
+        store = self.stores.get((pair, tf))
+        if store is None:
+            root = self.manifest['root_storage_path']
+            if root is None:
+                raise ValueError('Shared segment was created without root_storage_path, only recent klines kept')
+            store = self.stores[(pair, tf)] = KlineStore(os.path.join(root, f'Spot/Pairs/{pair}/{tf}/data.csv'))
+        stored = store.read_range(start, end) if os.path.isfile(store.path) else np.empty(0, dtype=KLINE_DTYPE)
+        recent = self.get_klines(pair, tf)
+        mask = recent['date'] > (stored['date'][-1] if len(stored) > 0 else -1)
+        if start is not None:
+            mask &= recent['date'] >= start
+        if end is not None:
+            mask &= recent['date'] < end
+        return np.concatenate((stored, recent[mask])) if mask.any() else stored
+
+    def get_price(self, symbol):
+        """
+        :return Last price of the symbol, None if nothing was published yet
+        """
+        records = self.tables['prices'].read()
+        i = self.symbols[symbol]
+        return float(records['price'][i]) if i < len(records) and records['time'][i] > 0 else None
+
+    def get_prices(self):
+        """
+        :return Frame of symbol, price and time of every symbol with a price
+        """
+        records = self.tables['prices'].read()
+        return _frame(records[records['time'] > 0])
+
+    def get_balances(self):
+        return _frame(self.tables['balances'].read())
+
+    def get_open_orders(self, symbol=None):
+        orders = _frame(self.tables['orders'].read())
+        return orders if symbol is None else orders[orders.symbol == symbol]
+
+    def close(self):
+        """
+        Detaches from the segment, views returned by get_klines are copies and stay valid
+        """
+        self.tables = dict()
+        self.segment.close()
+
+    def unlink(self):
+        """
+        Detaches and removes the segment, provider process only
+        """
+        self.close()
+        self.segment.unlink()
@@ -1,28 +1,66 @@
+import time
+
 import pandas as pd
 
 from MaFin.Data.Storage.HotStorage import __BaseHotStorage
+from MaFin.Data.Storage.KlineRingBuffer import KlineRingBuffer
+from MaFin.Utils.Metrics import METRICS
 
 
 class CandlesHotStorage(__BaseHotStorage):
-    def __init__(self, symbol):
+    def __init__(self, symbol, time_frames=(), capacity=1000):
+        """
+        :param symbol Pair the storage is for
+        :param time_frames Time frames kept from kline websocket, ring buffer of last capacity candles for each
+        """
         super().__init__()
         self.symbol = symbol
-        self.data = None
+        self.price = None
+        self.klines = {tf: KlineRingBuffer(capacity) for tf in time_frames}
+        self.listeners = []
+
+    def subscribe(self, listener):
+        """
+        :param listener Callable taking the websocket message, called after it is saved
+        """
+        self.listeners.append(listener)
 
     def save(self, val):
         """
-        Overrides data in storage
+        Takes ticker or kline websocket message
         """
-        df = pd.DataFrame()
-        df['symbol'] = [val['s']]
-        df['price'] = [val['c']]
-        self.data = df
+        if METRICS.enabled and 'E' in val:
+            METRICS.observe('websocket_lag_seconds', max(time.time() - val['E'] / 1000, 0), stream=self.symbol)
+        if val.get('e') == 'kline':
+            k = val['k']
+            if k['i'] in self.klines:
+                self.klines[k['i']].update(k)
+            self.price = k['c']
+        else:
+            self.price = val['c']
+        for listener in self.listeners:
+            try:
+                listener(val)
+            except Exception as e:
+                print(f'Listener of {self.symbol} candles failed \n reason: {str(e)}')
 
     def get(self):
         """
         :return Data from the storage
         """
-        if self.data is not None:
-            return self.data
+        if self.price is not None:
+            return pd.DataFrame({'symbol': [self.symbol], 'price': [self.price]})
         else:
             return pd.DataFrame()
+
+    def get_klines(self, tf, n=None):
+        """
+        :return Copy of last n candles of the time frame, the last one is the candle in progress
+        """
+        return self.klines[tf].last(n)
+
+    def get_live_candle(self, tf):
+        """
+        :return Candle in progress of the time frame, None if nothing was received yet
+        """
+        return self.klines[tf].live()
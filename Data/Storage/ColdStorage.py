@@ -1,92 +1,244 @@
-import abc
-import os
 import threading
+import time
 
 import pandas as pd
-from pandas.errors import EmptyDataError
+
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+from MaFin.Data.Storage.ReadCache import ReadCache
+from MaFin.Data.Storage.StorageBackend import StorageBackend, merge_rows, select_range
+from MaFin.Utils.Metrics import METRICS, TimedLock
 
 """Base storage class for storing any type of data"""
+"""
+The lock only serializes writers, readers never take it. Every read returns an immutable snapshot published in
+the cache with the version it was read at. Writers make seq odd for the time they touch the backend, a reader
+loading a snapshot keeps it only if seq did not change meanwhile, otherwise it returns the last published snapshot,
+which is what the storage held before the write started. Every write describes the snapshot it leaves behind:
+the written frame for replacing writes, or the snapshot before it plus the rows appended or upserted since.
+The first reader builds it from that description, outside the lock, so writers pay only for the new rows, readers
+do not reload the whole storage after every refresh and do not keep seeing old data while writes keep coming.
+"""
+
+# attempts to load a consistent snapshot before a reader with nothing published yet waits for the writer
+SNAPSHOT_RETRIES = 3
+# writes described on top of the last built snapshot, beyond that the next reader loads the storage from the backend
+MAX_UPDATES = 64
 
 
 class ColdStorage(threading.Thread):
-    def __init__(self, storage_path):
+    def __init__(self, storage_path, backend: StorageBackend = None, cache: ReadCache = None):
         """
         Initializes storage for candle data in multi-threading manner
         :param storage_path Path to .csv storage file
+        :param backend Physical layout of the storage, plain .csv file when not specified
+        :param cache Cache for parsed reads, may be shared among storages
         """
         threading.Thread.__init__(self)
-        self.lock = threading.RLock()
         self.storage = storage_path
+        self.lock = TimedLock(threading.RLock(), 'storage_lock_wait_seconds', storage=storage_path)
+        self.backend = backend if backend is not None else CsvBackend(storage_path)
+        self.cache = cache if cache is not None else ReadCache()
+        self.version = 0
+        self.seq = 0
+        # (version, base, shaped, updates, count) snapshot after the last write, built by the next reader
+        self.published = None
+        self.listeners = []
         self.__init_storage()
 
+    def subscribe(self, listener):
+        """
+        :param listener Callable taking the storage, called after every write
+        """
+        self.listeners.append(listener)
+
     def initial_load(self, endpoint, **params):
         self.save(endpoint(**params))
 
     def append(self, data: pd.DataFrame, sync_col='date'):
         """
         Appends data to storage
+        Only rows newer than the last stored one are written
         :param data: Data frame to save
-        :param sync_col: Index column to mask by
+        :param sync_col: Index or column to mask by, storage is overridden if it is not stored
         """
         with self.lock:
-            f = open(self.storage, 'r+')
-            val = f.readline()
-            f.close()
             frame = data
-            if len(val) <= 1:
-                frame.to_csv(self.storage)
+            last = self.backend.last_value(sync_col) if not self.backend.is_empty() else None
+            if last is None:
+                self.__write(self.backend.write, frame)
                 return
-            else:
-                curr = pd.read_csv(self.storage, index_col=sync_col)
-            if len(curr) == 0 or curr.empty:
-                frame.to_csv(self.storage)
+            values = frame[sync_col] if sync_col in frame.columns else frame.index
+            frame = frame[values > last]
+            if frame.empty:
+                return
+            self.__write(self.backend.append, frame, 'append')
+
+    def upsert(self, data: pd.DataFrame, key_col='date'):
+        """
+        Writes data, stored rows with the same key as one of its rows are replaced by it
+        Data newer than the last stored row is simply appended
+        :param key_col: Index or column identifying a row, e.g. date of a candle, orderId of an order
+        """
+        if data.empty:
+            return
+        with self.lock:
+            last = self.backend.last_value(key_col) if not self.backend.is_empty() else None
+            if last is None:
+                self.__write(self.backend.write, data)
+                return
+            values = data[key_col] if key_col in data.columns else data.index
+            if values.min() > last:
+                self.append(data, sync_col=key_col)
                 return
-            mask = frame.index > curr.index[len(curr) - 1]
-            frame = frame[mask]
-            curr = pd.concat([curr, frame])
-            with self.lock:
-                curr.to_csv(self.storage)
+            self.__write(lambda frame: self.backend.upsert(frame, key_col), data, key_col)
+
+    def merge(self, other, key_col='date'):
+        """
+        Upserts every row of other storage of the same layout, e.g. history loaded aside
+        """
+        rows = other.get()
+        if not rows.empty:
+            self.upsert(self.backend._unflatten(rows), key_col)
 
     def save(self, data: pd.DataFrame):
         """
         Overrides data in storage
+        Readers get data itself once it is shaped the way it is read, it must not be modified afterwards
         """
         with self.lock:
-            data.to_csv(self.storage)
+            self.__write(self.backend.write, data)
 
     def get(self):
         """
-        :return Data from the storage
+        :return Snapshot of the data, shared among readers so it must not be modified in place
         """
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """
+        Never waits for writers, during a write the snapshot published before it is returned
+        :return (version, data) consistent with each other
+        """
+        for _ in range(SNAPSHOT_RETRIES):
+            seq, version = self.seq, self.version
+            entry = self.cache.peek(self.storage)
+            published = self.published
+            if published is not None and (entry is None or published[0] > entry[0]):
+                # the last write finished, or the one before the write in progress
+                self.cache.count(False)
+                return self.cache.put(self.storage, published[0], self.__build(published))
+            if entry is not None and (entry[0] == version or seq % 2 == 1):
+                self.cache.count(True)
+                return entry
+            if seq % 2 == 0:
+                try:
+                    data = self.__read()
+                except Exception:
+                    # torn read of a file being written
+                    data = None
+                if data is not None and self.seq == seq:
+                    self.cache.count(False)
+                    return self.cache.put(self.storage, version, data)
+            time.sleep(0)
         with self.lock:
+            # nothing published yet and writes keep coming
+            self.cache.count(False)
+            return self.cache.put(self.storage, self.version, self.__read())
+
+    def get_range(self, start=None, end=None):
+        """
+        :return Data from the storage with start <= index < end
+        """
+        if self.backend.consistent_reads:
+            return self.backend.read_range(start, end)
+        return select_range(self.get(), start, end)
+
+    def flush(self):
+        """
+        Compacts what the backend keeps aside, e.g. write-ahead log, into the main storage
+        """
+        with self.lock:
+            self.seq += 1
             try:
-                records = pd.read_csv(self.storage)
-            except EmptyDataError:
-                records = pd.DataFrame()
-            return records
+                self.backend.flush()
+            finally:
+                self.seq += 1
 
-    def __init_storage(self):
+    def __write(self, method, frame, update=None):
         """
-        Creates file if it does not exist
+        :param update How the written rows change the snapshot, 'append', key column of an upsert,
+        None when they replace it
         """
-        dirs = os.path.dirname(self.storage)
+        size = self.backend.size() if METRICS.enabled else 0
+        self.seq += 1
         try:
-            os.makedirs(dirs)
-        except OSError:
-            print("Creation of the directory %s failed" % dirs)
-        else:
-            print("Successfully created the directory %s " % dirs)
+            method(frame)
+            self.version += 1
+            self.published = self.__describe(frame, update)
+        finally:
+            self.seq += 1
+        if METRICS.enabled:
+            written = self.backend.size() - size if method == self.backend.append else self.backend.size()
+            METRICS.inc('storage_bytes_written_total', written, storage=self.storage)
+            METRICS.inc('storage_rows_written_total', len(frame), storage=self.storage)
+        for listener in self.listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                print(f'Listener of {self.storage} failed \n reason: {str(e)}')
+
+    def __describe(self, frame, update):
+        """
+        :return Description of the snapshot after the write, None if the next reader has to load it from the backend
+        """
+        if update is None:
+            # shaped by the first reader, not under the lock
+            return self.version, frame, False, [], 0
+        entry = self.cache.peek(self.storage)
+        if entry is not None and entry[0] == self.version - 1:
+            return self.version, entry[1], True, [(update, self.backend.to_read_shape(frame))], 1
+        published = self.published
+        if published is not None and published[0] == self.version - 1 and published[4] < MAX_UPDATES:
+            version, base, shaped, updates, count = published
+            # readers of older descriptions only look at their first count updates
+            updates.append((update, self.backend.to_read_shape(frame)))
+            return self.version, base, shaped, updates, count + 1
+        return None
 
-        if not os.path.isfile(self.storage):
-            f = open(self.storage, "w+")
-            f.close()
+    def __build(self, published):
+        """
+        :return Snapshot described by __describe
+        """
+        version, base, shaped, updates, count = published
+        parts = [base if shaped else self.backend.to_read_shape(base)]
+        for update, rows in updates[:count]:
+            if update == 'append':
+                parts.append(rows)
+            else:
+                parts = [merge_rows(self.__concat(parts), rows, update)]
+        return self.__concat(parts)
+
+    @staticmethod
+    def __concat(parts):
+        return pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+
+    def __read(self):
+        if METRICS.enabled:
+            METRICS.inc('storage_bytes_read_total', self.backend.size(), storage=self.storage)
+        return self.backend.read()
+
+    def __init_storage(self):
+        """
+        Creates storage if it does not exist
+        """
+        self.backend.init_storage()
 
     def dispose(self):
         """
         Cleans the mess
         """
         try:
-            os.remove(self.storage)
+            self.backend.dispose()
         except Exception:
             print('File already disposed')
             raise Exception
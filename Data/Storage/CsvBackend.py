@@ -0,0 +1,183 @@
+import io
+import os
+
+import pandas as pd
+from pandas.errors import EmptyDataError
+
+from MaFin.Data.Storage.StorageBackend import StorageBackend
+from MaFin.Data.Storage.WriteAheadLog import WriteAheadLog, atomic_write
+
+"""Plain .csv backend, one data.csv file per storage"""
+"""
+data.csv is only ever replaced through a temporary file and rename, so a crash can not leave it truncated.
+With write-ahead log appended rows go to data.wal as .csv lines and are compacted into data.csv every compact_rows
+rows or on flush(), reads see data.csv followed by the rows in the log.
+With key column set upserted rows go to the log as well, reads keep the last row of every key sorted by it
+and compaction rewrites data.csv with them.
+"""
+
+
+class CsvBackend(StorageBackend):
+    def __init__(self, storage_path, wal=False, sync='batch', sync_interval=1.0, compact_rows=10000, key=None):
+        """
+        :param wal Appends go to write-ahead log instead of the end of data.csv
+        :param sync When writes are forced to disk, 'always', 'batch' or 'never', see WriteAheadLog
+        :param compact_rows Rows in the log which trigger compaction into data.csv
+        :param key Column identifying a row, upserts by it only log the given rows, e.g. orderId of orders
+        """
+        super().__init__(storage_path)
+        self.key = key
+        self.sync = sync
+        self.compact_rows = compact_rows
+        self.log = WriteAheadLog(os.path.splitext(storage_path)[0] + '.wal', storage_path, sync, sync_interval) \
+            if wal else None
+        self.pending = []
+        self.pending_rows = 0
+
+    def init_storage(self):
+        """
+        Creates file if it does not exist, recovers rows from write-ahead log
+        """
+        self._make_dirs(os.path.dirname(self.storage))
+        if not os.path.isfile(self.storage):
+            f = open(self.storage, "w+")
+            f.close()
+        if self.log is not None:
+            self.pending = self.log.open()
+            self.pending_rows = sum(p.count(b'\n') for p in self.pending)
+            if self.pending_rows >= self.compact_rows:
+                self.flush()
+
+    def is_empty(self):
+        return len(self.__header()) <= 1
+
+    def read(self):
+        try:
+            records = pd.read_csv(self.__source())
+        except EmptyDataError:
+            records = pd.DataFrame()
+        if self.key is not None and len(self.pending) > 0 and self.key in records.columns:
+            # rows upserted into the log replace the older ones with the same key
+            records = records.drop_duplicates(self.key, keep='last')
+            records = records.sort_values(self.key, kind='stable', ignore_index=True)
+        return records
+
+    def write(self, data: pd.DataFrame):
+        atomic_write(self.storage, data.to_csv, self.sync != 'never')
+        if self.log is not None:
+            self.log.reset()
+            self.pending = []
+            self.pending_rows = 0
+
+    def append(self, data: pd.DataFrame):
+        """
+        Appends rows at the end of the file, whole file is rewritten only when the columns differ
+        """
+        if data.empty:
+            return
+        if not self.__same_columns(data):
+            self.write(pd.concat([self._unflatten(self.read()), data]))
+            return
+        if self.log is None:
+            data.to_csv(self.storage, mode='a', header=False)
+            return
+        self.__log(data)
+
+    def upsert(self, data: pd.DataFrame, col):
+        """
+        With write-ahead log and col being the key column only the rows of data are logged,
+        otherwise the whole file is rewritten
+        """
+        if data.empty:
+            return
+        if self.log is None or col != self.key or self.is_empty() or not self.__same_columns(data):
+            super().upsert(data, col)
+            return
+        self.__log(data)
+
+    def __log(self, data: pd.DataFrame):
+        payload = data.to_csv(header=False).encode()
+        self.log.append(payload)
+        self.pending.append(payload)
+        self.pending_rows += len(data)
+        if self.pending_rows >= self.compact_rows:
+            self.flush()
+
+    def to_read_shape(self, data: pd.DataFrame):
+        return pd.read_csv(io.StringIO(data.to_csv()))
+
+    def last_value(self, col):
+        if self.is_empty():
+            return None
+        columns = pd.read_csv(self.storage, nrows=0).columns
+        if col not in columns:
+            return None
+        if col == self.key and len(self.pending) > 0:
+            # upserted rows are logged out of order, the last key is the greatest one
+            rows = pd.read_csv(io.BytesIO((self.__last_row() or b'') + b''.join(self.pending)),
+                               header=None, names=columns)
+            return rows[col].max()
+        last = self.pending[-1] if len(self.pending) > 0 else self.__last_row()
+        if last is None:
+            return None
+        return pd.read_csv(io.BytesIO(last), header=None, names=columns)[col].iloc[-1]
+
+    def size(self):
+        return super().size() + (self.log.size() if self.log is not None else 0)
+
+    def flush(self):
+        """
+        Compacts write-ahead log into data.csv
+        """
+        if self.log is None or len(self.pending) == 0:
+            return
+        if self.key is not None:
+            # logged rows may replace rows of data.csv, which is written anew
+            self.write(self._unflatten(self.read()))
+            return
+        self.log.compact(self.pending)
+        self.pending = []
+        self.pending_rows = 0
+
+    def dispose(self):
+        os.remove(self.storage)
+        if self.log is not None:
+            self.log.dispose()
+            self.pending = []
+            self.pending_rows = 0
+
+    def __source(self):
+        """
+        :return data.csv, or buffer of data.csv followed by the rows in write-ahead log
+        """
+        if len(self.pending) == 0:
+            return self.storage
+        with open(self.storage, 'rb') as f:
+            return io.BytesIO(f.read() + b''.join(self.pending))
+
+    def __last_row(self, block=4096):
+        """
+        Reads data.csv backwards from its end, so the cost does not grow with the history
+        :return Last row of data.csv as bytes, None if there is only the header
+        """
+        with open(self.storage, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            tail = b''
+            position = end
+            while position > 0:
+                size = min(block, position)
+                position -= size
+                f.seek(position)
+                tail = f.read(size) + tail
+                # newline ending the row before the last one, the last row may end with one too
+                start = tail.rstrip(b'\r\n').rfind(b'\n')
+                if start >= 0:
+                    return tail[start + 1:]
+            return None
+
+    def __same_columns(self, data: pd.DataFrame):
+        return data.head(0).to_csv().rstrip('\r\n') == self.__header().rstrip('\r\n')
+
+    def __header(self):
+        with open(self.storage, 'r') as f:
+            return f.readline()
@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+
+from MaFin.Data.Storage.KlineStore import KLINE_DTYPE
+
+"""Fixed-size buffer of the most recent candles of one (pair, time frame)"""
+"""
+Websocket thread is the only writer, the in-progress candle is updated in place and a new slot is taken
+when a new candle starts, nothing is allocated per message. Readers do not lock, they retry when the sequence number
+changed while they were copying (seqlock)
+"""
+
+
+class KlineRingBuffer:
+    def __init__(self, capacity=1000):
+        """
+        :param capacity Number of most recent candles kept
+        """
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=KLINE_DTYPE)
+        self.count = 0
+        self.seq = 0
+
+    def update(self, k):
+        """
+        Writes kline websocket payload, msg['k']
+        """
+        self.seq += 1
+        if self.count == 0 or self.buffer['date'][(self.count - 1) % self.capacity] != k['t']:
+            self.count += 1
+        row = self.buffer[(self.count - 1) % self.capacity]
+        row['date'] = k['t']
+        row['open'] = k['o']
+        row['high'] = k['h']
+        row['low'] = k['l']
+        row['close'] = k['c']
+        row['vol'] = k['v']
+        row['close_date'] = k['T']
+        row['quote_vol'] = k['q']
+        row['n_trades'] = k['n']
+        row['taker_buy_base_vol'] = k['V']
+        row['taker_buy_quote_vol'] = k['Q']
+        self.seq += 1
+
+    def last(self, n=None):
+        """
+        :return Copy of last n candles (all kept if None) in chronological order, the last one may be in progress
+        """
+        while True:
+            seq = self.seq
+            if seq & 1:
+                time.sleep(0)
+                continue
+            count = self.count
+            size = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+            end = count % self.capacity
+            if size <= end:
+                out = self.buffer[end - size:end].copy()
+            else:
+                out = np.concatenate((self.buffer[self.capacity - (size - end):], self.buffer[:end]))
+            if self.seq == seq:
+                return out
+
+    def live(self):
+        """
+        :return Copy of the most recent candle, None if nothing was received yet
+        """
+        last = self.last(1)
+        return last[0] if len(last) > 0 else None
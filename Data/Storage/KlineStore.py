@@ -0,0 +1,140 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.Storage.StorageBackend import StorageBackend
+from MaFin.Data.Storage.WriteAheadLog import atomic_write
+
+"""Memory-mapped backend for klines of one (pair, time frame)"""
+"""
+Candles are kept as fixed-width records in data.klines next to where data.csv would be.
+The file is always sorted by date, so a time range is found with binary search and returned as a view into the map,
+reading the last few candles costs the same no matter how much history is on disk.
+The last candle is stored while it is still in progress and overwritten in place once it is fetched again,
+views handed out before see its newer values.
+"""
+
+KLINE_DTYPE = np.dtype([('date', np.int64), ('open', np.float64), ('high', np.float64), ('low', np.float64),
+                        ('close', np.float64), ('vol', np.float64), ('close_date', np.int64),
+                        ('quote_vol', np.float64), ('n_trades', np.int64), ('taker_buy_base_vol', np.float64),
+                        ('taker_buy_quote_vol', np.float64)])
+
+
+class KlineStore(StorageBackend):
+    # appends add whole records, replacing writes are atomic, only the last candles are overwritten in place
+    # and a reader racing that sees fields of the same candle from two moments of its progress
+    consistent_reads = True
+
+    def __init__(self, storage_path):
+        """
+        :param storage_path Path the storage is registered with, the extension is replaced by .klines
+        """
+        super().__init__(storage_path)
+        self.path = os.path.splitext(storage_path)[0] + '.klines'
+        self.map = None
+        self.map_key = None
+
+    def init_storage(self):
+        """
+        Creates file if it does not exist, cuts off partially written record
+        """
+        self._make_dirs(os.path.dirname(self.path))
+        if not os.path.isfile(self.path):
+            f = open(self.path, "wb")
+            f.close()
+        size = os.path.getsize(self.path)
+        if size % KLINE_DTYPE.itemsize != 0:
+            os.truncate(self.path, size - size % KLINE_DTYPE.itemsize)
+
+    def is_empty(self):
+        return len(self.records()) == 0
+
+    def records(self) -> np.ndarray:
+        """
+        :return All the stored candles as read-only structured array backed by the file
+        """
+        stat = os.stat(self.path)
+        if (stat.st_ino, stat.st_size) != self.map_key:
+            # old map stays valid for views already handed out, the file is only ever appended or replaced
+            count = stat.st_size // KLINE_DTYPE.itemsize
+            self.map = np.memmap(self.path, dtype=KLINE_DTYPE, mode='r', shape=(count,)) if count > 0 \
+                else np.empty(0, dtype=KLINE_DTYPE)
+            self.map_key = (stat.st_ino, stat.st_size)
+        return self.map
+
+    def read_range(self, start=None, end=None):
+        """
+        :return View of candles with start <= date < end, open ends when not specified
+        """
+        records = self.records()
+        dates = records['date']
+        i = np.searchsorted(dates, start, side='left') if start is not None else 0
+        j = np.searchsorted(dates, end, side='left') if end is not None else len(records)
+        return records[i:j]
+
+    def tail(self, n):
+        """
+        :return View of last n candles
+        """
+        records = self.records()
+        return records[max(len(records) - n, 0):]
+
+    def read(self):
+        records = self.records()
+        if len(records) == 0:
+            return pd.DataFrame()
+        return pd.DataFrame(records)
+
+    def write(self, data: pd.DataFrame):
+        records = self.__to_records(data)
+
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(records.tobytes())
+
+        # replacing keeps the old inode alive for anyone still holding a view
+        atomic_write(self.path, write)
+
+    def append(self, data: pd.DataFrame):
+        if data.empty:
+            return
+        with open(self.path, 'ab') as f:
+            f.write(self.__to_records(data).tobytes())
+
+    def upsert(self, data: pd.DataFrame, col):
+        records = self.records()
+        new = self.__to_records(data)
+        if col == 'date' and len(new) > 0:
+            i = np.searchsorted(records['date'], new['date'][0], side='left')
+            if len(records) - i <= len(new) and (records['date'][i:] == new['date'][:len(records) - i]).all():
+                # only the last candles are replaced, they keep their place in the file and the rest is appended
+                with open(self.path, 'r+b') as f:
+                    f.seek(i * KLINE_DTYPE.itemsize)
+                    f.write(new.tobytes())
+                return
+        super().upsert(data, col)
+
+    def to_read_shape(self, data: pd.DataFrame):
+        return pd.DataFrame(self.__to_records(data))
+
+    def last_value(self, col):
+        records = self.records()
+        if len(records) == 0 or col not in KLINE_DTYPE.names:
+            return None
+        return records[col][-1]
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def dispose(self):
+        self.map = None
+        self.map_key = None
+        os.remove(self.path)
+
+    def __to_records(self, data: pd.DataFrame):
+        frame = self._flatten(data)
+        records = np.empty(len(frame), dtype=KLINE_DTYPE)
+        for name in KLINE_DTYPE.names:
+            records[name] = frame[name].to_numpy(dtype=KLINE_DTYPE[name])
+        return records
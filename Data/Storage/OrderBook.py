@@ -0,0 +1,254 @@
+import bisect
+import threading
+import time
+
+from MaFin.Utils.Metrics import METRICS
+
+"""Local L2 order book of one pair kept from REST snapshot and depth diff websocket stream"""
+"""
+Diff events arriving before the book is synced are buffered, then a snapshot is fetched, events it already covers
+are dropped and the rest is applied. Every event has to continue where the previous one ended (its U is the last
+u + 1), when one does not the book is cleared and synced again from a new snapshot on another thread, so the
+websocket thread is never blocked by REST. Queries see an empty book until it is synced.
+Price levels of a side are a sorted list of keys with the best level at the end, where most of the updates land,
+and a list of quantities in the same order. A level is found by binary search and inserting or removing one moves
+only the levels behind it, which near the top of the book are few. Depth at price is a sum over a slice.
+"""
+
+
+class BookSide:
+    def __init__(self, sign):
+        """
+        :param sign 1 for bids, -1 for asks, keys are sign * price so the best level is the last one
+        """
+        self.sign = sign
+        self.keys = []
+        self.quantities = []
+
+    def update(self, price, quantity):
+        """
+        Sets quantity of the level, zero removes it
+        """
+        key = self.sign * price
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            if quantity == 0:
+                del self.keys[i]
+                del self.quantities[i]
+            else:
+                self.quantities[i] = quantity
+        elif quantity != 0:
+            self.keys.insert(i, key)
+            self.quantities.insert(i, quantity)
+
+    def load(self, levels):
+        """
+        Replaces levels with [[price, quantity], ...] as sent by Binance
+        """
+        levels = sorted((self.sign * float(p), float(q)) for p, q in levels if float(q) != 0)
+        self.keys = [k for k, _ in levels]
+        self.quantities = [q for _, q in levels]
+
+    def clear(self):
+        self.keys = []
+        self.quantities = []
+
+    def best(self):
+        """
+        :return (price, quantity) of the best level, None if the side is empty
+        """
+        if len(self.keys) == 0:
+            return None
+        return self.sign * self.keys[-1], self.quantities[-1]
+
+    def quantity(self, price):
+        """
+        :return Quantity of the level at price, 0 if there is no such level
+        """
+        key = self.sign * price
+        i = bisect.bisect_left(self.keys, key)
+        return self.quantities[i] if i < len(self.keys) and self.keys[i] == key else 0.0
+
+    def levels(self, n=None):
+        """
+        :return List of (price, quantity) of n best levels, best first
+        """
+        first = 0 if n is None else max(len(self.keys) - n, 0)
+        return [(self.sign * k, q) for k, q in zip(reversed(self.keys[first:]), reversed(self.quantities[first:]))]
+
+    def depth(self, price):
+        """
+        :return Quantity of the levels at price or better
+        """
+        return sum(self.quantities[bisect.bisect_left(self.keys, self.sign * price):])
+
+    def sweep(self, quantity):
+        """
+        :return (average price, filled quantity) of taking quantity from the best levels on
+        """
+        left = quantity
+        cost = 0.0
+        for i in range(len(self.keys) - 1, -1, -1):
+            taken = min(left, self.quantities[i])
+            cost += taken * self.keys[i]
+            left -= taken
+            if left <= 0:
+                break
+        filled = quantity - max(left, 0.0)
+        return (self.sign * cost / filled if filled > 0 else None), filled
+
+
+class OrderBook:
+    def __init__(self, symbol, snapshot_endpoint, limit=1000, max_buffer=10000, resync_interval=1.0):
+        """
+        :param snapshot_endpoint Callable taking symbol and limit, returning Binance depth snapshot dict,
+        e.g. BinanceClient.get_order_book
+        :param limit Levels requested in the snapshot
+        :param max_buffer Diff events kept while waiting for the snapshot, the oldest are dropped beyond that
+        :param resync_interval Seconds between two snapshot requests
+        """
+        self.symbol = symbol
+        self.snapshot_endpoint = snapshot_endpoint
+        self.limit = limit
+        self.max_buffer = max_buffer
+        self.resync_interval = resync_interval
+        self.lock = threading.Lock()
+        self.bids = BookSide(1)
+        self.asks = BookSide(-1)
+        self.last_update_id = None
+        self.buffer = []
+        self.syncing = False
+        self.last_resync = 0.0
+        self.update_time = None
+
+    def on_depth(self, msg):
+        """
+        Takes depth diff websocket message, e.g. subscribed by BinanceClient.subscribe_depth
+        """
+        msg = msg.get('data', msg)
+        if msg.get('e') != 'depthUpdate':
+            return
+        with self.lock:
+            if self.last_update_id is None:
+                self.__buffer(msg)
+                return
+            if msg['u'] <= self.last_update_id:
+                return
+            if msg['U'] > self.last_update_id + 1:
+                print(f'Gap in depth stream of {self.symbol}, expected {self.last_update_id + 1} got {msg["U"]}')
+                METRICS.inc('order_book_gaps_total', symbol=self.symbol)
+                self.__invalidate()
+                self.__buffer(msg)
+                return
+            self.__apply(msg)
+
+    def is_synced(self):
+        return self.last_update_id is not None
+
+    def get_best_bid(self):
+        """
+        :return (price, quantity) of the best bid, None if there is none or the book is not synced
+        """
+        with self.lock:
+            return self.bids.best()
+
+    def get_best_ask(self):
+        with self.lock:
+            return self.asks.best()
+
+    def get_spread(self):
+        """
+        :return Best ask - best bid, None if one of the sides is empty
+        """
+        with self.lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        return ask[0] - bid[0] if bid is not None and ask is not None else None
+
+    def get_mid_price(self):
+        with self.lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        return (ask[0] + bid[0]) / 2 if bid is not None and ask is not None else None
+
+    def get_quantity(self, side, price):
+        """
+        :param side 'BUY' for bids, 'SELL' for asks
+        :return Quantity of the level at price, 0 if there is no such level
+        """
+        with self.lock:
+            return self.__side(side).quantity(float(price))
+
+    def get_depth(self, side, price):
+        """
+        :param side 'BUY' for bids, 'SELL' for asks
+        :return Quantity of the levels of the side at price or better
+        """
+        with self.lock:
+            return self.__side(side).depth(float(price))
+
+    def get_levels(self, side, n=None):
+        """
+        :return List of (price, quantity) of n best levels of the side, best first
+        """
+        with self.lock:
+            return self.__side(side).levels(n)
+
+    def get_vwap(self, side, quantity):
+        """
+        Average price an order of quantity taking liquidity right now would fill at
+        :param side Side of the order, 'BUY' takes asks and 'SELL' takes bids
+        :return (average price, filled quantity), filled is less than quantity when the book is too thin
+        """
+        with self.lock:
+            return (self.asks if side == 'BUY' else self.bids).sweep(quantity)
+
+    def __side(self, side):
+        return self.bids if side == 'BUY' else self.asks
+
+    def __apply(self, msg):
+        for p, q in msg['b']:
+            self.bids.update(float(p), float(q))
+        for p, q in msg['a']:
+            self.asks.update(float(p), float(q))
+        self.last_update_id = msg['u']
+        self.update_time = msg.get('E')
+
+    def __buffer(self, msg):
+        self.buffer.append(msg)
+        if len(self.buffer) > self.max_buffer:
+            del self.buffer[:len(self.buffer) - self.max_buffer]
+        if not self.syncing and time.time() - self.last_resync >= self.resync_interval:
+            self.syncing = True
+            self.last_resync = time.time()
+            threading.Thread(target=self.__resync, daemon=True).start()
+
+    def __invalidate(self):
+        self.last_update_id = None
+        self.bids.clear()
+        self.asks.clear()
+
+    def __resync(self):
+        METRICS.inc('order_book_resyncs_total', symbol=self.symbol)
+        try:
+            snapshot = self.snapshot_endpoint(symbol=self.symbol, limit=self.limit)
+        except Exception as e:
+            print(f'Order book snapshot of {self.symbol} failed \n reason: {str(e)}')
+            snapshot = None
+        with self.lock:
+            self.syncing = False
+            if not isinstance(snapshot, dict) or 'lastUpdateId' not in snapshot:
+                return
+            last_update_id = snapshot['lastUpdateId']
+            pending = [m for m in self.buffer if m['u'] > last_update_id]
+            if len(pending) > 0 and pending[0]['U'] > last_update_id + 1:
+                # events between the snapshot and the buffer were missed, the next event asks for a newer snapshot
+                return
+            self.bids.load(snapshot['bids'])
+            self.asks.load(snapshot['asks'])
+            self.last_update_id = last_update_id
+            self.buffer = []
+            for i, m in enumerate(pending):
+                if m['U'] > self.last_update_id + 1:
+                    self.__invalidate()
+                    self.buffer = pending[i:]
+                    return
+                self.__apply(m)
@@ -0,0 +1,132 @@
+import glob
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from MaFin.Data.Storage.StorageBackend import StorageBackend
+
+"""Append-only columnar backend"""
+"""
+Rows live in a data.parquet directory next to where data.csv would be, as a sequence of numbered segments.
+Every append writes only the new rows as a new segment, so an update costs O(new rows) instead of O(history).
+Column types are fixed by the first segment, numeric strings coming from the API are stored as numbers.
+Segments are merged once there are too many of them.
+"""
+
+
+class ParquetBackend(StorageBackend):
+    def __init__(self, storage_path, max_segments=256):
+        """
+        :param storage_path Path the storage is registered with, the extension is replaced by .parquet
+        :param max_segments Number of segments which triggers compaction into a single one
+        """
+        super().__init__(storage_path)
+        self.directory = os.path.splitext(storage_path)[0] + '.parquet'
+        self.max_segments = max_segments
+        self.schema = None
+        self.last_row = None
+
+    def init_storage(self):
+        """
+        Creates segments directory if it does not exist
+        """
+        self._make_dirs(self.directory)
+        segments = self.__segments()
+        if len(segments) > 0:
+            self.schema = pq.read_schema(segments[0])
+
+    def is_empty(self):
+        return len(self.__segments()) == 0
+
+    def read(self):
+        segments = self.__segments()
+        if len(segments) == 0:
+            return pd.DataFrame()
+        tables = [pq.read_table(s, schema=self.schema) for s in segments]
+        return pa.concat_tables(tables).to_pandas()
+
+    def write(self, data: pd.DataFrame):
+        frame = self.__coerce_types(self._flatten(data))
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        tmp = self.directory + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        pq.write_table(table, os.path.join(tmp, self.__segment_name(0)))
+        old = self.directory + '.old'
+        shutil.rmtree(old, ignore_errors=True)
+        if os.path.isdir(self.directory):
+            os.rename(self.directory, old)
+        os.rename(tmp, self.directory)
+        shutil.rmtree(old, ignore_errors=True)
+        self.schema = table.schema
+        self.last_row = frame.tail(1)
+
+    def append(self, data: pd.DataFrame):
+        if data.empty:
+            return
+        if self.schema is None:
+            self.write(data)
+            return
+        frame = self.__coerce_types(self._flatten(data))
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        segments = self.__segments()
+        number = self.__segment_number(segments[-1]) + 1 if len(segments) > 0 else 0
+        pq.write_table(table, os.path.join(self.directory, self.__segment_name(number)))
+        self.last_row = frame.tail(1)
+        if len(segments) + 1 >= self.max_segments:
+            self.compact()
+
+    def to_read_shape(self, data: pd.DataFrame):
+        frame = self.__coerce_types(self._flatten(data))
+        return pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False).to_pandas()
+
+    def last_value(self, col):
+        if self.last_row is None:
+            segments = self.__segments()
+            if len(segments) == 0:
+                return None
+            self.last_row = pq.read_table(segments[-1], schema=self.schema).to_pandas().tail(1)
+        if col not in self.last_row.columns or self.last_row.empty:
+            return None
+        return self.last_row[col].iloc[-1]
+
+    def size(self):
+        return sum(os.path.getsize(s) for s in self.__segments())
+
+    def compact(self):
+        """
+        Merges all the segments into a single one
+        """
+        self.write(self.read())
+
+    def dispose(self):
+        shutil.rmtree(self.directory)
+        self.schema = None
+        self.last_row = None
+
+    def __segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'part-*.parquet')))
+
+    @staticmethod
+    def __segment_name(number):
+        return 'part-%08d.parquet' % number
+
+    @staticmethod
+    def __segment_number(path):
+        return int(os.path.basename(path)[5:13])
+
+    @staticmethod
+    def __coerce_types(frame: pd.DataFrame):
+        """
+        Binance sends prices and quantities as strings, store them as numbers
+        """
+        for col in frame.columns:
+            if frame[col].dtype == object or pd.api.types.is_string_dtype(frame[col].dtype):
+                try:
+                    frame[col] = pd.to_numeric(frame[col])
+                except (ValueError, TypeError):
+                    pass
+        return frame
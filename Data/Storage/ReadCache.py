@@ -0,0 +1,80 @@
+import threading
+
+"""In-process cache of parsed storage reads"""
+"""
+Every entry remembers the version of the data it was loaded from, storages bump their version on every write,
+so an entry is valid for as long as the version passed in matches and no explicit invalidation is needed
+"""
+
+
+class ReadCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, loader):
+        """
+        :param key Identifies cached value, e.g. storage path
+        :param version Version of the underlying data, entry with different version is reloaded
+        :param loader Callable producing the value on miss
+        :return Cached value for the key and version
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self.lock:
+            self.entries[key] = (version, value)
+        return value
+
+    def peek(self, key):
+        """
+        Lock-free lookup for readers which must not wait and for writers, nothing is counted,
+        readers tell the outcome with count()
+        :return (version, value) cached for the key, None if there is none
+        """
+        return self.entries.get(key)
+
+    def count(self, hit):
+        """
+        Counts lookup of a reader done with peek, may be off by a few under contention
+        """
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def put(self, key, version, value):
+        """
+        Publishes value loaded at version, unless a value of a newer version is cached already
+        :return (version, value) cached for the key afterwards
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not entry[0] > version:
+                entry = self.entries[key] = (version, value)
+            return entry
+
+    def invalidate(self, key=None):
+        """
+        Drops entry for the key, or every entry when key is not specified
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        """
+        :return Hits, misses and hit ratio since the cache was created
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries),
+                    'hit_ratio': self.hits / total if total > 0 else 0.0}
@@ -1,22 +1,156 @@
+from MaFin.Client.Parsers import is_failed
 from MaFin.Data.Storage.ColdStorage import ColdStorage
+from MaFin.Utils.Metrics import METRICS
 import threading
+import time
 
 
 class SelfUpdatedStorage(ColdStorage, threading.Thread):
-    def __init__(self, storage_path, data_endpoint, hot_event, wait_functor=lambda: 3600, **endpoint_params):
-        ColdStorage.__init__(self, storage_path)
+    def __init__(self, storage_path, data_endpoint, hot_event, wait_functor=lambda: 3600, backend=None,
+                 cache=None, cursor=None, snapshot=False, **endpoint_params):
+        """
+        :param cursor StorageCursor for incremental fetching, the same endpoint params are used every time if None
+        :param snapshot Endpoint returns the whole current state, e.g. open orders or balances, every response
+        replaces the stored rows instead of being appended, so rows which are gone from it are gone from the storage
+        """
+        ColdStorage.__init__(self, storage_path, backend, cache)
         threading.Thread.__init__(self)
         self.data_endpoint = data_endpoint
         self.endpoint_params = endpoint_params
         self.hot_event = hot_event
         self.wait_functor = wait_functor
+        self.cursor = cursor
+        self.snapshot_endpoint = snapshot
 
     def run(self):
         """
         Cleverly handles data retrieval with help of hot events
         """
-        self.save(self.data_endpoint(**self.endpoint_params))
+        self.load()
         while True:
             self.hot_event.wait(self.wait_functor())
+            self.refresh()
+            self.hot_event.clear()
+
+    def load(self):
+        """
+        First update of the storage, loads everything when it is empty, otherwise fetches what is missing
+        """
+        if self.snapshot_endpoint:
+            self.__replace(self.data_endpoint(**self.endpoint_params))
+        elif self.high_water_mark() is None:
+            self.save(self.data_endpoint(**self.endpoint_params))
+        else:
+            self.refresh()
+
+    def high_water_mark(self):
+        """
+        :return Last stored value of the cursor column, None if there is no cursor or no data yet
+        """
+        if self.cursor is None:
+            return None
+        with self.lock:
+            if self.backend.is_empty():
+                return None
+            return self.backend.last_value(self.cursor.col)
+
+    def refresh(self):
+        """
+        Fetches data newer than the high-water mark page by page and appends it,
+        rows which may have changed since they were stored are fetched again, see StorageCursor
+        """
+        start = time.perf_counter() if METRICS.enabled else None
+        self.__refresh()
+        if start is not None:
+            METRICS.observe('storage_refresh_seconds', time.perf_counter() - start, storage=self.storage)
+
+    def __refresh(self):
+        if self.snapshot_endpoint:
+            self.__replace(self.data_endpoint(**self.endpoint_params))
+            return
+        if self.cursor is None:
             self.append(self.data_endpoint(**self.endpoint_params))
+            return
+        mark = self.high_water_mark()
+        if mark is None:
+            self.save(self.data_endpoint(**self.endpoint_params))
+            return
+        oldest = self.__oldest_open()
+        if oldest is not None:
+            page = self.data_endpoint(**self.cursor.params(self.endpoint_params, oldest, inclusive=True))
+            mark = self.__append_page(page, oldest)
+        while mark is not None:
+            mark = self.__append_page(self.data_endpoint(**self.cursor.params(self.endpoint_params, mark)), mark)
+
+    async def run_async(self, endpoint):
+        """
+        Coroutine counterpart of run, the storage is refreshed on the running event loop instead of its own thread
+        :param endpoint Coroutine counterpart of data_endpoint, e.g. AsyncBinanceClient.get_klines
+        """
+        if self.high_water_mark() is None and not self.snapshot_endpoint:
+            self.save(await endpoint(**self.endpoint_params))
+        else:
+            await self.refresh_async(endpoint)
+        while True:
+            await self.hot_event.wait_async(self.wait_functor())
+            await self.refresh_async(endpoint)
             self.hot_event.clear()
+
+    async def refresh_async(self, endpoint):
+        """
+        Coroutine counterpart of refresh
+        """
+        start = time.perf_counter() if METRICS.enabled else None
+        await self.__refresh_async(endpoint)
+        if start is not None:
+            METRICS.observe('storage_refresh_seconds', time.perf_counter() - start, storage=self.storage)
+
+    async def __refresh_async(self, endpoint):
+        if self.snapshot_endpoint:
+            self.__replace(await endpoint(**self.endpoint_params))
+            return
+        if self.cursor is None:
+            self.append(await endpoint(**self.endpoint_params))
+            return
+        mark = self.high_water_mark()
+        if mark is None:
+            self.save(await endpoint(**self.endpoint_params))
+            return
+        oldest = self.__oldest_open()
+        if oldest is not None:
+            page = await endpoint(**self.cursor.params(self.endpoint_params, oldest, inclusive=True))
+            mark = self.__append_page(page, oldest)
+        while mark is not None:
+            mark = self.__append_page(await endpoint(**self.cursor.params(self.endpoint_params, mark)), mark)
+
+    def __replace(self, data):
+        """
+        Stores response of snapshot endpoint, failed request keeps the stored rows
+        """
+        if is_failed(data):
+            return
+        self.save(data)
+
+    def __oldest_open(self):
+        """
+        :return Cursor value of the oldest stored row which may still change, None if there is none
+        """
+        if self.cursor.open_col is None:
+            return None
+        return self.cursor.oldest_open(self.get())
+
+    def __append_page(self, page, mark):
+        """
+        Appends fetched page, with upserting cursor its rows replace the stored ones with the same cursor value
+        :return High-water mark to fetch the next page from, None if there is nothing more to fetch
+        """
+        if page.empty:
+            return None
+        if self.cursor.upsert:
+            self.upsert(page, key_col=self.cursor.col)
+        else:
+            self.append(page, sync_col=self.cursor.col)
+        last = self.cursor.last_value(page)
+        if len(page) < self.cursor.limit or last is None or last <= mark:
+            return None
+        return last
@@ -0,0 +1,151 @@
+import abc
+import os
+
+import pandas as pd
+
+"""Base class for the physical layout of a ColdStorage"""
+"""
+ColdStorage keeps the locking and the append semantics, a backend only knows how to put rows on disk
+and how to get them back. Frames are handed over with their index, and read back flat,
+with the index stored as the first column (the same shape pd.read_csv returns for our .csv files)
+"""
+
+
+def select_range(records: pd.DataFrame, start=None, end=None):
+    """
+    :return Rows of flat records with start <= first column < end, open ends when not specified
+    """
+    if records.empty:
+        return records
+    key = records[records.columns[0]]
+    mask = pd.Series(True, index=records.index)
+    if start is not None:
+        mask &= key >= start
+    if end is not None:
+        mask &= key < end
+    return records[mask]
+
+
+def merge_rows(records: pd.DataFrame, rows: pd.DataFrame, col):
+    """
+    :return Flat records with rows of the same col value replaced by rows, other rows added, sorted by col
+    """
+    if records.empty:
+        return rows.reset_index(drop=True)
+    kept = records[~records[col].isin(rows[col])]
+    return pd.concat([kept, rows], ignore_index=True).sort_values(col, kind='stable', ignore_index=True)
+
+
+class StorageBackend(abc.ABC):
+    # reads see a consistent state even while a write is in progress, ColdStorage then reads ranges directly
+    consistent_reads = False
+
+    def __init__(self, storage_path):
+        """
+        :param storage_path Path the storage is registered with, e.g. .../Spot/Pairs/BTCUSDT/1h/data.csv
+        """
+        self.storage = storage_path
+
+    @abc.abstractmethod
+    def init_storage(self):
+        """
+        Creates whatever is needed on disk if it does not exist
+        """
+
+    @abc.abstractmethod
+    def is_empty(self) -> bool:
+        """
+        :return True when there are no rows stored
+        """
+
+    @abc.abstractmethod
+    def read(self) -> pd.DataFrame:
+        """
+        :return All the stored rows
+        """
+
+    @abc.abstractmethod
+    def write(self, data: pd.DataFrame):
+        """
+        Overrides stored rows with data
+        """
+
+    @abc.abstractmethod
+    def append(self, data: pd.DataFrame):
+        """
+        Appends rows to the end of the storage, rows are expected to be already filtered
+        """
+
+    def upsert(self, data: pd.DataFrame, col):
+        """
+        Replaces stored rows with the same col value as a row of data, adds the other rows
+        Rewrites the whole storage, backends which can replace rows in place override it
+        """
+        self.write(self._unflatten(merge_rows(self.read(), self.to_read_shape(data), col)))
+
+    def read_range(self, start=None, end=None):
+        """
+        :return Stored rows with start <= first column < end, open ends when not specified
+        """
+        return select_range(self.read(), start, end)
+
+    def to_read_shape(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        :return data the way read() would return it once it is stored
+        """
+        return self._flatten(data)
+
+    def last_value(self, col):
+        """
+        :return Value of col in the last stored row, None if there is no such row or column
+        """
+        records = self.read()
+        if records.empty or col not in records.columns:
+            return None
+        return records[col].iloc[-1]
+
+    def size(self):
+        """
+        :return Bytes the storage takes on disk
+        """
+        return os.path.getsize(self.storage) if os.path.isfile(self.storage) else 0
+
+    def flush(self):
+        """
+        Makes everything written so far part of the main storage, e.g. compacts write-ahead log
+        """
+
+    @abc.abstractmethod
+    def dispose(self):
+        """
+        Removes the storage from disk
+        """
+
+    @staticmethod
+    def _flatten(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        :return data with named index moved to the first column, unnamed index is dropped
+        """
+        if data.index.name is None:
+            return data.reset_index(drop=True)
+        return data.reset_index()
+
+    @staticmethod
+    def _unflatten(records: pd.DataFrame) -> pd.DataFrame:
+        """
+        :return Flat records with the first column moved back to the index, the shape write() takes
+        """
+        frame = records.set_index(records.columns[0])
+        if str(frame.index.name).startswith('Unnamed: '):
+            # unnamed index is read back under a generated name, writing it under that name would add a column
+            frame.index.name = None
+        return frame
+
+    @staticmethod
+    def _make_dirs(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            print("Creation of the directory %s failed" % path)
+        else:
+            print("Successfully created the directory %s " % path)
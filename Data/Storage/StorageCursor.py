@@ -0,0 +1,59 @@
+"""Describes how a self updated storage asks the endpoint only for data newer than what it already has"""
+
+
+class StorageCursor:
+    def __init__(self, col, param, limit=1000, offset=1, replaces=('startTime', 'endTime'), upsert=False,
+                 open_col=None, final=()):
+        """
+        :param col Stored column (or index) holding the high-water mark, e.g. date, id, orderId
+        :param param Endpoint parameter the next value is passed in, e.g. startTime, fromId, orderId
+        :param limit Page size requested from the endpoint, shorter page means there is nothing more to fetch
+        :param offset Added to the high-water mark so the last stored row is not requested again
+        :param replaces Endpoint parameters dropped when the cursor is used, Binance rejects some combinations
+        :param upsert Fetched rows replace stored rows with the same col value instead of being skipped,
+        e.g. the last candle stored while it was still in progress
+        :param open_col Column telling whether a stored row may still change, e.g. status of an order,
+        fetching starts from the oldest row which may, so its current state replaces the stored one
+        :param final Values of open_col of rows which do not change any more, e.g. FILLED
+        """
+        self.col = col
+        self.param = param
+        self.limit = limit
+        self.offset = offset
+        self.replaces = replaces
+        self.upsert = upsert or open_col is not None
+        self.open_col = open_col
+        self.final = final
+
+    def params(self, endpoint_params, mark, inclusive=False):
+        """
+        :param inclusive Page starts at the mark itself instead of right after it
+        :return Endpoint parameters requesting page right after given high-water mark
+        """
+        params = {k: v for k, v in endpoint_params.items() if k not in self.replaces}
+        params[self.param] = int(mark) + (0 if inclusive else self.offset)
+        params['limit'] = self.limit
+        return params
+
+    def last_value(self, frame):
+        """
+        :return High-water mark of fetched page, None if it can not be told
+        """
+        if frame.empty:
+            return None
+        if self.col in frame.columns:
+            return frame[self.col].max()
+        if frame.index.name == self.col:
+            return frame.index.max()
+        return None
+
+    def oldest_open(self, records):
+        """
+        :param records Stored rows as read from the storage
+        :return col value of the oldest stored row which may still change, None if there is none
+        """
+        if self.open_col is None or records.empty or self.open_col not in records.columns \
+                or self.col not in records.columns:
+            return None
+        values = records[self.col][~records[self.open_col].isin(self.final)]
+        return values.min() if len(values) > 0 else None
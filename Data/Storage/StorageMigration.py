@@ -0,0 +1,37 @@
+import os
+
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+
+"""One-shot migration of the .csv storage tree into another backend"""
+
+
+def migrate_csv_tree(root_storage_path, backend_factory, remove_csv=False):
+    """
+    Copies every data.csv under root_storage_path into backend created by backend_factory
+    :param root_storage_path Same root as the one passed to BinanceDataProvider
+    :param backend_factory Callable creating StorageBackend for given data.csv path, e.g. ParquetBackend
+    :param remove_csv Removes migrated .csv files when set
+    :return List of migrated paths
+    """
+    migrated = []
+    for dirpath, _, filenames in os.walk(root_storage_path):
+        if 'data.csv' not in filenames:
+            continue
+        path = os.path.join(dirpath, 'data.csv')
+        source = CsvBackend(path, wal=True)
+        source.init_storage()
+        if source.is_empty():
+            continue
+        records = source.read()
+        # first column is the index the frame was stored with
+        frame = records.set_index(records.columns[0])
+        if frame.index.name.startswith('Unnamed'):
+            frame.index.name = None
+        target = backend_factory(path)
+        target.init_storage()
+        target.write(frame)
+        migrated.append(path)
+        if remove_csv:
+            source.dispose()
+        print(f'Migrated {path}')
+    return migrated
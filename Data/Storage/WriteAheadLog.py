@@ -0,0 +1,175 @@
+import os
+import shutil
+import struct
+import time
+import zlib
+
+"""Append-only write-ahead log of a storage file and atomic file replacement"""
+"""
+The log sits next to the main file and keeps the rows appended since the main file was last replaced, so an append
+costs O(new rows) and the main file is never modified in place. Every record is framed with its length and crc32,
+a record torn by a crash fails the check and is cut off when the log is opened, the records before it are recovered.
+The log header holds the size and a checksum of the tail of the main file it follows. Compaction replaces the main
+file first and resets the log after, a crash in between leaves a log that does not match the main file any more
+and is dropped instead of being replayed twice.
+"""
+
+MAGIC = b'MFWAL001'
+HEADER = struct.Struct('<8sqI')
+RECORD = struct.Struct('<II')
+SYNC_MODES = ('always', 'batch', 'never')
+FINGERPRINT_BYTES = 4096
+
+
+def sync_directory(directory):
+    """
+    Forces renames in directory to disk, does nothing where directories can not be opened
+    """
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, sync=True):
+    """
+    Writes file by write(temporary path) and renames it over path, readers and crashes see either old or new file
+    :param sync Forces the file and the rename to disk before returning
+    """
+    tmp = path + '.tmp'
+    write(tmp)
+    if sync:
+        fd = os.open(tmp, os.O_RDWR)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    os.replace(tmp, path)
+    if sync:
+        sync_directory(os.path.dirname(path))
+
+
+def fingerprint(path):
+    """
+    :return (size, crc32 of last bytes) of file, (0, 0) if it does not exist
+    """
+    if not os.path.isfile(path):
+        return 0, 0
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(size - FINGERPRINT_BYTES, 0))
+        return size, zlib.crc32(f.read())
+
+
+class WriteAheadLog:
+    def __init__(self, path, main_path, sync='batch', sync_interval=1.0):
+        """
+        :param path Path of the log
+        :param main_path Path of the file the log is compacted into
+        :param sync 'always' forces every record to disk, 'batch' at most every sync_interval seconds,
+        'never' leaves it to the OS, records are handed to the OS on every append in all the modes
+        """
+        if sync not in SYNC_MODES:
+            raise ValueError(f'Unknown sync mode {sync}, expected one of {SYNC_MODES}')
+        self.path = path
+        self.main_path = main_path
+        self.sync = sync
+        self.sync_interval = sync_interval
+        self.file = None
+        self.synced = time.monotonic()
+
+    def open(self):
+        """
+        Recovers the log, a torn record at its end is cut off
+        :return Payloads of the records not compacted into the main file yet
+        """
+        self.close()
+        if not os.path.isfile(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if len(data) < HEADER.size or HEADER.unpack_from(data) != (MAGIC,) + fingerprint(self.main_path):
+            # torn header, or main file was replaced after the log was written
+            self.reset()
+            return []
+        payloads = []
+        offset = HEADER.size
+        while offset + RECORD.size <= len(data):
+            length, crc = RECORD.unpack_from(data, offset)
+            payload = data[offset + RECORD.size:offset + RECORD.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            payloads.append(payload)
+            offset += RECORD.size + length
+        if offset < len(data):
+            print(f'Cutting off {len(data) - offset} bytes of torn record from {self.path}')
+            os.truncate(self.path, offset)
+        self.file = open(self.path, 'ab')
+        return payloads
+
+    def append(self, payload: bytes):
+        if self.file is None:
+            self.reset()
+        self.file.write(RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.file.flush()
+        if self.sync == 'always' or (self.sync == 'batch' and
+                                     time.monotonic() - self.synced >= self.sync_interval):
+            self.fsync()
+
+    def fsync(self):
+        """
+        Forces records appended so far to disk
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.synced = time.monotonic()
+
+    def reset(self):
+        """
+        Replaces the log with an empty one following the current main file, called after the main file is replaced
+        """
+        self.close()
+        header = HEADER.pack(MAGIC, *fingerprint(self.main_path))
+
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(header)
+
+        atomic_write(self.path, write, self.sync != 'never')
+        self.file = open(self.path, 'ab')
+        self.synced = time.monotonic()
+
+    def compact(self, payloads):
+        """
+        Replaces the main file with its content followed by payloads, then resets the log
+        """
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                if os.path.isfile(self.main_path):
+                    with open(self.main_path, 'rb') as main:
+                        shutil.copyfileobj(main, f)
+                for p in payloads:
+                    f.write(p)
+
+        atomic_write(self.main_path, write, self.sync != 'never')
+        self.reset()
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def dispose(self):
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
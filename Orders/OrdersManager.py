@@ -1,8 +1,13 @@
-from MaFin.Client.BinanceClient import BinanceClient
+from typing import TYPE_CHECKING
+
 from MaFin.Orders.SmartOrder import SmartOrder
-from MaFin.Data.BinanceDataProvider import BinanceDataProvider
 from MaFin.Utils.Singleton import Singleton
 
+if TYPE_CHECKING:
+    # only for annotations, importing them would load python-binance and the whole data layer
+    from MaFin.Client.BinanceClient import BinanceClient
+    from MaFin.Data.BinanceDataProvider import BinanceDataProvider
+
 
 def safe_order(func):
     """
@@ -16,7 +21,7 @@ def safe_order(func):
 
 
 class OrdersManager(metaclass=Singleton):
-    def __init__(self, client: BinanceClient, storage_manager: BinanceDataProvider):
+    def __init__(self, client: 'BinanceClient', storage_manager: 'BinanceDataProvider'):
         self.client = client
         self.storage_manager = storage_manager
         self.smart_orders = dict()
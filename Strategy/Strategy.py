@@ -1,22 +1,52 @@
 
+import collections
+
+
 class Strategy:
-    def __init__(self, initial_data, asset, a1_a2_max_dollar_ratio, a1_a2_min_dollar_ratio):
+    def __init__(self, initial_data, asset, a1_a2_max_dollar_ratio, a1_a2_min_dollar_ratio, max_recent=1000):
+        """
+        :param initial_data History the strategy starts from, data frame of klines
+        :param max_recent Number of candles from ping_data kept in recent_data, older ones are dropped
+        """
         self.a1_a2_max_dollar_ratio = a1_a2_max_dollar_ratio
         self.a1_a2_min_dollar_ratio = a1_a2_min_dollar_ratio
         self.initial_data = initial_data
         self.asset = asset
         self.subs = []
+        self.indicators = dict()
+        self.recent_data = collections.deque(maxlen=max_recent)
 
     def subscribe_for_signal(self, sub):
         self.subs.append(sub)
 
+    def add_indicator(self, name, indicator, columns=('close',)):
+        """
+        Seeds indicator from initial_data, it is then advanced by every ping_data
+        :param indicator Incremental indicator, e.g. IncrementalRSI
+        :param columns Columns passed to seed and update, e.g. ('high', 'low', 'close') for IncrementalATR
+        """
+        if len(self.initial_data) > 0:
+            indicator.seed(*[self.initial_data[c].to_numpy() for c in columns])
+        self.indicators[name] = (indicator, columns)
+
+    def signal(self, side, quantity=None, price=None, take_profit=None, stop_loss=None):
+        """
+        Passes order signal to the subscribers
+        :param side BUY, SELL or CANCEL for cancelling pending orders of the asset
+        :param quantity Base asset quantity, whole available balance when not specified
+        :param price Limit price, market order when not specified
+        """
+        signal = {'asset': self.asset, 'side': side, 'quantity': quantity, 'price': price,
+                  'take_profit': take_profit, 'stop_loss': stop_loss}
+        for sub in self.subs:
+            sub(signal)
+
+    def get_indicator(self, name):
+        return self.indicators[name][0].value
+
     def ping_data(self, data):
-        self.initial_data.append(data)
+        self.recent_data.append(data)
+        for indicator, columns in self.indicators.values():
+            indicator.update(*[data[c] for c in columns])
         # todo: Do smth with the data, check for signal and stuff
         pass
-
-
-
-
-
-
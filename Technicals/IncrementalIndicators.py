@@ -0,0 +1,212 @@
+import numpy as np
+
+from MaFin.Technicals.Indicators import get_wilder_average
+from MaFin.Technicals.MovingAverage import get_ema
+from MaFin.Technicals.TrendLine import TrendLine
+
+"""Stateful indicators advanced one closed candle at a time"""
+"""
+seed() takes the history from storage once and computes the state with the vectorized functions,
+update() then costs O(1) no matter how long the history is. Values match the vectorized ones for the same data.
+value is None until the indicator is defined.
+"""
+
+
+class IncrementalSMA:
+    def __init__(self, window):
+        self.window = window
+        self.buffer = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def seed(self, history):
+        for x in np.asarray(history, dtype=np.float64)[-self.window:]:
+            self.update(x)
+        return self.value
+
+    def update(self, x):
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.total -= self.buffer[slot]
+        self.buffer[slot] = x
+        self.total += x
+        self.count += 1
+        # running sum is recomputed once per window so rounding errors do not pile up
+        if slot == self.window - 1:
+            self.total = self.buffer.sum()
+        self.value = self.total / self.window if self.count >= self.window else None
+        return self.value
+
+
+class IncrementalEMA:
+    def __init__(self, span=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+        self.value = None
+
+    def seed(self, history):
+        history = np.asarray(history, dtype=np.float64)
+        if len(history) > 0:
+            self.value = get_ema(history, alpha=self.alpha)[-1]
+        return self.value
+
+    def update(self, x):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+class IncrementalWilderAverage:
+    def __init__(self, window):
+        self.window = window
+        self.seed_values = []
+        self.value = None
+
+    def seed(self, history):
+        history = np.asarray(history, dtype=np.float64)
+        if len(history) >= self.window:
+            self.value = get_wilder_average(history, self.window)[-1]
+        else:
+            self.seed_values = list(history)
+        return self.value
+
+    def update(self, x):
+        if self.value is not None:
+            self.value += (x - self.value) / self.window
+        else:
+            self.seed_values.append(x)
+            if len(self.seed_values) == self.window:
+                self.value = float(np.mean(self.seed_values))
+                self.seed_values = []
+        return self.value
+
+
+class IncrementalRSI:
+    def __init__(self, window=14):
+        self.gain = IncrementalWilderAverage(window)
+        self.loss = IncrementalWilderAverage(window)
+        self.prev_close = None
+        self.value = None
+
+    def seed(self, close):
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) == 0:
+            return None
+        change = np.diff(close)
+        self.gain.seed(np.maximum(change, 0))
+        self.loss.seed(np.maximum(-change, 0))
+        self.prev_close = close[-1]
+        self.value = self.__get_rsi()
+        return self.value
+
+    def update(self, close):
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            self.gain.update(max(change, 0.0))
+            self.loss.update(max(-change, 0.0))
+        self.prev_close = close
+        self.value = self.__get_rsi()
+        return self.value
+
+    def __get_rsi(self):
+        if self.gain.value is None:
+            return None
+        if self.loss.value == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self.gain.value / self.loss.value)
+
+
+class IncrementalATR:
+    def __init__(self, window=14):
+        self.average = IncrementalWilderAverage(window)
+        self.prev_close = None
+        self.value = None
+
+    def seed(self, high, low, close):
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        if len(close) == 0:
+            return None
+        true_range = high - low
+        true_range[1:] = np.maximum(true_range[1:], np.maximum(np.abs(high[1:] - close[:-1]),
+                                                               np.abs(low[1:] - close[:-1])))
+        self.value = self.average.seed(true_range)
+        self.prev_close = close[-1]
+        return self.value
+
+    def update(self, high, low, close):
+        true_range = high - low
+        if self.prev_close is not None:
+            true_range = max(true_range, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self.value = self.average.update(true_range)
+        return self.value
+
+
+class IncrementalLinearRegression:
+    def __init__(self, window):
+        """
+        Least squares line over last window (time, price) points, time unit as in TrendLine
+        """
+        self.window = window
+        self.t = np.zeros(window)
+        self.p = np.zeros(window)
+        self.count = 0
+        self.origin = None
+        self.sums = np.zeros(5)
+        self.value = None
+
+    def seed(self, t, p):
+        t = np.asarray(t, dtype=np.float64)[-self.window:]
+        p = np.asarray(p, dtype=np.float64)[-self.window:]
+        for x, y in zip(t, p):
+            self.update(x, y)
+        return self.value
+
+    def update(self, t, p):
+        """
+        :return (slope, intercept) once there are two distinct times in the window
+        """
+        if self.origin is None:
+            # sums are kept relative to the first time so large epoch values do not cancel out
+            self.origin = t
+        x = t - self.origin
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.sums -= self.__terms(self.t[slot], self.p[slot])
+        self.t[slot] = x
+        self.p[slot] = p
+        self.sums += self.__terms(x, p)
+        self.count += 1
+        n = min(self.count, self.window)
+        if slot == self.window - 1:
+            self.sums = self.__terms(self.t, self.p).sum(axis=1)
+        self.value = self.__solve(n)
+        return self.value
+
+    def get_trend_line(self):
+        """
+        :return TrendLine of current fit, None if not defined yet
+        """
+        if self.value is None:
+            return None
+        a, b = self.value
+        t1 = self.origin
+        t2 = self.origin + 1
+        return TrendLine(t1, t2, a * t1 + b, a * t2 + b)
+
+    @staticmethod
+    def __terms(x, y):
+        return np.array([np.ones_like(x), x, y, x * x, x * y])
+
+    def __solve(self, n):
+        _, sx, sy, sxx, sxy = self.sums
+        if n < 2:
+            return None
+        denominator = n * sxx - sx * sx
+        if denominator <= 0:
+            return None
+        slope = (n * sxy - sx * sy) / denominator
+        intercept = (sy - slope * sx) / n
+        # intercept relative to time 0 instead of the origin
+        return slope, intercept - slope * self.origin
@@ -0,0 +1,133 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from MaFin.Technicals.MovingAverage import get_ema, get_rolling_sum, get_recursive_filter
+
+"""Vectorized technical indicators"""
+"""
+Same conventions as MovingAverage, arrays of shape (n,) or (n, columns) with time along the first axis,
+every indicator is O(n) and values before the indicator is defined are NaN
+"""
+
+
+def get_rsi(close, window=14):
+    """
+    :return Relative strength index with Wilder's smoothing seeded by simple average of first window changes
+    """
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(close.shape, np.nan)
+    if len(close) <= window:
+        return out
+    change = np.diff(close, axis=0)
+    gain = np.maximum(change, 0)
+    loss = np.maximum(-change, 0)
+    avg_gain = get_wilder_average(gain, window)
+    avg_loss = get_wilder_average(loss, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    # no losses in the window means rsi of 100
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    out[window:] = rsi[window - 1:]
+    return out
+
+
+def get_atr(high, low, close, window=14):
+    """
+    :return Average true range with Wilder's smoothing seeded by simple average of first window true ranges
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(close.shape, np.nan)
+    if len(close) < window:
+        return out
+    true_range = high - low
+    prev_close = close[:-1]
+    true_range[1:] = np.maximum(true_range[1:], np.maximum(np.abs(high[1:] - prev_close),
+                                                           np.abs(low[1:] - prev_close)))
+    atr = get_wilder_average(true_range, window)
+    out[window - 1:] = atr[window - 1:]
+    return out
+
+
+def get_bollinger(x, window=20, k=2.0, block_size=2 ** 22):
+    """
+    :param block_size Elements of (windows, columns, window) processed at once, bounds the temporary memory
+    :return (lower, middle, upper) bands, middle is simple moving average, bands are k population deviations away
+    """
+    x = np.asarray(x, dtype=np.float64)
+    middle = np.full(x.shape, np.nan)
+    std = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return middle, middle.copy(), middle.copy()
+    xw = sliding_window_view(x, window, axis=0)
+    step = max(block_size // (window * max(x[0].size, 1)), 1)
+    for i in range(0, len(xw), step):
+        # deviations are taken from the mean of every window, sums over the whole series would cancel out
+        w = xw[i:i + step]
+        mean = w.mean(axis=-1)
+        deviation = w - mean[..., None]
+        middle[i + window - 1:i + window - 1 + len(w)] = mean
+        std[i + window - 1:i + window - 1 + len(w)] = np.sqrt((deviation * deviation).mean(axis=-1))
+    return middle - k * std, middle, middle + k * std
+
+
+def get_macd(x, fast=12, slow=26, signal=9):
+    """
+    :return (macd, signal, histogram)
+    """
+    macd = get_ema(x, span=fast) - get_ema(x, span=slow)
+    signal_line = get_ema(macd, span=signal)
+    return macd, signal_line, macd - signal_line
+
+
+def get_vwap(high, low, close, vol, window=None):
+    """
+    :return Volume weighted average of typical price over last window candles, cumulative if window is None
+    """
+    typical = (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64) +
+               np.asarray(close, dtype=np.float64)) / 3.0
+    vol = np.asarray(vol, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if window is None:
+            return np.cumsum(typical * vol, axis=0) / np.cumsum(vol, axis=0)
+        return get_rolling_sum(typical * vol, window) / get_rolling_sum(vol, window)
+
+
+def compute_indicators(data, specs, out=None, chunk_size=16):
+    """
+    Computes many indicators over many pairs, a chunk of columns at a time so temporaries stay bounded
+    :param data dict of input name -> array of shape (n, columns), e.g. open, high, low, close, vol
+    :param specs dict of output name -> (function, list of input names, kwargs), functions returning tuples
+    give outputs name_0, name_1, ...
+    :param out dict of output name -> preallocated array of shape (n, columns), e.g. np.memmap, allocated if missing
+    :param chunk_size Columns computed at once
+    :return out
+    """
+    out = dict() if out is None else out
+    shape = next(iter(data.values())).shape
+    for start in range(0, shape[1], chunk_size):
+        cols = slice(start, min(start + chunk_size, shape[1]))
+        for name, (func, inputs, kwargs) in specs.items():
+            result = func(*[data[i][:, cols] for i in inputs], **kwargs)
+            results = result if isinstance(result, tuple) else (result,)
+            names = [name] if len(results) == 1 else [f'{name}_{i}' for i in range(len(results))]
+            for n, r in zip(names, results):
+                if n not in out:
+                    out[n] = np.empty(shape)
+                out[n][:, cols] = r
+    return out
+
+
+def get_wilder_average(x, window):
+    """
+    Wilder's smoothing, average of first window values then recursive filter with alpha 1 / window
+    :return Array of x's shape, defined from index window - 1
+    """
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    seed = x[:window].mean(axis=0)
+    out[window - 1] = seed
+    out[window:] = get_recursive_filter(x[window:], 1.0 / window, seed)
+    return out
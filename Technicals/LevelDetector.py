@@ -0,0 +1,175 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from MaFin.Technicals.PriceLevel import PriceLevel
+from MaFin.Technicals.TrendLine import TrendLine
+
+"""Support and resistance levels discovered from klines"""
+"""
+Swing high (low) is a candle whose high (low) is the extreme of order candles on both sides, so it is known
+order candles after it closed. Pivot prices are kept sorted, a cluster is a run of pivots whose neighbours are less
+within tolerance (relative) of its lowest pivot, so a cluster boundary is found by binary search and there are
+as many searches as clusters. Every cluster becomes PriceLevel
+at its score weighted mean price, score is sum of touch weights halving every half_life candles.
+Trend line candidates go through the last two swing highs (resistance) and the last two swing lows (support).
+"""
+
+MS_IN_HOUR = 60 * 60 * 1000
+
+
+def get_pivots(high, low, order=5):
+    """
+    :param high, low Arrays of shape (n,) or (n, columns)
+    :return (is_swing_high, is_swing_low) boolean arrays of the same shape, the last order candles are always False
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    is_high = np.zeros(high.shape, dtype=bool)
+    is_low = np.zeros(low.shape, dtype=bool)
+    if len(high) < 2 * order + 1:
+        return is_high, is_low
+    width = 2 * order + 1
+    center = slice(order, len(high) - order)
+    is_high[center] = high[center] == sliding_window_view(high, width, axis=0).max(axis=-1)
+    is_low[center] = low[center] == sliding_window_view(low, width, axis=0).min(axis=-1)
+    return is_high, is_low
+
+
+def cluster_levels(prices, weights, times, tolerance):
+    """
+    :param prices Sorted pivot prices
+    :param weights Weight of every pivot
+    :param times Time of every pivot
+    :param tolerance Relative width of a cluster above its lowest price
+    :return (price, score, touches, last_touch) of every cluster
+    """
+    if len(prices) == 0:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int64), np.empty(0)
+    starts = [0]
+    while True:
+        end = np.searchsorted(prices, prices[starts[-1]] * (1 + tolerance), side='right')
+        if end >= len(prices):
+            break
+        starts.append(end)
+    score = np.add.reduceat(weights, starts)
+    price = np.add.reduceat(prices * weights, starts) / score
+    touches = np.diff(np.r_[starts, len(prices)])
+    last_touch = np.maximum.reduceat(times, starts)
+    return price, score, touches, last_touch
+
+
+def scan_levels(klines, **kwargs):
+    """
+    :param klines Dict of key, e.g. (pair, time frame), -> klines
+    :param kwargs LevelDetector params
+    :return Dict of key -> LevelDetector after scan, to be kept up to date with update()
+    """
+    detectors = dict()
+    for key, k in klines.items():
+        detectors[key] = LevelDetector(**kwargs)
+        detectors[key].scan(k)
+    return detectors
+
+
+class LevelDetector:
+    def __init__(self, order=5, tolerance=0.005, half_life=500, min_touches=2):
+        """
+        :param order Candles on each side a swing high/low has to exceed
+        :param tolerance Relative distance of pivots clustered into one level
+        :param half_life Candles after which weight of a touch halves, None for equal weights
+        :param min_touches Clusters with fewer pivots are not reported
+        """
+        self.order = order
+        self.tolerance = tolerance
+        self.half_life = half_life
+        self.min_touches = min_touches
+        self.prices = np.empty(0)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.times = np.empty(0)
+        self.swing_highs = []
+        self.swing_lows = []
+        self.window = np.empty((0, 3))
+        self.count = 0
+
+    def scan(self, klines):
+        """
+        Detects pivots over the whole history, replacing the current state
+        :param klines Frame or structured array with date (epoch ms), high and low, e.g. BinanceDataProvider.get_klines
+        :return Levels sorted by score, the strongest first
+        """
+        high = np.asarray(klines['high'], dtype=np.float64)
+        low = np.asarray(klines['low'], dtype=np.float64)
+        times = np.asarray(klines['date'], dtype=np.float64) / MS_IN_HOUR
+        is_high, is_low = get_pivots(high, low, self.order)
+        highs = np.flatnonzero(is_high)
+        lows = np.flatnonzero(is_low)
+        indices = np.r_[highs, lows]
+        prices = np.r_[high[highs], low[lows]]
+        order = np.argsort(prices, kind='stable')
+        self.prices = prices[order]
+        self.indices = indices[order]
+        self.times = times[indices][order]
+        self.swing_highs = [(times[i], high[i]) for i in highs[-2:]]
+        self.swing_lows = [(times[i], low[i]) for i in lows[-2:]]
+        self.window = np.column_stack((times, high, low))[-2 * self.order:]
+        self.count = len(high)
+        return self.get_levels()
+
+    def update(self, date, high, low):
+        """
+        Takes one closed candle, the candle order candles back is checked for being a pivot
+        :return True when a new pivot was found and levels changed
+        """
+        self.window = np.vstack((self.window, [[date / MS_IN_HOUR, high, low]]))[-(2 * self.order + 1):]
+        self.count += 1
+        if len(self.window) < 2 * self.order + 1:
+            return False
+        t, h, l = self.window[self.order]
+        index = self.count - 1 - self.order
+        found = False
+        if h == self.window[:, 1].max():
+            self.__insert(h, index, t)
+            self.swing_highs = (self.swing_highs + [(t, h)])[-2:]
+            found = True
+        if l == self.window[:, 2].min():
+            self.__insert(l, index, t)
+            self.swing_lows = (self.swing_lows + [(t, l)])[-2:]
+            found = True
+        return found
+
+    def get_levels(self, price=None, n=None):
+        """
+        :param price When specified, levels are sorted by distance to it instead of score
+        :param n Number of levels returned, all if None
+        :return List of PriceLevel
+        """
+        weights = self.__weights()
+        level_price, score, touches, last_touch = cluster_levels(self.prices, weights, self.times, self.tolerance)
+        keep = touches >= self.min_touches
+        level_price, score, touches, last_touch = level_price[keep], score[keep], touches[keep], last_touch[keep]
+        order = np.argsort(-score if price is None else np.abs(level_price - price), kind='stable')[:n]
+        return [PriceLevel(level_price[i], score[i], touches[i], last_touch[i]) for i in order]
+
+    def get_trend_lines(self):
+        """
+        :return (resistance, support) TrendLines through the last two swing highs and lows, None where not known yet
+        """
+        return self.__trend_line(self.swing_highs), self.__trend_line(self.swing_lows)
+
+    def __insert(self, price, index, t):
+        i = np.searchsorted(self.prices, price, side='right')
+        self.prices = np.insert(self.prices, i, price)
+        self.indices = np.insert(self.indices, i, index)
+        self.times = np.insert(self.times, i, t)
+
+    def __weights(self):
+        if self.half_life is None:
+            return np.ones(len(self.prices))
+        return 0.5 ** ((self.count - 1 - self.indices) / self.half_life)
+
+    @staticmethod
+    def __trend_line(pivots):
+        if len(pivots) < 2:
+            return None
+        (t1, p1), (t2, p2) = pivots
+        return TrendLine(t1, t2, p1, p2)
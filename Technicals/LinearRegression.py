@@ -1,10 +1,83 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
+
+from numpy.lib.stride_tricks import sliding_window_view
 
 from MaFin.Technicals.TrendLine import TrendLine
 
+"""Least squares lines in closed form"""
+"""
+slope = cov(t, p) / var(t), intercept = mean(p) - slope * mean(t). Times and prices are centered on the points being
+fitted before the sums are taken, for rolling fits on every window separately, so large epoch values and long series
+do not cancel out. Arrays of shape (n,) or (n, lines), points go along the first axis
+"""
+
 
 def get_linear_regression(pts):
-    line = LinearRegression().fit(pts[0], pts[1])
-    coefs = line.coef_
-    return TrendLine(0, coefs[0], 0, coefs[1])
+    """
+    :param pts (times, prices), times may be of shape (n, 1) as well
+    :return TrendLine fitted to the points
+    """
+    t = np.asarray(pts[0], dtype=np.float64).reshape(-1)
+    a, b = get_regression_coefs(t, pts[1])
+    return _get_trend_line(a, b, t[0], t[-1])
+
+
+def get_linear_regressions(t, p):
+    """
+    Fits every column at once
+    :param t Times of shape (n,) shared by all lines or (n, lines)
+    :param p Prices of shape (n, lines)
+    :return TrendLine holding the batch of lines
+    """
+    t = np.asarray(t, dtype=np.float64)
+    a, b = get_regression_coefs(t, p)
+    return _get_trend_line(a, b, t[0], t[-1])
+
+
+def get_regression_coefs(t, p):
+    """
+    :return (slope, intercept) of shape p.shape[1:]
+    """
+    t = np.asarray(t, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    if t.ndim < p.ndim:
+        t = t.reshape(t.shape + (1,) * (p.ndim - t.ndim))
+    t_mean = t.mean(axis=0)
+    p_mean = p.mean(axis=0)
+    dt = t - t_mean
+    slope = (dt * (p - p_mean)).sum(axis=0) / (dt * dt).sum(axis=0)
+    return slope, p_mean - slope * t_mean
+
+
+def get_rolling_regression(t, p, window, block_size=2 ** 22):
+    """
+    :param block_size Elements of (windows, lines, window) processed at once, bounds the temporary memory
+    :return (slope, intercept) of line fitted to last window points, NaN until there are window points
+    """
+    t = np.asarray(t, dtype=np.float64)
+    p = np.asarray(p, dtype=np.float64)
+    if t.ndim < p.ndim:
+        t = t.reshape(t.shape + (1,) * (p.ndim - t.ndim))
+    slope = np.full(p.shape, np.nan)
+    intercept = np.full(p.shape, np.nan)
+    if len(p) < window:
+        return slope, intercept
+    tw = sliding_window_view(np.broadcast_to(t, p.shape), window, axis=0)
+    pw = sliding_window_view(p, window, axis=0)
+    step = max(block_size // (window * max(p[0].size, 1)), 1)
+    for i in range(0, len(tw), step):
+        # every window is centered on its own points, sums of it do not grow with the length of the series
+        x = tw[i:i + step] - tw[i:i + step, ..., :1]
+        y = pw[i:i + step] - pw[i:i + step, ..., :1]
+        x_mean = x.mean(axis=-1)
+        y_mean = y.mean(axis=-1)
+        dx = x - x_mean[..., None]
+        a = (dx * (y - y_mean[..., None])).sum(axis=-1) / (dx * dx).sum(axis=-1)
+        slope[i + window - 1:i + window - 1 + len(a)] = a
+        intercept[i + window - 1:i + window - 1 + len(a)] = \
+            y_mean + pw[i:i + step, ..., 0] - a * (x_mean + tw[i:i + step, ..., 0])
+    return slope, intercept
+
+
+def _get_trend_line(a, b, t1, t2):
+    return TrendLine(t1, t2, a * t1 + b, a * t2 + b)
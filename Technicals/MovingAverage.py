@@ -0,0 +1,87 @@
+import numpy as np
+
+"""Vectorized moving averages"""
+"""
+Every function takes array of shape (n,) or (n, columns), time goes along the first axis, so many pairs
+are computed at once. Windowed averages are O(n) differences of cumulative sums, exponential ones are
+recursive filters evaluated block by block in closed form. First window - 1 values of windowed averages are NaN.
+"""
+
+# decay of one block of the recursive filter is kept above exp(-_MAX_BLOCK_EXPONENT)
+_MAX_BLOCK_EXPONENT = 30.0
+
+
+def get_sma(x, window):
+    """
+    :return Simple moving average over window values
+    """
+    return get_rolling_sum(x, window) / window
+
+
+def get_ema(x, span=None, alpha=None, init=None):
+    """
+    :param span Smoothing factor is 2 / (span + 1) if alpha is not specified
+    :param init Value before the first one, the first value is taken if not specified
+    :return Exponential moving average, y[t] = (1 - alpha) * y[t - 1] + alpha * x[t]
+    """
+    alpha = alpha if alpha is not None else 2.0 / (span + 1.0)
+    x = np.asarray(x, dtype=np.float64)
+    return get_recursive_filter(x, alpha, x[0] if init is None else init)
+
+
+def get_wma(x, window):
+    """
+    :return Linearly weighted moving average, the most recent value has weight window, the oldest one 1
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    plain = get_rolling_sum(x, window)
+    # numerator moves by window * x[t] - sum of the previous window, it stays bounded so the cumsum stays precise
+    first = np.tensordot(np.arange(1, window + 1, dtype=np.float64), x[:window], axes=(0, 0))
+    out[window - 1] = first
+    out[window:] = first + np.cumsum(window * x[window:] - plain[window - 1:-1], axis=0)
+    return out / (window * (window + 1) / 2.0)
+
+
+def get_rolling_sum(x, window):
+    """
+    :return Sum of last window values, NaN until there are window values
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    c = np.cumsum(x, axis=0)
+    out[window - 1] = c[window - 1]
+    out[window:] = c[window:] - c[:-window]
+    return out
+
+
+def get_recursive_filter(x, alpha, init):
+    """
+    Evaluates y[t] = (1 - alpha) * y[t - 1] + alpha * x[t], y[-1] = init
+    Inside a block y[s + j] = d^(j + 1) * y[s - 1] + alpha * d^j * cumsum(x[s + i] * d^-i), d = 1 - alpha,
+    blocks are short enough for d^-i to stay representable
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.empty(x.shape)
+    if len(x) == 0:
+        return out
+    d = 1.0 - alpha
+    if d <= 0:
+        out[:] = x
+        return out
+    block = int(min(len(x), max(1, _MAX_BLOCK_EXPONENT // -np.log(d)))) if d < 1 else len(x)
+    shape = (-1,) + (1,) * (x.ndim - 1)
+    powers = d ** np.arange(block + 1, dtype=np.float64)
+    inverse = 1.0 / powers[:block]
+    prev = np.broadcast_to(np.asarray(init, dtype=np.float64), x.shape[1:])
+    for s in range(0, len(x), block):
+        b = min(block, len(x) - s)
+        acc = np.cumsum(x[s:s + b] * inverse[:b].reshape(shape), axis=0)
+        y = powers[1:b + 1].reshape(shape) * prev + alpha * powers[:b].reshape(shape) * acc
+        out[s:s + b] = y
+        prev = y[-1]
+    return out
@@ -2,5 +2,16 @@ from MaFin.Technicals.TrendLine import TrendLine
 
 
 class PriceLevel(TrendLine):
-    def __init__(self, p1):
+    def __init__(self, p1, score=0, touches=0, last_touch=None):
+        """
+        :param score How strong the level is, LevelDetector gives higher score to more and more recent touches
+        :param touches Number of swing highs/lows the level was clustered from
+        :param last_touch Time of the most recent touch, hours since epoch
+        """
         super().__init__(0, 1, p1, p1)
+        self.score = score
+        self.touches = touches
+        self.last_touch = last_touch
+
+    def __repr__(self):
+        return f'PriceLevel({self.p1}, score={self.score:.3f}, touches={self.touches})'
@@ -1,9 +1,13 @@
-from numpy import ones,vstack
-from numpy.linalg import lstsq
 import time
 
+import numpy as np
+
 
 """ Time unit for this class is *hours* since epoch """
+"""
+t1, t2, p1, p2 may be arrays of the same shape, the object is then a batch of lines and every method broadcasts,
+e.g. get_price_for_time(t[:, None]) gives prices of every line at every time t
+"""
 
 
 class TrendLine:
@@ -16,13 +20,10 @@ class TrendLine:
 
     def get_extension_in_time(self, price, t):
         p = self.get_price_for_time(t)
-        if price > p:
-            return price / p - 1
-        else:
-            return 1 - p / price
+        return np.where(price > p, price / p - 1, 1 - p / price)[()]
 
     def get_extension_now(self, price):
-        self.get_extension_in_time(price, time.time() / 60 / 60)
+        return self.get_extension_in_time(price, time.time() / 60 / 60)
 
     def get_price_for_time(self, t):
         return self.a * t + self.b
@@ -34,11 +35,9 @@ class TrendLine:
         return (p - self.b)/self.a
 
     def get_equation_coefs(self):
-        pts = [(self.t1, self.p1), (self.t2, self.p2)]
-        x_cords, y_cords = zip(*pts)
-        X = vstack([x_cords, ones(len(y_cords))]).T
-        a, b = lstsq(X, y_cords, rcond=None)[0]
-        return a, b
+        a = (np.asarray(self.p2, dtype=np.float64) - self.p1) / (np.asarray(self.t2, dtype=np.float64) - self.t1)
+        b = self.p1 - a * self.t1
+        return a[()], b[()]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,6 @@
+import os
+import sys
+
+"""Makes the repository importable as MaFin package when the tests are run from a checkout"""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,53 @@
+import time
+
+from MaFin.Data.Storage.OrderBook import OrderBook
+
+"""Local order book sync from snapshot and depth diffs"""
+
+
+def diff(first, last, bids=(), asks=()):
+    return {'e': 'depthUpdate', 'E': last, 'U': first, 'u': last, 'b': list(bids), 'a': list(asks)}
+
+
+def wait_synced(book, timeout=5.0):
+    deadline = time.time() + timeout
+    while not book.is_synced() and time.time() < deadline:
+        time.sleep(0.01)
+    return book.is_synced()
+
+
+def test_gap_invalidates_and_resyncs():
+    snapshots = [{'lastUpdateId': 3, 'bids': [['100', '1']], 'asks': [['101', '1']]},
+                 {'lastUpdateId': 9, 'bids': [['99', '2']], 'asks': [['102', '2']]}]
+    requested = []
+
+    def endpoint(symbol, limit):
+        requested.append(symbol)
+        return snapshots[len(requested) - 1]
+
+    book = OrderBook('BTCUSDT', endpoint, resync_interval=0)
+    book.on_depth(diff(2, 5, bids=[['100', '3']]))
+    assert wait_synced(book)
+    assert book.get_best_bid() == (100.0, 3.0)
+
+    book.on_depth(diff(6, 7, asks=[['101', '0'], ['103', '1']]))
+    assert book.get_best_ask() == (103.0, 1.0)
+
+    # 8 is missing, the book must not apply 10 on top of a state it does not know
+    book.on_depth(diff(10, 11, bids=[['98', '5']]))
+    assert wait_synced(book)
+    assert len(requested) == 2
+    assert book.last_update_id == 11
+    assert book.get_levels('BUY') == [(99.0, 2.0), (98.0, 5.0)]
+    assert book.get_best_ask() == (102.0, 2.0)
+
+
+def test_snapshot_older_than_buffer_waits_for_next_one():
+    book = OrderBook('BTCUSDT', lambda symbol, limit: {'lastUpdateId': 3, 'bids': [], 'asks': []},
+                     resync_interval=60)
+    book.on_depth(diff(6, 7))
+    deadline = time.time() + 5.0
+    while book.syncing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not book.is_synced()
+    assert book.get_best_bid() is None
@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from MaFin.Data.SharedMarketData import SharedTable, SEQ, COUNT
+from MaFin.Data.Storage.ColdStorage import ColdStorage
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+
+"""Readers of ColdStorage and SharedTable never see a write in progress"""
+
+
+class BlockingBackend(CsvBackend):
+    def __init__(self, storage_path):
+        super().__init__(storage_path)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.block = False
+
+    def write(self, data):
+        if self.block:
+            # data.csv is half written while the reader runs
+            with open(self.storage, 'w') as f:
+                f.write('time,price\n1,')
+            self.writing.set()
+            self.release.wait(5.0)
+        super().write(data)
+
+
+def test_cold_storage_reader_gets_previous_snapshot_during_write(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    storage = ColdStorage(path, backend=BlockingBackend(path))
+    old = pd.DataFrame({'price': [1.0, 2.0]}, index=pd.Index([1, 2], name='time'))
+    new = pd.DataFrame({'price': [3.0, 4.0, 5.0]}, index=pd.Index([1, 2, 3], name='time'))
+    storage.save(old)
+    storage.backend.block = True
+    writer = threading.Thread(target=storage.save, args=(new,))
+    writer.start()
+    assert storage.backend.writing.wait(5.0)
+    try:
+        assert storage.seq % 2 == 1
+        version, data = storage.snapshot()
+    finally:
+        storage.backend.release.set()
+        writer.join(5.0)
+
+    assert version == 1
+    assert data['price'].tolist() == [1.0, 2.0]
+    assert storage.snapshot()[1]['price'].tolist() == [3.0, 4.0, 5.0]
+
+
+class RacingRecords:
+    """
+    Records of a table written by another process right after the reader copied them for the first time
+    """
+    def __init__(self, table, records, rewrite):
+        self.table = table
+        self.records = records
+        self.rewrite = rewrite
+        self.copies = 0
+
+    def __getitem__(self, item):
+        out = self.records[item]
+        self.copies += 1
+        if self.copies == 1:
+            self.table.header[SEQ] += 1
+            self.records[:len(self.rewrite)] = self.rewrite
+            self.table.header[COUNT] = len(self.rewrite)
+            self.table.header[SEQ] += 1
+        return out
+
+
+def table(capacity=4):
+    dtype = np.dtype([('date', np.int64), ('close', np.float64)])
+    return SharedTable(bytearray(SharedTable.nbytes(dtype, capacity)), 0, dtype, capacity, True), dtype
+
+
+def test_shared_table_read_retries_when_written_meanwhile():
+    t, dtype = table()
+    t.replace(np.array([(1, 1.0), (2, 2.0)], dtype=dtype))
+    rewrite = np.array([(3, 3.0), (4, 4.0), (5, 5.0)], dtype=dtype)
+    t.records = RacingRecords(t, t.records, rewrite)
+
+    out = t.read()
+
+    assert t.records.copies == 2
+    assert out.tolist() == rewrite.tolist()
+
+
+def test_shared_table_read_waits_for_write_in_progress():
+    t, dtype = table()
+    t.replace(np.array([(1, 1.0)], dtype=dtype))
+    t.header[SEQ] += 1
+    t.records[0] = (2, 2.0)
+    result = []
+    reader = threading.Thread(target=lambda: result.append(t.read()))
+    reader.start()
+    reader.join(0.1)
+    assert reader.is_alive()
+
+    t.records[1] = (3, 3.0)
+    t.header[COUNT] = 2
+    t.header[SEQ] += 1
+    reader.join(5.0)
+
+    assert result[0].tolist() == [(2, 2.0), (3, 3.0)]
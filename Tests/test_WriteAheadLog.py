@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+from MaFin.Data.Storage.CsvBackend import CsvBackend
+from MaFin.Data.Storage.WriteAheadLog import WriteAheadLog, HEADER
+
+"""Recovery of CsvBackend with write-ahead log after crashes"""
+
+
+def frame(ids, status='NEW'):
+    return pd.DataFrame({'orderId': ids, 'status': status}, index=pd.Index([1000 + i for i in ids], name='time'))
+
+
+def backend(tmp_path, key=None):
+    b = CsvBackend(str(tmp_path / 'data.csv'), wal=True, sync='never', key=key)
+    b.init_storage()
+    return b
+
+
+def test_torn_record_is_cut_off(tmp_path):
+    b = backend(tmp_path)
+    b.write(frame([0, 1]))
+    b.append(frame([2, 3]))
+    b.append(frame([4, 5]))
+    b.log.close()
+    wal = str(tmp_path / 'data.wal')
+    torn = os.path.getsize(wal) - 3
+    os.truncate(wal, torn)
+
+    recovered = backend(tmp_path)
+
+    assert recovered.read()['orderId'].tolist() == [0, 1, 2, 3]
+    assert os.path.getsize(wal) < torn
+    recovered.append(frame([6]))
+    assert backend(tmp_path).read()['orderId'].tolist() == [0, 1, 2, 3, 6]
+
+
+def test_torn_header_drops_log(tmp_path):
+    b = backend(tmp_path)
+    b.write(frame([0]))
+    b.append(frame([1]))
+    b.log.close()
+    os.truncate(str(tmp_path / 'data.wal'), HEADER.size - 1)
+
+    assert backend(tmp_path).read()['orderId'].tolist() == [0]
+
+
+@pytest.mark.parametrize('key', [None, 'orderId'])
+def test_crash_between_rename_and_log_reset(tmp_path, monkeypatch, key):
+    b = backend(tmp_path, key)
+    b.write(frame([0, 1, 2]))
+    b.append(frame([3]))
+    if key is not None:
+        b.upsert(frame([1], 'FILLED'), key)
+    expected = b.read()
+
+    def crash(self):
+        raise OSError('crash')
+
+    with monkeypatch.context() as m:
+        # data.csv is already replaced when the log is reset
+        m.setattr(WriteAheadLog, 'reset', crash)
+        with pytest.raises(OSError):
+            b.flush()
+    b.log.close()
+
+    recovered = backend(tmp_path, key)
+
+    assert recovered.pending == []
+    pd.testing.assert_frame_equal(recovered.read(), expected)
@@ -1,13 +1,38 @@
-
 class Trade:
-    def __init__(self):
+    def __init__(self, asset=None, quantity=None, take_profit=None, stop_loss=None):
+        self.asset = asset
+        self.quantity = quantity
         self.profit = None
         self.closed = False
-        self.take_profit = None
-        self.stop_loss = None
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.entry_price = None
+        self.entry_date = None
+        self.exit_price = None
+        self.exit_date = None
+        self.fees = 0.0
+
+    def open(self, price=None, date=None, fee=0.0):
+        """
+        :param fee Fee paid for the entry in quote asset
+        """
+        self.entry_price = price
+        self.entry_date = date
+        self.fees += fee
 
-    def open(self):
-        pass
+    def close(self, price=None, date=None, fee=0.0):
+        """
+        Sets profit in quote asset, fees included
+        """
+        self.exit_price = price
+        self.exit_date = date
+        self.fees += fee
+        self.closed = True
+        if price is not None and self.entry_price is not None:
+            self.profit = (price - self.entry_price) * self.quantity - self.fees
 
-    def close(self):
-        pass
+    def to_dict(self):
+        return {'asset': self.asset, 'quantity': self.quantity, 'entry_date': self.entry_date,
+                'entry_price': self.entry_price, 'exit_date': self.exit_date, 'exit_price': self.exit_price,
+                'take_profit': self.take_profit, 'stop_loss': self.stop_loss, 'fees': self.fees,
+                'profit': self.profit}
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+"""threading.Event which coroutines can wait for as well"""
+"""
+Hot events are set from websocket and order threads, storages refreshed on an event loop wait for them
+without holding a thread each, RefreshScheduler subscribes a callback instead of waiting
+"""
+
+
+class HotEvent(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.waiters_lock = threading.Lock()
+        self.waiters = set()
+        self.callbacks = []
+
+    def set(self):
+        super().set()
+        with self.waiters_lock:
+            waiters = list(self.waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+        for callback in self.callbacks:
+            callback()
+
+    def subscribe(self, callback):
+        """
+        :param callback Called without arguments on every set(), from the thread setting the event
+        """
+        self.callbacks.append(callback)
+
+    async def wait_async(self, timeout=None):
+        """
+        Coroutine counterpart of wait
+        :return True if the event is set, False on timeout
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.waiters_lock:
+            self.waiters.add(waiter)
+        try:
+            if self.is_set():
+                return True
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.is_set()
+        finally:
+            with self.waiters_lock:
+                self.waiters.discard(waiter)
@@ -0,0 +1,217 @@
+import bisect
+import http.server
+import json
+import threading
+import time
+
+"""Process-wide counters, gauges and histograms of the hot paths"""
+"""
+Disabled by default, every recording call then returns after one attribute check and call sites guard
+the timing with `if METRICS.enabled`, so instrumented code costs next to nothing unless metrics are enabled.
+Series are identified by name and labels, e.g. rest_latency_seconds{endpoint=get_klines}.
+Values are pulled with snapshot(), served in Prometheus text format by serve(), or written periodically by
+start_snapshots().
+"""
+
+# upper bounds of histogram buckets, 10us to 100s, four per decade
+BUCKETS = [10 ** (e / 4) for e in range(-20, 9)]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        :return Upper bound of the bucket the q-th quantile falls into
+        """
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c > 0:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0.0
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99), 'max': self.max}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.gauges = dict()
+        self.histograms = dict()
+        self.server = None
+        self.snapshot_thread = None
+        self.snapshot_stop = threading.Event()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """
+        :return Dict of series name -> value, histograms as dict of count, sum, mean, quantiles and max
+        """
+        with self.lock:
+            out = {self.__series(k): v for k, v in self.counters.items()}
+            out.update({self.__series(k): v for k, v in self.gauges.items()})
+            out.update({self.__series(k): h.to_dict() for k, h in self.histograms.items()})
+        return out
+
+    def to_prometheus(self):
+        """
+        :return Metrics in Prometheus text exposition format
+        """
+        lines = []
+        with self.lock:
+            for (name, labels), v in self.counters.items():
+                lines.append(f'{name}{self.__labels(labels)} {v}')
+            for (name, labels), v in self.gauges.items():
+                lines.append(f'{name}{self.__labels(labels)} {v}')
+            for (name, labels), h in self.histograms.items():
+                seen = 0
+                for bound, c in zip(BUCKETS + ['+Inf'], h.counts):
+                    seen += c
+                    lines.append(f'{name}_bucket{self.__labels(labels + (("le", bound),))} {seen}')
+                lines.append(f'{name}_sum{self.__labels(labels)} {h.sum}')
+                lines.append(f'{name}_count{self.__labels(labels)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9100, host='127.0.0.1'):
+        """
+        Serves /metrics in Prometheus format and /snapshot as json on a daemon thread, enables metrics
+        """
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/snapshot'):
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), 'application/json'
+                else:
+                    body, content_type = metrics.to_prometheus().encode(), 'text/plain; version=0.0.4'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.enable()
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address
+
+    def start_snapshots(self, interval=60, sink=None):
+        """
+        Passes snapshot to sink every interval seconds on a daemon thread, enables metrics
+        :param sink Callable taking the snapshot dict, printed as json line if None
+        """
+        sink = sink if sink is not None else lambda s: print(json.dumps({'time': time.time(), 'metrics': s}))
+        self.enable()
+        self.snapshot_stop.clear()
+
+        def loop():
+            while not self.snapshot_stop.wait(interval):
+                sink(self.snapshot())
+
+        self.snapshot_thread = threading.Thread(target=loop, daemon=True)
+        self.snapshot_thread.start()
+
+    def stop(self):
+        """
+        Stops serving and snapshots
+        """
+        self.snapshot_stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+    @staticmethod
+    def __series(key):
+        name, labels = key
+        return name + (Metrics.__labels(labels) if labels else '')
+
+    @staticmethod
+    def __labels(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+class TimedLock:
+    def __init__(self, lock, name, **labels):
+        """
+        Lock recording time spent waiting for it as histogram name
+        """
+        self.lock = lock
+        self.name = name
+        self.labels = labels
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not METRICS.enabled:
+            return self.lock.acquire(blocking, timeout)
+        start = time.perf_counter()
+        acquired = self.lock.acquire(blocking, timeout)
+        METRICS.observe(self.name, time.perf_counter() - start, **self.labels)
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.lock.release()
+
+
+METRICS = Metrics()
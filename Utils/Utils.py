@@ -1,7 +1,5 @@
 import datetime
 
-from MaFin.Client.BinanceClient import BinanceClient
-
 
 def get_seconds_to_kline_close(tf):
     _, _, _, hour, minute = map(int, datetime.datetime.utcnow().strftime("%Y %m %d %H %M").split())
@@ -16,3 +14,11 @@ def get_seconds_to_kline_close(tf):
         return (6 - weekday) * 3600 * 24 + (23 - hour) * 3600 + (60 - minute) * 60
 
     return 60
+
+
+def get_interval_ms(tf):
+    """
+    :return length of the kline time frame in milliseconds, e.g. 1m, 4h, 1d, 1w, months are taken as 31 days
+    """
+    units = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'M': 2678400}
+    return int(tf[:-1]) * units[tf[-1]] * 1000